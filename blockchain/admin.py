@@ -5,7 +5,7 @@ from django.contrib import admin
 
 # blockchain/admin.py
 from django.contrib import admin
-from .models import Prediction, PointActivity, UserScore
+from .models import Prediction, PointActivity, UserScore, HcsOutbox, HcsAnchor
 
 @admin.register(Prediction)
 class PredictionAdmin(admin.ModelAdmin):
@@ -24,3 +24,16 @@ class UserScoreAdmin(admin.ModelAdmin):
     list_display = ("user", "total_points", "level")
     search_fields = ("user__username",)
 
+
+
+@admin.register(HcsOutbox)
+class HcsOutboxAdmin(admin.ModelAdmin):
+    list_display = ("kind", "object_id", "status", "attempts", "next_attempt_at", "hcs_tx_id", "created_at")
+    list_filter = ("status", "kind")
+    search_fields = ("hcs_tx_id", "last_error")
+
+@admin.register(HcsAnchor)
+class HcsAnchorAdmin(admin.ModelAdmin):
+    list_display = ("id", "merkle_root", "leaf_count", "window_start", "window_end", "hcs_status", "hcs_tx_id")
+    list_filter = ("hcs_status",)
+    search_fields = ("merkle_root", "hcs_tx_id")
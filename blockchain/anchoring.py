@@ -0,0 +1,164 @@
+# blockchain/anchoring.py
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .hedera_client import HEDERA_TOPIC_ID, _sha256_hex
+from .merkle import build_tree, verify_proof
+from .models import HcsAnchor, PointActivity, Prediction
+from .outbox import ANCHORED_MODELS, enqueue, legacy_point_activity_payload, point_activity_payload, prediction_payload
+
+DEFAULTS = {
+    "WINDOW_SECONDS": 60,
+    "MAX_LEAVES": 1024,
+}
+
+# حقل وقت الإنشاء لكل نموذج
+CREATED_FIELDS = {"prediction": "created_at", "point_activity": "timestamp"}
+
+PAYLOADS = {"prediction": prediction_payload, "point_activity": point_activity_payload}
+# صيغ سابقة لا تزال في أوراق مثبتة (الجذر منشور ولا يُعاد حسابه)
+LEGACY_PAYLOADS = {"point_activity": legacy_point_activity_payload}
+
+MODELS = dict(ANCHORED_MODELS)
+
+
+def anchor_settings():
+    return {**DEFAULTS, **getattr(settings, "HCS_ANCHOR", {})}
+
+
+class MerkleAnchorer:
+    """
+    يجمع السجلات المنتظرة (hcs_status = pending_anchor) في دفعات حسب نافذة زمنية
+    أو حجم أقصى، ويبني شجرة Merkle لكل دفعة ويخزن إثبات كل سجل، ثم يدرج رسالة
+    واحدة بالجذر في الـ outbox.
+    """
+
+    def __init__(self, window_seconds=None, max_leaves=None):
+        config = anchor_settings()
+        self.window = timedelta(seconds=float(window_seconds or config["WINDOW_SECONDS"]))
+        self.max_leaves = int(max_leaves or config["MAX_LEAVES"])
+
+    def _pending(self):
+        pending = []
+        for kind, model in ANCHORED_MODELS:
+            rows = model.objects.filter(hcs_status="pending_anchor", anchor__isnull=True).order_by("id").values_list(
+                "id", CREATED_FIELDS[kind]
+            )[:self.max_leaves]
+            pending.extend((kind, pk, created) for pk, created in rows)
+        return pending
+
+    def _ready(self, pending, force):
+        if not pending:
+            return False
+        oldest = min(created for _, _, created in pending)
+        return force or len(pending) >= self.max_leaves or timezone.now() - oldest >= self.window
+
+    def seal(self, force=False):
+        """ختم كل الدفعات الجاهزة - يعيد عدد الجذور المدرجة للنشر"""
+        anchors = 0
+        while True:
+            pending = self._pending()
+            if not self._ready(pending, force):
+                return anchors
+            if not self._seal_batch(pending[:self.max_leaves]):
+                return anchors
+            anchors += 1
+
+    def _seal_batch(self, pending):
+        now = timezone.now()
+        with transaction.atomic():
+            anchor = HcsAnchor.objects.create(
+                merkle_root="", leaf_count=0, window_start=now, window_end=now, topic_id=HEDERA_TOPIC_ID
+            )
+            # الحجز بتحديث شرطي: ما أخذه عامل آخر لا يدخل هذه الدفعة
+            by_kind = {}
+            for kind, pk, _ in pending:
+                by_kind.setdefault(kind, []).append(pk)
+            members = []
+            for kind, ids in by_kind.items():
+                model = MODELS[kind]
+                model.objects.filter(id__in=ids, anchor__isnull=True, hcs_status="pending_anchor").update(anchor=anchor)
+                members.extend((kind, record) for record in model.objects.filter(anchor=anchor).order_by("id"))
+            if not members:
+                anchor.delete()
+                return False
+
+            root, proofs = build_tree([record.message_hash for _, record in members])
+            created = [getattr(record, CREATED_FIELDS[kind]) for kind, record in members]
+            anchor.merkle_root = root
+            anchor.leaf_count = len(members)
+            anchor.window_start = min(created)
+            anchor.window_end = max(created)
+            anchor.hcs_status = "queued"
+            anchor.save(update_fields=["merkle_root", "leaf_count", "window_start", "window_end", "hcs_status"])
+
+            updated = {}
+            for index, ((kind, record), proof) in enumerate(zip(members, proofs)):
+                record.leaf_index = index
+                record.merkle_proof = proof
+                record.hcs_status = "anchoring"
+                updated.setdefault(kind, []).append(record)
+            for kind, records in updated.items():
+                MODELS[kind].objects.bulk_update(records, ["leaf_index", "merkle_proof", "hcs_status"])
+            Prediction.objects.filter(anchor=anchor).update(topic_id=HEDERA_TOPIC_ID)
+
+            enqueue("anchor", anchor, {
+                "root": root,
+                "leaves": anchor.leaf_count,
+                "algorithm": "sha256-merkle",
+                "window_start": anchor.window_start.isoformat(),
+                "window_end": anchor.window_end.isoformat(),
+                "anchor_id": anchor.id,
+            })
+        return True
+
+
+def verify_record(kind, pk):
+    """
+    التحقق من سجل: إعادة حساب بصمته من حقوله، ثم إعادة بناء الجذر من الإثبات
+    ومقارنته بالجذر المثبت على HCS. يعيد None إذا لم يوجد السجل.
+    """
+    model = MODELS.get(kind)
+    if model is None:
+        return None
+    record = model.objects.select_related("anchor").filter(pk=pk).first()
+    if record is None:
+        return None
+
+    recomputed = _sha256_hex(PAYLOADS[kind](record)) if record.message_hash else None
+    if recomputed is not None and recomputed != record.message_hash and kind in LEGACY_PAYLOADS:
+        legacy = _sha256_hex(LEGACY_PAYLOADS[kind](record))
+        if legacy == record.message_hash:
+            recomputed = legacy
+    result = {
+        "kind": kind,
+        "id": record.pk,
+        "leaf_hash": record.message_hash,
+        "recomputed_hash": recomputed,
+        "content_matches": recomputed is not None and recomputed == record.message_hash,
+        "hcs_status": record.hcs_status,
+        "anchored": record.anchor_id is not None,
+        "anchor": None,
+        "proof": record.merkle_proof,
+        "leaf_index": record.leaf_index,
+        "proof_valid": False,
+        "verified": False,
+    }
+    anchor = record.anchor
+    if anchor is not None and record.merkle_proof is not None:
+        result["anchor"] = {
+            "id": anchor.id,
+            "merkle_root": anchor.merkle_root,
+            "leaf_count": anchor.leaf_count,
+            "topic_id": anchor.topic_id,
+            "hcs_status": anchor.hcs_status,
+            "hcs_tx_id": anchor.hcs_tx_id,
+            "window_start": anchor.window_start,
+            "window_end": anchor.window_end,
+        }
+        result["proof_valid"] = verify_proof(record.message_hash, record.merkle_proof, anchor.merkle_root)
+        result["verified"] = result["proof_valid"] and result["content_matches"] and bool(anchor.hcs_tx_id)
+    return result
@@ -7,6 +7,8 @@ from datetime import datetime, timezone
 import requests
 from dotenv import load_dotenv
 
+from portflow_ai.http_client import get_transport
+
 load_dotenv()
 
 HEDERA_SERVICE_URL = os.getenv("HEDERA_SERVICE_URL", "http://127.0.0.1:8787")
@@ -16,27 +18,44 @@ def _sha256_hex(obj: dict) -> str:
     data = json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
     return hashlib.sha256(data).hexdigest()
 
-def publish_prediction(payload: dict) -> dict:
+def build_message(payload: dict, message_type: str = "PORTFLOW_PREDICTION", ts: str = None) -> dict:
     """
-    يرسل التنبؤ إلى خدمة Node (server.js) لنشره على Hedera HCS.
-    تأكد أن HEDERA_TOPIC_ID موجود في .env وأن server.js شغال.
+    رسالة HCS كما تُنشر - تُبنى مرة واحدة (عند الإدراج في الـ outbox) حتى تبقى
+    البصمة قابلة لإعادة الحساب والتحقق لاحقاً.
+    """
+    return {
+        "type": message_type,
+        "hash": _sha256_hex(payload),
+        "ts": ts or datetime.now(timezone.utc).isoformat(),
+        "data": payload,
+    }
+
+def send_message(message: dict) -> dict:
+    """
+    يرسل رسالة جاهزة إلى خدمة Node (server.cjs) لنشرها على Hedera HCS.
     """
     if not HEDERA_TOPIC_ID:
         return {"ok": False, "error": "HEDERA_TOPIC_ID not set in .env"}
 
-    body = {
-        "topicId": HEDERA_TOPIC_ID,
-        "message": {
-            "type": "PORTFLOW_PREDICTION",
-            "hash": _sha256_hex(payload),
-            "ts": datetime.now(timezone.utc).isoformat(),
-            "data": payload,
-        },
-    }
+    body = {"topicId": HEDERA_TOPIC_ID, "message": message}
 
     try:
-        r = requests.post(f"{HEDERA_SERVICE_URL}/hcs/publish", json=body, timeout=15)
+        r = get_transport().post(f"{HEDERA_SERVICE_URL}/hcs/publish", json=body, timeout=15)
         r.raise_for_status()
         return r.json()
     except requests.RequestException as e:
         return {"ok": False, "error": f"publish failed: {e}"}
+
+def stub_send_message(message: dict) -> dict:
+    """
+    بديل محلي للخدمة (للاختبارات والتطوير): نجاح فوري بمعرف معاملة مشتق من البصمة.
+    """
+    return {"ok": True, "status": "SUCCESS", "txId": f"stub-{message['hash'][:16]}", "mock": True}
+
+def publish_prediction(payload: dict) -> dict:
+    """
+    يرسل التنبؤ إلى خدمة Node (server.js) لنشره على Hedera HCS.
+    تأكد أن HEDERA_TOPIC_ID موجود في .env وأن server.js شغال.
+    نشر متزامن - الطلبات تستخدم blockchain.outbox بدلاً منه.
+    """
+    return send_message(build_message(payload))
@@ -0,0 +1,299 @@
+# blockchain/leaderboard.py
+import itertools
+import random
+import threading
+import time
+from datetime import datetime, time as dt_time, timedelta
+
+from django.conf import settings
+from django.db.models import Sum
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import PointActivity, UserScore
+
+PERIODS = ("all", "daily", "weekly")
+
+
+class _Node:
+    __slots__ = ("key", "forward", "span")
+
+    def __init__(self, key, level):
+        self.key = key
+        self.forward = [None] * level
+        self.span = [0] * level
+
+
+class RankedSet:
+    """
+    مجموعة مرتبة (skip list مفهرسة كما في sorted sets لـ Redis):
+    الإدراج والحذف وعدد العناصر الأصغر والوصول حسب الموقع كلها O(log n).
+    span[i] = عدد الخطوات في المستوى 0 حتى العقدة التالية في المستوى i.
+    """
+
+    MAX_LEVEL = 32
+    P = 0.25
+
+    def __init__(self, seed=None):
+        self._head = _Node(None, self.MAX_LEVEL)
+        self._level = 1
+        self._size = 0
+        self._random = random.Random(seed)
+
+    def __len__(self):
+        return self._size
+
+    def _random_level(self):
+        level = 1
+        while level < self.MAX_LEVEL and self._random.random() < self.P:
+            level += 1
+        return level
+
+    def insert(self, key):
+        update = [self._head] * self.MAX_LEVEL
+        rank = [0] * self.MAX_LEVEL
+        node = self._head
+        for i in reversed(range(self._level)):
+            rank[i] = 0 if i == self._level - 1 else rank[i + 1]
+            while node.forward[i] is not None and node.forward[i].key < key:
+                rank[i] += node.span[i]
+                node = node.forward[i]
+            update[i] = node
+
+        level = self._random_level()
+        if level > self._level:
+            for i in range(self._level, level):
+                rank[i] = 0
+                update[i] = self._head
+                self._head.span[i] = self._size
+            self._level = level
+
+        new = _Node(key, level)
+        for i in range(level):
+            new.forward[i] = update[i].forward[i]
+            update[i].forward[i] = new
+            new.span[i] = update[i].span[i] - (rank[0] - rank[i])
+            update[i].span[i] = rank[0] - rank[i] + 1
+        for i in range(level, self._level):
+            update[i].span[i] += 1
+        self._size += 1
+
+    def remove(self, key):
+        update = [None] * self.MAX_LEVEL
+        node = self._head
+        for i in reversed(range(self._level)):
+            while node.forward[i] is not None and node.forward[i].key < key:
+                node = node.forward[i]
+            update[i] = node
+
+        node = node.forward[0]
+        if node is None or node.key != key:
+            return False
+        for i in range(self._level):
+            if update[i].forward[i] is node:
+                update[i].span[i] += node.span[i] - 1
+                update[i].forward[i] = node.forward[i]
+            else:
+                update[i].span[i] -= 1
+        while self._level > 1 and self._head.forward[self._level - 1] is None:
+            self._level -= 1
+        self._size -= 1
+        return True
+
+    def count_less(self, key):
+        """عدد العناصر الأصغر تماماً من key"""
+        count = 0
+        node = self._head
+        for i in reversed(range(self._level)):
+            while node.forward[i] is not None and node.forward[i].key < key:
+                count += node.span[i]
+                node = node.forward[i]
+        return count
+
+    def slice(self, start, count):
+        """count عنصراً ابتداءً من الموقع start (يبدأ من 0)"""
+        if start < 0 or start >= self._size or count <= 0:
+            return []
+        traversed = 0
+        node = self._head
+        for i in reversed(range(self._level)):
+            while node.forward[i] is not None and traversed + node.span[i] <= start + 1:
+                traversed += node.span[i]
+                node = node.forward[i]
+        keys = []
+        while node is not None and len(keys) < count:
+            keys.append(node.key)
+            node = node.forward[0]
+        return keys
+
+
+class Board:
+    """لوحة واحدة: نقاط كل مستخدم + ترتيب بالمفتاح (-النقاط، المستخدم)
+
+    version رقم تسلسل القراءة التي بُنيت منها اللوحة، و versions رقم آخر قراءة
+    كُتبت منها نقاط كل مستخدم بعدها - القراءة الأقدم لا تكتب فوق الأحدث.
+    """
+
+    def __init__(self, scores=(), version=0):
+        self.points = {}
+        self.order = RankedSet()
+        self.version = version
+        self.versions = {}
+        self.loaded_at = time.monotonic()
+        for user_id, points in scores:
+            self.set(user_id, points)
+
+    def __len__(self):
+        return len(self.order)
+
+    def set(self, user_id, points):
+        old = self.points.get(user_id)
+        if old is not None:
+            self.order.remove((-old, user_id))
+        self.points[user_id] = points
+        self.order.insert((-points, user_id))
+
+    def set_if_newer(self, user_id, points, version):
+        """نقاط مطلقة من قراءة رقمها version - تُهمل إذا كانت أقدم مما في اللوحة"""
+        if version <= self.versions.get(user_id, self.version):
+            return False
+        self.versions[user_id] = version
+        if self.points.get(user_id) != points:
+            self.set(user_id, points)
+        return True
+
+    def _entry(self, key):
+        points, user_id = -key[0], key[1]
+        # ترتيب تنافسي (1، 2، 2، 4): المتساوون في النقاط يأخذون نفس الترتيب
+        return {"rank": self.order.count_less((key[0], float("-inf"))) + 1, "user_id": user_id, "points": points}
+
+    def top(self, limit):
+        return [self._entry(key) for key in self.order.slice(0, limit)]
+
+    def rank(self, user_id):
+        points = self.points.get(user_id)
+        if points is None:
+            return None
+        return self._entry((-points, user_id))
+
+    def around(self, user_id, radius):
+        points = self.points.get(user_id)
+        if points is None:
+            return []
+        position = self.order.count_less((-points, user_id))
+        start = max(0, position - radius)
+        return [self._entry(key) for key in self.order.slice(start, position - start + radius + 1)]
+
+
+def period_start(period, moment=None):
+    """بداية الفترة (تاريخ محلي) - None للوحة العامة"""
+    if period == "all":
+        return None
+    day = timezone.localtime(moment or timezone.now()).date()
+    if period == "weekly":
+        day -= timedelta(days=day.weekday())
+    return day
+
+
+def period_bounds(period, start):
+    begin = timezone.make_aware(datetime.combine(start, dt_time.min))
+    return begin, begin + timedelta(days=1 if period == "daily" else 7)
+
+
+class LocalLeaderboard:
+    """
+    لوحات الترتيب في ذاكرة العملية، تُبنى من قاعدة البيانات عند أول طلب
+    وتُحدّث تدريجياً من مسار احتساب النقاط (scoring.apply_pending).
+    تُعاد قراءتها كل LEADERBOARD_REFRESH_SECONDS حتى تلتقط كتابات العمليات الأخرى.
+
+    القراءة من قاعدة البيانات تتم خارج القفل ثم تُبدَّل اللوحة أو النقاط تحته، وكل قراءة
+    تأخذ رقم تسلسل قبل الاستعلام: القراءة ذات الرقم الأكبر ترى كل ما كُتب قبل القراءات
+    الأصغر، فيكفي ألا تكتب قراءة فوق قراءة أحدث منها. record() يضع الرصيد المطلق
+    للمستخدم ولا يضيف فرقاً، فلا يُحتسب النشاط مرتين إذا سبقته إعادة قراءة اللوحة.
+    """
+
+    def __init__(self, refresh_seconds=None, max_boards=None):
+        self.refresh_seconds = refresh_seconds or getattr(settings, "LEADERBOARD_REFRESH_SECONDS", 300)
+        self.max_boards = max_boards or getattr(settings, "LEADERBOARD_MAX_BOARDS", 8)
+        self._boards = {}
+        self._lock = threading.Lock()
+        self._sequence = itertools.count(1)
+
+    def _scores(self, period, start, user_id=None):
+        if period == "all":
+            rows = UserScore.objects.values_list("user_id", "total_points")
+        else:
+            begin, end = period_bounds(period, start)
+            rows = (
+                PointActivity.objects.filter(timestamp__gte=begin, timestamp__lt=end)
+                .values("user_id").annotate(total=Sum("points")).values_list("user_id", "total")
+            )
+        if user_id is not None:
+            rows = rows.filter(user_id=user_id)
+        return rows
+
+    def board(self, period="all", moment=None):
+        if period not in PERIODS:
+            raise ValueError(f"unknown leaderboard period: {period}")
+        key = (period, period_start(period, moment))
+        with self._lock:
+            cached = self._boards.get(key)
+            if cached is not None and time.monotonic() - cached.loaded_at < self.refresh_seconds:
+                return cached
+            version = next(self._sequence)
+
+        board = Board(self._scores(*key), version)
+
+        with self._lock:
+            current = self._boards.get(key)
+            if current is not None:
+                if current.version > version:
+                    return current  # إعادة قراءة متزامنة أحدث سبقتنا
+                # نقاط كُتبت في اللوحة القديمة من قراءات أحدث من قراءتنا
+                for user_id, user_version in current.versions.items():
+                    board.set_if_newer(user_id, current.points[user_id], user_version)
+            self._boards[key] = board
+            while len(self._boards) > self.max_boards:
+                del self._boards[min(self._boards, key=lambda k: self._boards[k].loaded_at)]
+            return board
+
+    def record(self, user_id, activities):
+        """تحديث رصيد المستخدم في اللوحات المحملة التي تشملها أنشطته [(timestamp, points), ...]"""
+        with self._lock:
+            keys = {(period, period_start(period, timestamp)) for timestamp, _ in activities for period in PERIODS}
+            keys = [key for key in keys if key in self._boards]
+            version = next(self._sequence)
+        if not keys:
+            return
+
+        totals = {key: dict(self._scores(*key, user_id=user_id)).get(user_id, 0) for key in keys}
+
+        with self._lock:
+            for key, total in totals.items():
+                board = self._boards.get(key)
+                if board is not None:
+                    board.set_if_newer(user_id, total, version)
+
+    def top(self, period="all", limit=10, moment=None):
+        board = self.board(period, moment)
+        with self._lock:
+            return board.top(limit), len(board)
+
+    def rank(self, user_id, period="all", radius=5, moment=None):
+        board = self.board(period, moment)
+        with self._lock:
+            return board.rank(user_id), board.around(user_id, radius), len(board)
+
+
+_leaderboard = None
+_leaderboard_lock = threading.Lock()
+
+
+def get_leaderboard():
+    """لوحة الترتيب المهيأة في LEADERBOARD_BACKEND (LocalLeaderboard افتراضياً)"""
+    global _leaderboard
+    with _leaderboard_lock:
+        if _leaderboard is None:
+            backend = import_string(getattr(settings, "LEADERBOARD_BACKEND", "blockchain.leaderboard.LocalLeaderboard"))
+            _leaderboard = backend()
+        return _leaderboard
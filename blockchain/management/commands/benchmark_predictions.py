@@ -0,0 +1,92 @@
+"""
+Compare prediction throughput: N single-shot POST /predict/ calls against
+POST /predict/batch/ with the same vessels.
+Usage: python manage.py benchmark_predictions --vessels 1000 --batch-size 250
+
+Requests go through the DRF views in-process (no HTTP server), the batch ones
+as a throwaway authenticated user. Everything is written inside a transaction
+that is rolled back at the end.
+"""
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from blockchain import views
+from blockchain.models import HcsOutbox, Prediction
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Measure single-shot vs batch prediction throughput'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--vessels', type=int, default=1000, help='Number of vessels to score (default: 1000)')
+        parser.add_argument('--batch-size', type=int, default=250, help='Vessels per batch request (default: 250)')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+        vessels = [{
+            'ship_name': f'bench-{i}',
+            'lat': round(random.uniform(-60, 60), 4),
+            'lon': round(random.uniform(-180, 180), 4),
+            'speed': round(random.uniform(0, 25), 1),
+            'heading': round(random.uniform(0, 360), 1),
+        } for i in range(options['vessels'])]
+
+        try:
+            with transaction.atomic():
+                single = self._single(vessels)
+                batch = self._batch(vessels, options['batch_size'])
+                raise Rollback()
+        except Rollback:
+            pass
+
+        self.stdout.write(f"{'path':36} {'requests':>9} {'seconds':>9} {'vessels/s':>11}")
+        for label, requests_made, elapsed in (single, batch):
+            self.stdout.write(f'{label:36} {requests_made:>9} {elapsed:>9.2f} {len(vessels) / elapsed:>11.0f}')
+        self.stdout.write(f'Speed-up: {single[2] / batch[2]:.1f}x')
+
+    def _count(self):
+        return Prediction.objects.count(), HcsOutbox.objects.count()
+
+    def _single(self, vessels):
+        factory = APIRequestFactory()
+        before = self._count()
+        started = time.perf_counter()
+        for vessel in vessels:
+            response = views.predict_view(factory.post('/api/blockchain/predict/', vessel, format='json'))
+            assert response.status_code == 200, response.data
+        elapsed = time.perf_counter() - started
+        self._check(before, len(vessels))
+        return 'single POST /predict/', len(vessels), elapsed
+
+    def _batch(self, vessels, batch_size):
+        factory = APIRequestFactory()
+        before = self._count()
+        started = time.perf_counter()
+        requests_made = 0
+        user = get_user_model().objects.create_user(username='benchmark-predictions')
+        for start in range(0, len(vessels), batch_size):
+            chunk = vessels[start:start + batch_size]
+            request = factory.post('/api/blockchain/predict/batch/', {'vessels': chunk}, format='json')
+            force_authenticate(request, user=user)
+            response = views.predict_batch_view(request)
+            assert response.status_code == 200, response.data
+            assert [p['ship_name'] for p in response.data['predictions']] == [v['ship_name'] for v in chunk]
+            requests_made += 1
+        elapsed = time.perf_counter() - started
+        self._check(before, len(vessels))
+        return f'batch POST /predict/batch/ ({batch_size})', requests_made, elapsed
+
+    def _check(self, before, expected):
+        predictions, outbox = self._count()
+        if predictions - before[0] != expected:
+            self.stderr.write(f'expected {expected} predictions, got {predictions - before[0]}')
@@ -0,0 +1,51 @@
+"""
+Background worker that drains the HCS outbox (blockchain.models.HcsOutbox).
+Usage: python manage.py run_hcs_publisher [--once] [--concurrency 4] [--batch-size 100]
+"""
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+
+from blockchain.outbox import HcsPublisher
+
+
+class Command(BaseCommand):
+    help = 'Publish pending Hedera HCS messages from the outbox with bounded concurrency and retries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Drain what is ready now and exit')
+        parser.add_argument('--concurrency', type=int, help='Parallel sidecar requests (default: HCS_OUTBOX CONCURRENCY)')
+        parser.add_argument('--batch-size', type=int, help='Messages claimed per batch (default: HCS_OUTBOX BATCH_SIZE)')
+        parser.add_argument('--poll-interval', type=float, help='Seconds to sleep when the outbox is empty')
+        parser.add_argument('--stub', action='store_true', help='Use the local stub instead of the Hedera sidecar')
+
+    def handle(self, *args, **options):
+        publisher = None
+        if options['stub']:
+            from blockchain.hedera_client import stub_send_message
+            publisher = stub_send_message
+
+        worker = HcsPublisher(
+            publisher=publisher,
+            concurrency=options['concurrency'],
+            batch_size=options['batch_size'],
+            poll_interval=options['poll_interval'],
+        )
+
+        if options['once']:
+            totals = worker.drain()
+            self.stdout.write(self.style.SUCCESS(
+                f"✅ published={totals['published']} retried={totals['retried']} "
+                f"failed={totals['failed']} lost={totals['lost']} batches={totals['batches']}"
+            ))
+            return
+
+        stop = threading.Event()
+        signal.signal(signal.SIGTERM, lambda *_: stop.set())
+        self.stdout.write(f'🚀 HCS publisher running (concurrency={worker.concurrency}, batch={worker.batch_size})')
+        try:
+            worker.run_forever(stop)
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write('🛑 HCS publisher stopped')
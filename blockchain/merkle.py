@@ -0,0 +1,54 @@
+# blockchain/merkle.py
+import hashlib
+
+# الأوراق هي بصمات sha256 لبيانات JSON (تبدأ بـ "{")، والعقد الداخلية تُسبق
+# بالبايت 0x01 فلا يمكن أن تتطابق ورقة مع عقدة داخلية.
+NODE_PREFIX = b"\x01"
+
+
+def hash_node(left_hex: str, right_hex: str) -> str:
+    return hashlib.sha256(NODE_PREFIX + bytes.fromhex(left_hex) + bytes.fromhex(right_hex)).hexdigest()
+
+
+def build_tree(leaves):
+    """
+    يبني شجرة Merkle من بصمات الأوراق (hex) ويعيد (الجذر، إثبات كل ورقة).
+    العقدة الفردية في أي مستوى تُرفع كما هي دون تكرار.
+    الإثبات قائمة [{"side": "left"|"right", "hash": ...}] من الورقة إلى الجذر.
+    """
+    if not leaves:
+        raise ValueError("cannot build a Merkle tree without leaves")
+
+    proofs = [[] for _ in leaves]
+    # كل عنصر: (البصمة، فهارس الأوراق تحته)
+    level = [(leaf, [index]) for index, leaf in enumerate(leaves)]
+    while len(level) > 1:
+        next_level = []
+        for i in range(0, len(level) - 1, 2):
+            (left, left_leaves), (right, right_leaves) = level[i], level[i + 1]
+            for index in left_leaves:
+                proofs[index].append({"side": "right", "hash": right})
+            for index in right_leaves:
+                proofs[index].append({"side": "left", "hash": left})
+            next_level.append((hash_node(left, right), left_leaves + right_leaves))
+        if len(level) % 2:
+            next_level.append(level[-1])
+        level = next_level
+    return level[0][0], proofs
+
+
+def root_from_proof(leaf: str, proof) -> str:
+    current = leaf
+    for step in proof:
+        if step["side"] == "left":
+            current = hash_node(step["hash"], current)
+        else:
+            current = hash_node(current, step["hash"])
+    return current
+
+
+def verify_proof(leaf: str, proof, root: str) -> bool:
+    try:
+        return root_from_proof(leaf, proof) == root
+    except (KeyError, TypeError, ValueError):
+        return False
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:09
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blockchain', '0002_pointactivity_userscore'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RenameField(
+            model_name='prediction',
+            old_name='hcs_tx',
+            new_name='hcs_tx_id',
+        ),
+        migrations.AddField(
+            model_name='prediction',
+            name='hcs_status',
+            field=models.CharField(blank=True, max_length=50, null=True),
+        ),
+        migrations.AddField(
+            model_name='prediction',
+            name='message_hash',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='prediction',
+            name='topic_id',
+            field=models.CharField(blank=True, max_length=120, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='pointactivity',
+            index=models.Index(fields=['user', '-timestamp', '-id'], name='blockchain__user_id_beb7be_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='prediction',
+            index=models.Index(fields=['-created_at', '-id'], name='blockchain__created_02acf0_idx'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:20
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blockchain', '0003_prediction_hcs_fields_and_cursor_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HcsOutbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=30)),
+                ('object_id', models.BigIntegerField()),
+                ('message', models.JSONField()),
+                ('status', models.CharField(choices=[('pending', 'في الانتظار'), ('sending', 'قيد الإرسال'), ('published', 'منشور'), ('failed', 'فشل نهائي')], default='pending', max_length=20)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('claim_token', models.CharField(blank=True, max_length=32)),
+                ('locked_until', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True)),
+                ('hcs_status', models.CharField(blank=True, max_length=50)),
+                ('hcs_tx_id', models.CharField(blank=True, max_length=200)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('published_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='blockchain__status_636c07_idx'), models.Index(fields=['claim_token'], name='blockchain__claim_t_cbe33c_idx'), models.Index(fields=['kind', 'object_id'], name='blockchain__kind_424240_idx')],
+            },
+        ),
+    ]
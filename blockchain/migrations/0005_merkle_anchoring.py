@@ -0,0 +1,73 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:22
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blockchain', '0004_hcsoutbox'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HcsAnchor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('merkle_root', models.CharField(max_length=64)),
+                ('leaf_count', models.PositiveIntegerField()),
+                ('window_start', models.DateTimeField()),
+                ('window_end', models.DateTimeField()),
+                ('topic_id', models.CharField(blank=True, max_length=120, null=True)),
+                ('hcs_status', models.CharField(blank=True, max_length=50, null=True)),
+                ('hcs_tx_id', models.CharField(blank=True, max_length=200, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='pointactivity',
+            name='leaf_index',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='pointactivity',
+            name='merkle_proof',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='pointactivity',
+            name='message_hash',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='prediction',
+            name='leaf_index',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='prediction',
+            name='merkle_proof',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='pointactivity',
+            name='anchor',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='activities', to='blockchain.hcsanchor'),
+        ),
+        migrations.AddField(
+            model_name='prediction',
+            name='anchor',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='predictions', to='blockchain.hcsanchor'),
+        ),
+        migrations.AddIndex(
+            model_name='pointactivity',
+            index=models.Index(fields=['hcs_status', 'id'], name='blockchain__hcs_sta_348f9d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='prediction',
+            index=models.Index(fields=['hcs_status', 'id'], name='blockchain__hcs_sta_6c6086_idx'),
+        ),
+    ]
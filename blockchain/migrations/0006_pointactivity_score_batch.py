@@ -0,0 +1,30 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:24
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blockchain', '0005_merkle_anchoring'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        # الأنشطة الموجودة احتُسبت سابقاً في UserScore
+        migrations.AddField(
+            model_name='pointactivity',
+            name='score_batch',
+            field=models.CharField(blank=True, default='legacy', max_length=32),
+        ),
+        migrations.AlterField(
+            model_name='pointactivity',
+            name='score_batch',
+            field=models.CharField(blank=True, default='', max_length=32),
+        ),
+        migrations.AddIndex(
+            model_name='pointactivity',
+            index=models.Index(fields=['user', 'score_batch'], name='blockchain__user_id_b4006d_idx'),
+        ),
+    ]
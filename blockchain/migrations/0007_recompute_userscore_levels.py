@@ -0,0 +1,24 @@
+from django.db import migrations
+from django.db.models import Case, Value, When
+
+
+def recompute_levels(apps, schema_editor):
+    # الصفوف القديمة تحمل أسماء المستويات العربية - المستوى يُعاد حسابه من الرصيد بجدول scoring.LEVELS
+    from blockchain.scoring import LEVELS
+
+    UserScore = apps.get_model('blockchain', 'UserScore')
+    UserScore.objects.using(schema_editor.connection.alias).update(level=Case(
+        *[When(total_points__gte=threshold, then=Value(level)) for threshold, level in LEVELS[:-1]],
+        default=Value(LEVELS[-1][1]),
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blockchain', '0006_pointactivity_score_batch'),
+    ]
+
+    operations = [
+        migrations.RunPython(recompute_levels, migrations.RunPython.noop),
+    ]
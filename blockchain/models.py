@@ -6,6 +6,22 @@ from django.db import models
 # blockchain/models.py
 from django.db import models
 from django.conf import settings  # لاستخدام AUTH_USER_MODEL
+from django.utils import timezone
+
+class HcsAnchor(models.Model):
+    """جذر شجرة Merkle لدفعة سجلات - يُنشر على HCS برسالة واحدة بدل رسالة لكل سجل"""
+    merkle_root = models.CharField(max_length=64)
+    leaf_count = models.PositiveIntegerField()
+    window_start = models.DateTimeField()
+    window_end = models.DateTimeField()
+    topic_id = models.CharField(max_length=120, null=True, blank=True)
+    hcs_status = models.CharField(max_length=50, null=True, blank=True)
+    hcs_tx_id = models.CharField(max_length=200, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"anchor #{self.pk} {self.merkle_root[:12]}… ({self.leaf_count} leaves)"
+
 
 class Prediction(models.Model):
     ship_name   = models.CharField(max_length=120)
@@ -17,10 +33,18 @@ class Prediction(models.Model):
     hcs_status  = models.CharField(max_length=50, null=True, blank=True)
     hcs_tx_id   = models.CharField(max_length=120, null=True, blank=True)
     created_at  = models.DateTimeField(auto_now_add=True)
+    # وضع الدفعات: message_hash هي ورقة Merkle، والإثبات يربطها بجذر anchor
+    anchor      = models.ForeignKey(HcsAnchor, on_delete=models.SET_NULL, null=True, blank=True, related_name="predictions")
+    leaf_index  = models.PositiveIntegerField(null=True, blank=True)
+    merkle_proof = models.JSONField(null=True, blank=True)
 
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["-created_at", "-id"]),  # صفحات cursor
+            models.Index(fields=["hcs_status", "id"]),  # السجلات المنتظرة للتثبيت
+        ]
 
     def __str__(self):
         return f"{self.ship_name} ({self.risk_score:.2f})"
@@ -33,6 +57,18 @@ class PointActivity(models.Model):
     timestamp = models.DateTimeField(auto_now_add=True)
     hcs_status = models.CharField(max_length=50, blank=True, null=True)
     hcs_tx_id = models.CharField(max_length=200, blank=True, null=True)
+    message_hash = models.CharField(max_length=64, null=True, blank=True)
+    anchor = models.ForeignKey(HcsAnchor, on_delete=models.SET_NULL, null=True, blank=True, related_name="activities")
+    leaf_index = models.PositiveIntegerField(null=True, blank=True)
+    merkle_proof = models.JSONField(null=True, blank=True)
+    score_batch = models.CharField(max_length=32, blank=True, default="")  # فارغ = لم يُحتسب في UserScore بعد
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "-timestamp", "-id"]),  # صفحات cursor
+            models.Index(fields=["user", "score_batch"]),  # الأنشطة غير المحتسبة
+            models.Index(fields=["hcs_status", "id"]),  # السجلات المنتظرة للتثبيت
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.activity_type} ({self.points} pts)"
@@ -46,3 +82,37 @@ class UserScore(models.Model):
     def __str__(self):
         return f"{self.user.username}: {self.total_points} pts"
 
+
+
+class HcsOutbox(models.Model):
+    """صندوق صادر دائم لرسائل Hedera HCS - ينشرها العامل run_hcs_publisher"""
+    STATUS_CHOICES = (
+        ("pending", "في الانتظار"),
+        ("sending", "قيد الإرسال"),
+        ("published", "منشور"),
+        ("failed", "فشل نهائي"),
+    )
+
+    kind = models.CharField(max_length=30)  # prediction / point_activity
+    object_id = models.BigIntegerField()
+    message = models.JSONField()  # الرسالة كاملة كما ستُنشر (hash + ts + data)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pending")
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    claim_token = models.CharField(max_length=32, blank=True)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    hcs_status = models.CharField(max_length=50, blank=True)
+    hcs_tx_id = models.CharField(max_length=200, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    published_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "next_attempt_at"]),
+            models.Index(fields=["claim_token"]),
+            models.Index(fields=["kind", "object_id"]),
+        ]
+
+    def __str__(self):
+        return f"{self.kind}#{self.object_id} ({self.status})"
@@ -0,0 +1,279 @@
+# blockchain/outbox.py
+import random
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .hedera_client import HEDERA_TOPIC_ID, _sha256_hex, build_message
+from .models import HcsAnchor, HcsOutbox, PointActivity, Prediction
+
+DEFAULTS = {
+    "CONCURRENCY": 4,
+    "BATCH_SIZE": 100,
+    "MAX_ATTEMPTS": 8,
+    "BACKOFF_BASE": 2.0,
+    "BACKOFF_MAX": 300.0,
+    "LEASE_SECONDS": 120,
+    "POLL_INTERVAL": 2.0,
+}
+
+# نوع السجل -> (النموذج، نوع رسالة HCS)
+TARGETS = {
+    "prediction": (Prediction, "PORTFLOW_PREDICTION"),
+    "point_activity": (PointActivity, "POINT_ACTIVITY"),
+    "anchor": (HcsAnchor, "PORTFLOW_MERKLE_ANCHOR"),
+}
+
+# نماذج السجلات التي يمكن تثبيتها بدفعات Merkle
+ANCHORED_MODELS = (("prediction", Prediction), ("point_activity", PointActivity))
+
+
+def outbox_settings():
+    return {**DEFAULTS, **getattr(settings, "HCS_OUTBOX", {})}
+
+
+def batch_anchoring():
+    """وضع الدفعات: السجلات تُجمع في شجرة Merkle وينشر جذرها فقط (blockchain.anchoring)"""
+    return getattr(settings, "HCS_ANCHOR", {}).get("MODE", "single") == "batch"
+
+
+def prediction_payload(prediction):
+    """بيانات التنبؤ المنشورة - نفس الحقول التي كان predict_view ينشرها"""
+    return {
+        "ship_name": prediction.ship_name,
+        "lat": prediction.lat,
+        "lon": prediction.lon,
+        "risk_score": prediction.risk_score,
+    }
+
+
+def point_activity_payload(activity, score=None):
+    """بيانات نشاط النقاط المنشورة - المستخدم بمعرفه الثابت فلا تتغير البصمة إذا غيّر اسمه"""
+    payload = {
+        "type": "POINT_ACTIVITY",
+        "user_id": activity.user_id,
+        "activity": activity.activity_type,
+        "points": activity.points,
+        "timestamp": activity.timestamp.isoformat(),
+    }
+    if score is not None:
+        payload["total_points"] = score.total_points
+        payload["level"] = score.level
+    return payload
+
+
+def legacy_point_activity_payload(activity):
+    """الصيغة الأولى باسم المستخدم - للتحقق من الأوراق المثبتة قبل التحويل إلى user_id فقط"""
+    return {
+        "type": "POINT_ACTIVITY",
+        "user": activity.user.username,
+        "activity": activity.activity_type,
+        "points": activity.points,
+        "timestamp": activity.timestamp.isoformat(),
+    }
+
+
+def enqueue(kind, obj, payload):
+    """إدراج رسالة في الـ outbox ضمن نفس معاملة حفظ السجل - لا اتصال بالشبكة هنا"""
+    _, message_type = TARGETS[kind]
+    message = build_message(payload, message_type)
+    return HcsOutbox.objects.create(kind=kind, object_id=obj.pk, message=message)
+
+
+def enqueue_prediction(prediction):
+    # القيم كما خُزنت (float وليس نص الطلب) حتى تبقى البصمة قابلة لإعادة الحساب
+    prediction.refresh_from_db(fields=["ship_name", "lat", "lon", "risk_score"])
+    if batch_anchoring():
+        prediction.message_hash = _sha256_hex(prediction_payload(prediction))
+        prediction.hcs_status = "pending_anchor"
+        Prediction.objects.filter(pk=prediction.pk).update(message_hash=prediction.message_hash, hcs_status="pending_anchor")
+        return None
+    entry = enqueue("prediction", prediction, prediction_payload(prediction))
+    Prediction.objects.filter(pk=prediction.pk).update(
+        message_hash=entry.message["hash"], topic_id=HEDERA_TOPIC_ID, hcs_status="queued"
+    )
+    prediction.message_hash = entry.message["hash"]
+    prediction.topic_id = HEDERA_TOPIC_ID
+    prediction.hcs_status = "queued"
+    return entry
+
+
+def create_predictions(predictions):
+    """
+    نسخة الدفعة من enqueue_prediction لتنبؤات غير محفوظة: البصمة والحالة تُحسب قبل
+    الإدراج، ثم bulk_create للتنبؤات و bulk_create لرسائل الـ outbox.
+    يعيد عدد الرسائل المدرجة (0 في وضع الدفعات - ينتظر السجل ختم شجرة Merkle).
+    """
+    anchored = batch_anchoring()
+    _, message_type = TARGETS["prediction"]
+    messages = []
+    for prediction in predictions:
+        payload = prediction_payload(prediction)
+        if anchored:
+            prediction.message_hash = _sha256_hex(payload)
+            prediction.hcs_status = "pending_anchor"
+        else:
+            message = build_message(payload, message_type)
+            messages.append(message)
+            prediction.message_hash = message["hash"]
+            prediction.topic_id = HEDERA_TOPIC_ID
+            prediction.hcs_status = "queued"
+    Prediction.objects.bulk_create(predictions)
+    HcsOutbox.objects.bulk_create([
+        HcsOutbox(kind="prediction", object_id=prediction.pk, message=message)
+        for prediction, message in zip(predictions, messages)
+    ])
+    return len(messages)
+
+
+def enqueue_point_activity(activity, score=None):
+    if batch_anchoring():
+        # بدون الرصيد الحالي حتى تبقى الورقة قابلة لإعادة الحساب من السجل نفسه
+        activity.message_hash = _sha256_hex(point_activity_payload(activity))
+        activity.hcs_status = "pending_anchor"
+        PointActivity.objects.filter(pk=activity.pk).update(message_hash=activity.message_hash, hcs_status="pending_anchor")
+        return None
+    entry = enqueue("point_activity", activity, point_activity_payload(activity, score))
+    PointActivity.objects.filter(pk=activity.pk).update(hcs_status="queued")
+    activity.hcs_status = "queued"
+    return entry
+
+
+class HcsPublisher:
+    """عامل النشر: يحجز دفعات من الـ outbox وينشرها بتوازٍ محدود
+
+    - الحجز بتحديث شرطي (claim_token) فيمكن تشغيل أكثر من عامل بأمان،
+      والرسائل المحجوزة من عامل متوقف تعود بعد انتهاء LEASE_SECONDS.
+    - الفشل يُعاد بتأخير أُسّي مع jitter حتى MAX_ATTEMPTS ثم يصبح failed.
+    - النتائج تُكتب في معاملة واحدة، وكل رسالة بتحديث مشروط بـ claim_token فلا
+      يكتب عامل انتهى قفله فوق نتيجة عامل أعاد حجزها (تُحسب lost وتُهمل).
+    """
+
+    def __init__(self, publisher=None, **overrides):
+        config = outbox_settings()
+        config.update({key.upper(): value for key, value in overrides.items() if value is not None})
+        self.concurrency = int(config["CONCURRENCY"])
+        self.batch_size = int(config["BATCH_SIZE"])
+        self.max_attempts = int(config["MAX_ATTEMPTS"])
+        self.backoff_base = float(config["BACKOFF_BASE"])
+        self.backoff_max = float(config["BACKOFF_MAX"])
+        self.lease_seconds = float(config["LEASE_SECONDS"])
+        self.poll_interval = float(config["POLL_INTERVAL"])
+        self.publisher = publisher or import_string(
+            getattr(settings, "HCS_PUBLISHER", "blockchain.hedera_client.send_message")
+        )
+
+    def claim(self):
+        now = timezone.now()
+        token = uuid.uuid4().hex
+        ready = Q(status="pending", next_attempt_at__lte=now) | Q(status="sending", locked_until__lt=now)
+        ids = list(HcsOutbox.objects.filter(ready).order_by("id").values_list("id", flat=True)[:self.batch_size])
+        if not ids:
+            return []
+        HcsOutbox.objects.filter(ready, id__in=ids).update(
+            status="sending", claim_token=token, locked_until=now + timedelta(seconds=self.lease_seconds)
+        )
+        return list(HcsOutbox.objects.filter(claim_token=token, status="sending").order_by("id"))
+
+    def _send(self, entry):
+        try:
+            return self.publisher(entry.message)
+        except Exception as e:
+            return {"ok": False, "error": str(e)}
+
+    def _backoff(self, attempts):
+        delay = min(self.backoff_max, self.backoff_base * (2 ** (attempts - 1)))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def publish(self, entries):
+        """نشر دفعة محجوزة وكتابة النتائج - يعيد عدد المنشور/المؤجل/الفاشل/المفقود حجزه"""
+        counts = {"published": 0, "retried": 0, "failed": 0, "lost": 0}
+        if not entries:
+            return counts
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            results = list(pool.map(self._send, entries))
+
+        now = timezone.now()
+        with transaction.atomic():
+            published = {}
+            failed = {}
+            for entry, result in zip(entries, results):
+                fields = {"attempts": entry.attempts + 1, "claim_token": "", "locked_until": None}
+                if result.get("ok"):
+                    fields.update(
+                        status="published", hcs_status=result.get("status") or "SUCCESS",
+                        hcs_tx_id=result.get("txId") or "", published_at=now, last_error="",
+                    )
+                elif fields["attempts"] >= self.max_attempts:
+                    fields.update(status="failed", last_error=str(result.get("error", "unknown error")))
+                else:
+                    fields.update(
+                        status="pending", last_error=str(result.get("error", "unknown error")),
+                        next_attempt_at=now + timedelta(seconds=self._backoff(fields["attempts"])),
+                    )
+
+                # الكتابة مشروطة بالحجز: إذا انتهى القفل وحجز عامل آخر الرسالة فنتيجته هي المعتمدة
+                if not HcsOutbox.objects.filter(pk=entry.pk, claim_token=entry.claim_token, status="sending").update(**fields):
+                    counts["lost"] += 1
+                    continue
+                for field, value in fields.items():
+                    setattr(entry, field, value)
+                if entry.status == "published":
+                    published.setdefault(entry.kind, {})[entry.object_id] = entry
+                    counts["published"] += 1
+                elif entry.status == "failed":
+                    failed.setdefault(entry.kind, []).append(entry.object_id)
+                    counts["failed"] += 1
+                else:
+                    counts["retried"] += 1
+
+            for kind, by_object in published.items():
+                model, _ = TARGETS[kind]
+                targets = list(model.objects.filter(pk__in=list(by_object)).only("pk", "hcs_status", "hcs_tx_id"))
+                for target in targets:
+                    target.hcs_status = by_object[target.pk].hcs_status
+                    target.hcs_tx_id = by_object[target.pk].hcs_tx_id
+                model.objects.bulk_update(targets, ["hcs_status", "hcs_tx_id"])
+
+            # جذر منشور: كل سجلات الدفعة تأخذ معاملة الجذر
+            for anchor_id, entry in published.get("anchor", {}).items():
+                for _, model in ANCHORED_MODELS:
+                    model.objects.filter(anchor_id=anchor_id).update(hcs_status=entry.hcs_status, hcs_tx_id=entry.hcs_tx_id)
+
+            for kind, object_ids in failed.items():
+                model, _ = TARGETS[kind]
+                model.objects.filter(pk__in=object_ids).update(hcs_status="failed")
+                if kind == "anchor":
+                    for _, member_model in ANCHORED_MODELS:
+                        member_model.objects.filter(anchor_id__in=object_ids).update(hcs_status="failed")
+
+        return counts
+
+    def drain(self, max_batches=None):
+        """نشر كل ما هو جاهز الآن ثم التوقف"""
+        totals = {"published": 0, "retried": 0, "failed": 0, "lost": 0, "batches": 0}
+        if batch_anchoring():
+            from .anchoring import MerkleAnchorer
+            totals["anchors"] = MerkleAnchorer().seal()
+        while max_batches is None or totals["batches"] < max_batches:
+            entries = self.claim()
+            if not entries:
+                break
+            for key, value in self.publish(entries).items():
+                totals[key] += value
+            totals["batches"] += 1
+        return totals
+
+    def run_forever(self, stop=None):
+        while not (stop and stop.is_set()):
+            totals = self.drain()
+            if not totals["batches"]:
+                time.sleep(self.poll_interval)
@@ -0,0 +1,106 @@
+# blockchain/scoring.py
+import uuid
+from collections import defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, Value, When
+
+from .leaderboard import get_leaderboard
+from .models import PointActivity, UserScore
+from .outbox import enqueue_point_activity
+
+# جدول المستويات الوحيد: (الحد الأدنى للنقاط، المستوى) من الأعلى إلى الأدنى
+LEVELS = (
+    (1000, "Expert"),
+    (500, "Avancé"),
+    (100, "Intermédiaire"),
+    (0, "Débutant"),
+)
+
+
+def level_for(points):
+    for threshold, level in LEVELS:
+        if points >= threshold:
+            return level
+    return LEVELS[-1][1]
+
+
+def level_expression(delta):
+    """
+    المستوى بعد إضافة delta محسوباً داخل نفس جملة UPDATE.
+    الطرف الأيمن في SET يقرأ القيمة القديمة، لذلك نقارن total_points بـ (الحد - delta).
+    """
+    return Case(
+        *[When(total_points__gte=threshold - delta, then=Value(level)) for threshold, level in LEVELS[:-1]],
+        default=Value(LEVELS[-1][1]),
+    )
+
+
+def increment(user_id, delta):
+    """إضافة delta للرصيد بجملة UPDATE واحدة (F) - لا قراءة ثم كتابة"""
+    updated = UserScore.objects.filter(user_id=user_id).update(
+        total_points=F("total_points") + delta, level=level_expression(delta)
+    )
+    if updated:
+        return
+    try:
+        with transaction.atomic():
+            UserScore.objects.create(user_id=user_id, total_points=delta, level=level_for(delta))
+    except IntegrityError:
+        # طلب متزامن أنشأ الرصيد أولاً
+        UserScore.objects.filter(user_id=user_id).update(
+            total_points=F("total_points") + delta, level=level_expression(delta)
+        )
+
+
+def apply_pending(user_id):
+    """
+    تطبيق كل أنشطة المستخدم غير المحتسبة بزيادة واحدة.
+    الحجز بتحديث شرطي (score_batch) قبل الجمع، فكل نشاط يُحتسب مرة واحدة فقط
+    حتى لو استدعى أكثر من طلب هذه الدالة معاً، وأنشطة المستخدم النشط تُدمج في زيادة واحدة.
+    يعيد عدد الأنشطة المحتسبة.
+    """
+    token = uuid.uuid4().hex
+    with transaction.atomic():
+        claimed = PointActivity.objects.filter(user_id=user_id, score_batch="").update(score_batch=token)
+        if not claimed:
+            return 0
+        activities = list(
+            PointActivity.objects.filter(user_id=user_id, score_batch=token).values_list("timestamp", "points")
+        )
+        delta = sum(points for _, points in activities)
+        if delta:
+            increment(user_id, delta)
+            # لوحات الترتيب تُحدّث بعد نجاح المعاملة فقط
+            transaction.on_commit(lambda: get_leaderboard().record(user_id, activities))
+    return claimed
+
+
+def award(user, activity_type, points):
+    """تسجيل نشاط واحتسابه - الإشارة post_save تطبق النقاط وتدرج رسالة HCS"""
+    with transaction.atomic():
+        activity = PointActivity.objects.create(user=user, activity_type=activity_type, points=points)
+    return activity, UserScore.objects.get(user=user)
+
+
+def award_many(entries):
+    """
+    تسجيل دفعة أنشطة [(user, activity_type, points), ...] بـ bulk_create
+    ثم زيادة واحدة لكل مستخدم مهما كان عدد أنشطته.
+    """
+    with transaction.atomic():
+        activities = PointActivity.objects.bulk_create([
+            PointActivity(user=user, activity_type=activity_type, points=points)
+            for user, activity_type, points in entries
+        ])
+        by_user = defaultdict(list)
+        for activity in activities:
+            by_user[activity.user_id].append(activity)
+        for user_id in by_user:
+            apply_pending(user_id)
+        scores = UserScore.objects.in_bulk(list(by_user), field_name="user_id")
+        for user_id, user_activities in by_user.items():
+            for activity in user_activities:
+                enqueue_point_activity(activity, scores.get(user_id))
+    return activities
+
@@ -0,0 +1,18 @@
+# blockchain/signals.py
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import PointActivity, UserScore
+from .outbox import enqueue_point_activity
+from .scoring import apply_pending
+
+
+@receiver(post_save, sender=PointActivity)
+def update_user_score_and_publish(sender, instance, created, **kwargs):
+    if created:
+        # 1️⃣ احتساب النقاط بزيادة ذرية (blockchain.scoring)
+        apply_pending(instance.user_id)
+        score_obj = UserScore.objects.filter(user_id=instance.user_id).first()
+
+        # 2️⃣ إدراج الرسالة في صندوق الصادر - النشر على Hedera يتم في العامل run_hcs_publisher
+        enqueue_point_activity(instance, score_obj)
@@ -1,3 +1,325 @@
-from django.test import TestCase
+import bisect
+import hashlib
+import importlib
+import random
+import threading
+from datetime import timedelta
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.db import close_old_connections, connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from ships.models import Ship
+
+from .anchoring import verify_record
+from .hedera_client import _sha256_hex
+from .leaderboard import Board, LocalLeaderboard, RankedSet
+from .merkle import build_tree, hash_node, verify_proof
+from .models import HcsOutbox, PointActivity, Prediction, UserScore
+from .outbox import HcsPublisher, legacy_point_activity_payload
+from .scoring import LEVELS, apply_pending, award, level_for
+
+
+class ScoringLedgerConcurrencyTests(TransactionTestCase):
+    """زيادات متزامنة على نفس المستخدم - لا يضيع أي تحديث ولا يُحتسب نشاط مرتين"""
+
+    THREADS = 8
+    AWARDS_PER_THREAD = 25
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="hot-user", password="x")
+
+    def _run_threads(self, target):
+        errors = []
+        barrier = threading.Barrier(self.THREADS)
+
+        def worker(index):
+            try:
+                barrier.wait()
+                target(index)
+            except Exception as e:  # noqa: BLE001 - تُعرض في فشل الاختبار
+                errors.append(e)
+            finally:
+                close_old_connections()
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+    def test_concurrent_awards_do_not_lose_updates(self):
+        self._run_threads(lambda index: [
+            award(self.user, "burst", index + 1) for _ in range(self.AWARDS_PER_THREAD)
+        ])
+
+        expected = sum(index + 1 for index in range(self.THREADS)) * self.AWARDS_PER_THREAD
+        score = UserScore.objects.get(user=self.user)
+        self.assertEqual(PointActivity.objects.filter(user=self.user).count(), self.THREADS * self.AWARDS_PER_THREAD)
+        self.assertEqual(score.total_points, expected)
+        self.assertEqual(score.level, level_for(expected))
+        self.assertFalse(PointActivity.objects.filter(user=self.user, score_batch="").exists())
+
+    def test_concurrent_apply_counts_each_activity_once(self):
+        PointActivity.objects.bulk_create(
+            [PointActivity(user=self.user, activity_type="bulk", points=3) for _ in range(200)]
+        )
+        self._run_threads(lambda index: apply_pending(self.user.id))
+
+        self.assertEqual(UserScore.objects.get(user=self.user).total_points, 600)
+        self.assertEqual(apply_pending(self.user.id), 0)
+
+
+class LevelTableTests(TransactionTestCase):
+    def test_level_recomputed_in_update(self):
+        user = get_user_model().objects.create_user(username="levels", password="x")
+        for threshold, level in reversed(LEVELS[:-1]):
+            current = UserScore.objects.filter(user=user).values_list("total_points", flat=True).first() or 0
+            award(user, "step", threshold - current)
+            self.assertEqual(UserScore.objects.get(user=user).level, level)
+
+    def test_migration_recomputes_legacy_levels(self):
+        from django.apps import apps
+        recompute_levels = importlib.import_module('blockchain.migrations.0007_recompute_userscore_levels').recompute_levels
+
+        for username, points, legacy in (("a", 0, "مبتدئ"), ("b", 150, "متوسط"), ("c", 1200, "خبير")):
+            user = get_user_model().objects.create_user(username=username, password="x")
+            UserScore.objects.create(user=user, total_points=points, level=legacy)
+        recompute_levels(apps, connection.schema_editor())
+
+        self.assertEqual(
+            dict(UserScore.objects.values_list("total_points", "level")),
+            {points: level_for(points) for points in (0, 150, 1200)},
+        )
+
+
+class OutboxClaimTests(TestCase):
+    """نتيجة عامل انتهى قفله لا تكتب فوق نتيجة العامل الذي أعاد حجز الرسالة"""
+
+    def setUp(self):
+        self.prediction = Prediction.objects.create(ship_name="Atlas", risk_score=0.4, hcs_status="queued")
+        self.entry = HcsOutbox.objects.create(kind="prediction", object_id=self.prediction.pk, message={"hash": "h"})
+
+    def publisher(self, tx_id, ok=True):
+        return HcsPublisher(publisher=lambda message: {"ok": ok, "status": "SUCCESS", "txId": tx_id, "error": "down"})
+
+    def test_expired_claim_is_dropped(self):
+        stale = self.publisher("tx-stale")
+        stale_entries = stale.claim()
+        HcsOutbox.objects.filter(pk=self.entry.pk).update(locked_until=timezone.now() - timedelta(seconds=1))
+
+        fresh = self.publisher("tx-fresh")
+        self.assertEqual(fresh.publish(fresh.claim())["published"], 1)
+        self.assertEqual(stale.publish(stale_entries), {"published": 0, "retried": 0, "failed": 0, "lost": 1})
+
+        self.entry.refresh_from_db()
+        self.prediction.refresh_from_db()
+        self.assertEqual((self.entry.status, self.entry.hcs_tx_id, self.entry.attempts), ("published", "tx-fresh", 1))
+        self.assertEqual(self.prediction.hcs_tx_id, "tx-fresh")
+
+    def test_failure_is_retried_with_backoff(self):
+        worker = self.publisher("", ok=False)
+        self.assertEqual(worker.publish(worker.claim())["retried"], 1)
+
+        self.entry.refresh_from_db()
+        self.assertEqual((self.entry.status, self.entry.attempts, self.entry.claim_token), ("pending", 1, ""))
+        self.assertGreater(self.entry.next_attempt_at, timezone.now())
+        self.assertEqual(worker.claim(), [])
+
+
+class LeaderboardRecordTests(TestCase):
+    """record() يضع الرصيد المطلق فلا يُحتسب نفس الفرق مرتين بعد إعادة قراءة اللوحة"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="ranked", password="x")
+        UserScore.objects.create(user=self.user, total_points=10)
+        self.leaderboard = LocalLeaderboard(refresh_seconds=300)
+
+    def test_record_after_reload_is_idempotent(self):
+        self.leaderboard.board("all")
+        UserScore.objects.filter(user=self.user).update(total_points=15)
+        # إعادة قراءة ترى القيمة المؤكدة قبل أن يصل on_commit
+        self.leaderboard.refresh_seconds = 0
+        self.leaderboard.board("all")
+        self.leaderboard.refresh_seconds = 300
+
+        for _ in range(2):
+            self.leaderboard.record(self.user.id, [(timezone.now(), 5)])
+        self.assertEqual(self.leaderboard.rank(self.user.id)[0]["points"], 15)
+
+    def test_older_read_does_not_overwrite_newer(self):
+        board = Board([(self.user.id, 10)], version=1)
+        self.assertTrue(board.set_if_newer(self.user.id, 30, version=3))
+        self.assertFalse(board.set_if_newer(self.user.id, 20, version=2))
+        self.assertFalse(board.set_if_newer(self.user.id, 5, version=1))
+        self.assertEqual(board.rank(self.user.id)["points"], 30)
+
+
+class RankedSetTests(TestCase):
+    """الـ skip list تطابق قائمة مرتبة بعد إدراج وحذف عشوائيين"""
+
+    def test_matches_sorted_list(self):
+        rng = random.Random(7)
+        ranked, expected = RankedSet(seed=7), []
+        for step in range(3000):
+            key = (-rng.randint(0, 50), rng.randint(0, 200))
+            if key in expected and rng.random() < 0.5:
+                self.assertTrue(ranked.remove(key))
+                expected.remove(key)
+            elif key not in expected:
+                ranked.insert(key)
+                bisect.insort(expected, key)
+            if step % 100 == 0:
+                self.assertEqual(ranked.slice(0, len(expected)), expected)
+
+        self.assertEqual(len(ranked), len(expected))
+        self.assertFalse(ranked.remove((1, -1)))
+        for probe in rng.sample(expected, 50) + [(-51, 0), (1, 0)]:
+            self.assertEqual(ranked.count_less(probe), bisect.bisect_left(expected, probe))
+        for start in (0, 1, len(expected) // 2, len(expected) - 1):
+            self.assertEqual(ranked.slice(start, 7), expected[start:start + 7])
+        self.assertEqual((ranked.slice(len(expected), 1), ranked.slice(-1, 1), ranked.slice(0, 0)), ([], [], []))
+
+
+class BoardRankTests(TestCase):
+    """ترتيب تنافسي: المتساوون في النقاط يأخذون نفس الترتيب ثم يُقفز بعددهم"""
+
+    def setUp(self):
+        self.board = Board([(1, 50), (2, 80), (3, 50), (4, 20), (5, 50)])
+
+    def test_ties_share_rank(self):
+        self.assertEqual(
+            [(entry["rank"], entry["user_id"], entry["points"]) for entry in self.board.top(10)],
+            [(1, 2, 80), (2, 1, 50), (2, 3, 50), (2, 5, 50), (5, 4, 20)],
+        )
+        self.assertEqual(self.board.rank(5)["rank"], 2)
+        self.assertIsNone(self.board.rank(99))
+
+    def test_updates_move_user(self):
+        self.board.set(4, 90)
+        self.board.set(2, 50)
+        self.assertEqual(self.board.rank(4)["rank"], 1)
+        self.assertEqual([entry["user_id"] for entry in self.board.top(10)], [4, 1, 2, 3, 5])
+        self.assertEqual([entry["rank"] for entry in self.board.top(10)], [1, 2, 2, 2, 2])
+        self.assertEqual(len(self.board), 5)
+
+    def test_around_is_clipped_at_the_edges(self):
+        self.assertEqual([entry["user_id"] for entry in self.board.around(3, 1)], [1, 3, 5])
+        self.assertEqual([entry["user_id"] for entry in self.board.around(2, 2)], [2, 1, 3])
+        self.assertEqual([entry["user_id"] for entry in self.board.around(4, 1)], [5, 4])
+        self.assertEqual(self.board.around(99, 1), [])
+
+
+class PredictViewTests(TestCase):
+
+    def test_non_object_body_is_rejected(self):
+        client = APIClient()
+        for body in ([{"ship_name": "Atlas", "lat": 20.0, "lon": -17.0}], "Atlas", 42):
+            self.assertEqual(client.post('/api/blockchain/predict/', body, format='json').status_code, 400, body)
+        self.assertFalse(Prediction.objects.exists())
+
+
+@override_settings(HCS_ANCHOR={'MODE': 'single'})
+class PredictBatchViewTests(TestCase):
+    """الدفعة تُحفظ بإدراجين جماعيين والنتائج بترتيب الإدخال"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(get_user_model().objects.create_user(username="analyst", password="x"))
+        Ship.objects.create(name="Atlas", imo_number="9000001", current_latitude=20.9, current_longitude=-17.0)
+
+    def post(self, vessels):
+        return self.client.post('/api/blockchain/predict/batch/', {'vessels': vessels}, format='json')
+
+    def test_results_follow_input_order_with_one_outbox_row_each(self):
+        vessels = [{"ship_name": f"v{i}", "lat": 10.0 + i, "lon": -20.0 + i} for i in range(5)] + [{"ship_name": "atlas"}]
+        response = self.post(vessels)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([p['ship_name'] for p in response.data['predictions']], [v['ship_name'] for v in vessels])
+        self.assertEqual(response.data['predictions'][-1]['lat'], 20.9)  # الموقع من السفينة المسجلة
+        self.assertEqual(Prediction.objects.count(), 6)
+        self.assertEqual(response.data['hedera']['queued'], 6)
+        self.assertEqual(
+            sorted(HcsOutbox.objects.filter(kind="prediction").values_list('object_id', flat=True)),
+            sorted(p['id'] for p in response.data['predictions']),
+        )
+
+    def test_unlocatable_vessel_rejects_the_batch(self):
+        response = self.post([{"ship_name": "Atlas"}, {"ship_name": "Ghost"}, {"ship_name": "v", "lat": 1.0}])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.data['vessels']), {'1', '2'})
+        self.assertFalse(Prediction.objects.exists())
+        self.assertFalse(HcsOutbox.objects.exists())
+
+    def test_authentication_is_required(self):
+        response = APIClient().post('/api/blockchain/predict/batch/', {'vessels': [{"ship_name": "Atlas"}]}, format='json')
+        self.assertEqual(response.status_code, 401)
+        self.assertFalse(Prediction.objects.exists())
+
+
+@override_settings(HCS_ANCHOR={'MODE': 'batch'})
+class PointActivityLeafTests(TestCase):
+    """بصمة نشاط النقاط تُعاد من السجل نفسه ولا تتأثر بتغيير اسم المستخدم"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="sailor", password="x")
+        self.activity, _ = award(self.user, "prediction", 10)
+
+    def test_rename_keeps_content_matching(self):
+        self.assertTrue(verify_record("point_activity", self.activity.pk)["content_matches"])
+
+        self.user.username = "captain"
+        self.user.save(update_fields=["username"])
+        self.assertTrue(verify_record("point_activity", self.activity.pk)["content_matches"])
+
+    def test_leaves_hashed_with_the_username_still_verify(self):
+        activity = PointActivity.objects.get(pk=self.activity.pk)
+        legacy = _sha256_hex(legacy_point_activity_payload(activity))
+        PointActivity.objects.filter(pk=activity.pk).update(message_hash=legacy)
+        self.assertTrue(verify_record("point_activity", activity.pk)["content_matches"])
+
+        PointActivity.objects.filter(pk=activity.pk).update(points=11)
+        self.assertFalse(verify_record("point_activity", activity.pk)["content_matches"])
+
+
+class MerkleTreeTests(TestCase):
+    """كل ورقة تتحقق مع إثباتها ضد الجذر، وأي تعديل يفشل التحقق"""
+
+    def leaves(self, count):
+        return [hashlib.sha256(f'{{"n": {n}}}'.encode()).hexdigest() for n in range(count)]
+
+    def test_every_leaf_verifies_for_all_sizes(self):
+        for count in range(1, 18):
+            leaves = self.leaves(count)
+            root, proofs = build_tree(leaves)
+            self.assertEqual(len(proofs), count)
+            for leaf, proof in zip(leaves, proofs):
+                self.assertTrue(verify_proof(leaf, proof, root), (count, leaf))
+
+    def test_odd_node_is_promoted_without_duplication(self):
+        a, b, c = self.leaves(3)
+        root, proofs = build_tree([a, b, c])
+        self.assertEqual(root, hash_node(hash_node(a, b), c))
+        self.assertEqual(proofs[2], [{"side": "left", "hash": hash_node(a, b)}])
+        self.assertEqual(build_tree([a]), (a, [[]]))
+
+    def test_tampering_fails_verification(self):
+        leaves = self.leaves(5)
+        root, proofs = build_tree(leaves)
+        self.assertFalse(verify_proof(leaves[1], proofs[0], root))
+        self.assertFalse(verify_proof(leaves[0], proofs[0], hash_node(root, root)))
+        flipped = [{**step, "side": "left" if step["side"] == "right" else "right"} for step in proofs[0]]
+        self.assertFalse(verify_proof(leaves[0], flipped, root))
+        # إثبات تالف لا يرفع استثناء
+        for proof in ([{"side": "right"}], [{"side": "right", "hash": "zz"}], None):
+            self.assertFalse(verify_proof(leaves[0], proof, root))
+
+    def test_empty_tree_is_rejected(self):
+        with self.assertRaises(ValueError):
+            build_tree([])
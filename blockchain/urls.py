@@ -5,10 +5,14 @@ urlpatterns = [
     # Blockchain APIs
     path('transactions/', views.TransactionListView.as_view(), name='transaction-list'),
     path('predict/', views.predict_view, name='predict'),
+    path('predict/batch/', views.predict_batch_view, name='predict-batch'),
     path('predictions/', views.predictions_list, name='predictions_list'),
+    path('verify/<str:kind>/<int:pk>/', views.verify_record_view, name='verify-record'),
     
     # Scoring System APIs
     path('my-activities/', views.user_activities, name='user-activities'),
     path('my-score/', views.user_score, name='user-score'),
     path('add-points/', views.add_points, name='add-points'),
+    path('leaderboard/', views.leaderboard_view, name='leaderboard'),
+    path('leaderboard/me/', views.my_rank_view, name='my-rank'),
 ]
\ No newline at end of file
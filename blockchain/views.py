@@ -4,14 +4,26 @@ from rest_framework.response import Response
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny
 from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.contrib.auth import get_user_model
+from datetime import datetime, time as dt_time
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 import json
 import hashlib
 
+from portflow_ai.pagination import LimitKeysetPagination, TimestampKeysetPagination
 from .models import Prediction, PointActivity, UserScore
 from .serializers import PredictionSerializer
-from .hedera_client import publish_prediction
+from .outbox import create_predictions, enqueue_prediction
+from .anchoring import verify_record
+from .scoring import award, level_for
+from ships.models import Ship
+from ships.risk import RiskEngine
+from .leaderboard import PERIODS, get_leaderboard, period_start
+from django.db import transaction
+from django.db.models.functions import Lower
+from django.conf import settings
 
 # ========== SERIALIZERS FOR SWAGGER ==========
 class PredictionInputSerializer(serializers.Serializer):
@@ -30,17 +42,51 @@ class PredictionInputSerializer(serializers.Serializer):
         allow_null=True,
         help_text="خط الطول (Longitude)"
     )
+    speed = serializers.FloatField(
+        required=False,
+        allow_null=True,
+        help_text="السرعة بالعقدة - من السفينة المسجلة بنفس الاسم إن لم تُرسل"
+    )
+    heading = serializers.FloatField(
+        required=False,
+        allow_null=True,
+        help_text="الاتجاه بالدرجات - من السفينة المسجلة بنفس الاسم إن لم يُرسل"
+    )
+    destination_port = serializers.IntegerField(
+        required=False,
+        allow_null=True,
+        help_text="معرف ميناء الوجهة - من السفينة المسجلة بنفس الاسم إن لم يُرسل"
+    )
 
 class HederaResponseSerializer(serializers.Serializer):
     ok = serializers.BooleanField(help_text="نجاح العملية")
     txId = serializers.CharField(help_text="معرف المعاملة على Hedera", required=False)
     error = serializers.CharField(help_text="رسالة الخطأ", required=False)
+    status = serializers.CharField(help_text="حالة النشر: queued حتى ينشرها العامل", required=False)
+    outboxId = serializers.IntegerField(help_text="معرف الرسالة في صندوق الصادر", required=False)
 
 class PredictionOutputSerializer(serializers.Serializer):
     status = serializers.CharField(help_text="حالة الطلب: ok أو error")
     hedera = HederaResponseSerializer(help_text="استجابة Hedera")
     prediction = PredictionSerializer(help_text="بيانات التنبؤ المحفوظة")
 
+class BatchPredictionInputSerializer(serializers.Serializer):
+    vessels = PredictionInputSerializer(many=True, help_text="السفن المطلوب تقييمها - النتائج بنفس الترتيب")
+
+    def validate_vessels(self, value):
+        max_size = getattr(settings, 'PREDICTION_BATCH_MAX_SIZE', 1000)
+        if not value:
+            raise serializers.ValidationError("vessels must not be empty")
+        if len(value) > max_size:
+            raise serializers.ValidationError(f"at most {max_size} vessels per request")
+        return value
+
+class BatchPredictionOutputSerializer(serializers.Serializer):
+    status = serializers.CharField(help_text="حالة الطلب: ok أو error")
+    count = serializers.IntegerField(help_text="عدد التنبؤات المحفوظة")
+    hedera = HederaResponseSerializer(help_text="حالة النشر للدفعة")
+    predictions = PredictionSerializer(many=True, help_text="التنبؤات بنفس ترتيب الإدخال")
+
 class TransactionResponseSerializer(serializers.Serializer):
     message = serializers.CharField(help_text="رسالة توضيحية")
     status = serializers.CharField(help_text="حالة التطوير")
@@ -72,6 +118,34 @@ class TransactionListView(generics.GenericAPIView):
         serializer = self.get_serializer(data)
         return Response(serializer.data)
 
+def _resolve_vessels(items):
+    """
+    بيانات السفن المدخلة مع إكمال القيم غير المرسلة من السفينة المسجلة بنفس الاسم
+    (استعلام واحد لكل الأسماء)
+    """
+    names = {item["ship_name"].lower() for item in items}
+    ships = {}
+    for row in Ship.objects.annotate(lower_name=Lower("name")).filter(lower_name__in=names).values(
+        "lower_name", "current_latitude", "current_longitude", "current_speed", "current_heading", "destination_port_id"
+    ):
+        ships.setdefault(row["lower_name"], row)
+    
+    vessels = []
+    for item in items:
+        ship = ships.get(item["ship_name"].lower(), {})
+        vessels.append({
+            "ship_name": item["ship_name"],
+            "lat": item.get("lat") if item.get("lat") is not None else ship.get("current_latitude"),
+            "lon": item.get("lon") if item.get("lon") is not None else ship.get("current_longitude"),
+            "speed": item.get("speed") if item.get("speed") is not None else ship.get("current_speed"),
+            "heading": item.get("heading") if item.get("heading") is not None else ship.get("current_heading"),
+            "destination_port_id": (
+                item.get("destination_port") if item.get("destination_port") is not None
+                else ship.get("destination_port_id")
+            ),
+        })
+    return vessels
+
 @swagger_auto_schema(
     method='post',
     operation_description="""
@@ -81,10 +155,10 @@ class TransactionListView(generics.GenericAPIView):
     1. استقبال بيانات السفينة
     2. حساب درجة المخاطر
     3. تخزين السجل محلياً
-    4. نشر المعاملة على Hedera HCS
-    5. إرجاع النتائج
+    4. إدراج رسالة Hedera HCS في صندوق الصادر (ينشرها العامل run_hcs_publisher)
+    5. إرجاع النتائج فوراً بحالة queued
     
-    **ملاحظة:** درجة المخاطر تحسب تلقائياً حالياً
+    **ملاحظة:** درجة المخاطر يحسبها ships.risk.RiskEngine من السرعة والاتجاه والطقس والإنذارات القريبة وميناء الوجهة
     """,
     operation_summary="إنشاء تنبؤ جديد",
     request_body=PredictionInputSerializer,
@@ -109,35 +183,109 @@ def predict_view(request):
     }
     ```
     """
-    data = request.data
-    risk_score = 0.85  # يمكن تغيير هذا لحساب حقيقي لاحقاً
+    if not isinstance(request.data, dict):
+        return Response({"error": "Request body must be a JSON object"}, status=400)
+    input_serializer = PredictionInputSerializer(data={
+        key: value for key, value in request.data.items() if value not in ("", None)
+    } | {"ship_name": request.data.get("ship_name") or "Unknown Ship"})
+    if not input_serializer.is_valid():
+        return Response(input_serializer.errors, status=400)
+    data = input_serializer.validated_data
+    
+    vessel = _resolve_vessels([data])[0]
+    risk_score = RiskEngine().score_vessels([vessel])[0]
     
     payload = {
-        "ship_name": data.get("ship_name", "Unknown Ship"),
-        "lat": data.get("lat"),
-        "lon": data.get("lon"),
+        "ship_name": vessel["ship_name"],
+        "lat": vessel["lat"],
+        "lon": vessel["lon"],
         "risk_score": risk_score,
     }
     
-    # نشر على Hedera
-    publish_res = publish_prediction(payload)
-    
-    # حفظ في قاعدة البيانات
-    pred = Prediction.objects.create(
-        ship_name=payload["ship_name"],
-        lat=payload["lat"],
-        lon=payload["lon"],
-        risk_score=payload["risk_score"],
-        hcs_status=publish_res.get("status", "unknown"),
-        hcs_tx_id=publish_res.get("txId"),
-    )
+    # حفظ في قاعدة البيانات + إدراج النشر على Hedera في نفس المعاملة (بدون انتظار الشبكة)
+    with transaction.atomic():
+        pred = Prediction.objects.create(
+            ship_name=payload["ship_name"],
+            lat=payload["lat"],
+            lon=payload["lon"],
+            risk_score=payload["risk_score"],
+        )
+        entry = enqueue_prediction(pred)
     
     return Response({
-        "status": "ok" if publish_res.get("ok") else "error",
-        "hedera": publish_res,
+        "status": "ok",
+        "hedera": {"ok": True, "status": pred.hcs_status, "outboxId": entry.id if entry else None},
         "prediction": PredictionSerializer(pred).data
     })
 
+@swagger_auto_schema(
+    method='post',
+    operation_description="""
+    إنشاء تنبؤات لعدة سفن في طلب واحد
+    
+    **عملية التنبؤ:**
+    1. تقييم كل السفن معاً بتمرير واحد في RiskEngine
+    2. حفظ التنبؤات بـ bulk_create
+    3. إدراج نشر Hedera للدفعة كاملة في نفس المعاملة
+    4. إرجاع النتائج بنفس ترتيب الإدخال
+    
+    **المصادقة مطلوبة**، وكل سفينة يجب أن يُعرف موقعها (lat/lon أو اسم سفينة مسجلة بموقع)،
+    وإلا يُرفض الطلب كاملاً مع رقم العنصر.
+    """,
+    operation_summary="تنبؤات دفعة سفن",
+    request_body=BatchPredictionInputSerializer,
+    tags=['blockchain'],
+    responses={
+        200: BatchPredictionOutputSerializer,
+        400: "بيانات الإدخال غير صالحة أو سفينة بلا موقع",
+        401: "غير مصرح"
+    }
+)
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def predict_batch_view(request):
+    """
+    إنشاء تنبؤات لمجموعة سفن دفعة واحدة
+    
+    مثال على البيانات:
+    ```json
+    {
+        "vessels": [
+            {"ship_name": "Ever Given", "lat": 25.5, "lon": 55.3},
+            {"ship_name": "Maersk Alabama", "lat": 4.1, "lon": 6.9, "speed": 14}
+        ]
+    }
+    ```
+    """
+    input_serializer = BatchPredictionInputSerializer(data=request.data)
+    if not input_serializer.is_valid():
+        return Response(input_serializer.errors, status=400)
+    
+    vessels = _resolve_vessels(input_serializer.validated_data["vessels"])
+    # سفينة بلا موقع لا تُقيَّم (كانت تُحفظ بمخاطر 0.0) - نفس شكل أخطاء الحقول حسب رقم العنصر
+    unlocated = {
+        str(index): ["Position unknown: send lat/lon or the name of a registered ship with a position"]
+        for index, vessel in enumerate(vessels) if vessel["lat"] is None or vessel["lon"] is None
+    }
+    if unlocated:
+        return Response({"vessels": unlocated}, status=400)
+    scores = RiskEngine().score_vessels(vessels)
+    predictions = [
+        Prediction(ship_name=vessel["ship_name"], lat=vessel["lat"], lon=vessel["lon"], risk_score=score)
+        for vessel, score in zip(vessels, scores)
+    ]
+    
+    # التنبؤات ورسائل الـ outbox بإدراجين جماعيين في معاملة واحدة
+    with transaction.atomic():
+        queued = create_predictions(predictions)
+    
+    return Response({
+        "status": "ok",
+        "count": len(predictions),
+        "hedera": {"ok": True, "status": predictions[0].hcs_status, "queued": queued},
+        "predictions": PredictionSerializer(predictions, many=True).data
+    })
+
 @swagger_auto_schema(
     method='get',
     operation_description="استرجاع قائمة بأحدث التنبؤات",
@@ -146,9 +294,15 @@ def predict_view(request):
         openapi.Parameter(
             'limit',
             openapi.IN_QUERY,
-            description="عدد التنبؤات المراد استرجاعها (الافتراضي: 20)",
+            description="عدد التنبؤات في الصفحة (الافتراضي: 20، الأقصى: 100)",
             type=openapi.TYPE_INTEGER,
             default=20
+        ),
+        openapi.Parameter(
+            'cursor',
+            openapi.IN_QUERY,
+            description="مؤشر الصفحة التالية/السابقة كما أُعيد في next/previous",
+            type=openapi.TYPE_STRING
         )
     ],
     tags=['blockchain'],
@@ -161,18 +315,41 @@ def predict_view(request):
 @permission_classes([AllowAny])
 def predictions_list(request):
     """
-    استرجاع أحدث التنبؤات مع إمكانية تحديد العدد
+    استرجاع أحدث التنبؤات بصفحات (cursor) مع إمكانية تحديد حجم الصفحة
     
     مثال:
     GET /api/blockchain/predictions/?limit=10
+    GET /api/blockchain/predictions/?cursor=<next>
     """
-    limit = int(request.query_params.get('limit', 20))
-    if limit > 100:  # منع استرجاع عدد كبير جداً
-        limit = 100
-        
-    qs = Prediction.objects.all().order_by('-created_at')[:limit]
-    serializer = PredictionSerializer(qs, many=True)
-    return Response(serializer.data)
+    paginator = LimitKeysetPagination()
+    page = paginator.paginate_queryset(Prediction.objects.all(), request)
+    serializer = PredictionSerializer(page, many=True)
+    return paginator.get_paginated_response(serializer.data)
+
+@swagger_auto_schema(
+    method='get',
+    operation_description="""
+    التحقق من سجل (prediction أو point_activity) مقابل الجذر المثبت على Hedera
+    
+    1. إعادة حساب بصمة السجل من حقوله ومقارنتها بـ message_hash (الورقة)
+    2. إعادة بناء جذر Merkle من إثبات الإدراج ومقارنته بجذر الدفعة
+    3. verified = صحة الإثبات + تطابق المحتوى + وجود معاملة HCS للجذر
+    """,
+    operation_summary="التحقق من سجل مثبت",
+    tags=['blockchain'],
+    responses={200: "نتيجة التحقق", 404: "السجل غير موجود"}
+)
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def verify_record_view(request, kind, pk):
+    """
+    مثال:
+    GET /api/blockchain/verify/prediction/42/
+    """
+    result = verify_record(kind, pk)
+    if result is None:
+        return Response({"error": "السجل غير موجود"}, status=404)
+    return Response(result)
 
 # ========== SYSTEME DE POINTAGE - NOUVELLES APIs ==========
 
@@ -200,6 +377,10 @@ class AddPointsSerializer(serializers.Serializer):
     method='get',
     operation_description="الحصول على سجل أنشطة النقاط للمستخدم",
     operation_summary="سجل الأنشطة",
+    manual_parameters=[
+        openapi.Parameter('cursor', openapi.IN_QUERY, description="مؤشر الصفحة", type=openapi.TYPE_STRING),
+        openapi.Parameter('page_size', openapi.IN_QUERY, description="حجم الصفحة (الأقصى: 100)", type=openapi.TYPE_INTEGER),
+    ],
     tags=['scoring'],
     responses={
         200: PointActivitySerializer(many=True),
@@ -210,11 +391,12 @@ class AddPointsSerializer(serializers.Serializer):
 @permission_classes([IsAuthenticated])
 def user_activities(request):
     """
-    استرجاع سجل كامل لأنشطة المستخدم ونقاطه
+    استرجاع سجل أنشطة المستخدم ونقاطه بصفحات (cursor)
     """
-    activities = PointActivity.objects.filter(user=request.user).order_by('-timestamp')
-    serializer = PointActivitySerializer(activities, many=True)
-    return Response(serializer.data)
+    paginator = TimestampKeysetPagination()
+    page = paginator.paginate_queryset(PointActivity.objects.filter(user=request.user), request)
+    serializer = PointActivitySerializer(page, many=True)
+    return paginator.get_paginated_response(serializer.data)
 
 @swagger_auto_schema(
     method='get',
@@ -236,6 +418,110 @@ def user_score(request):
     serializer = UserScoreSerializer(score)
     return Response(serializer.data)
 
+PERIOD_PARAMETER = openapi.Parameter(
+    'period', openapi.IN_QUERY, description="all / daily / weekly (افتراضي: all)", type=openapi.TYPE_STRING
+)
+DATE_PARAMETER = openapi.Parameter(
+    'date', openapi.IN_QUERY, description="يوم داخل الفترة المطلوبة YYYY-MM-DD (افتراضي: اليوم)", type=openapi.TYPE_STRING
+)
+
+
+def _leaderboard_params(request):
+    """قراءة period و date من الطلب - يعيد (period, moment, error)"""
+    period = request.query_params.get('period', 'all')
+    if period not in PERIODS:
+        return None, None, f"period must be one of: {', '.join(PERIODS)}"
+    moment = None
+    if request.query_params.get('date'):
+        day = parse_date(request.query_params['date'])
+        if day is None:
+            return None, None, "date must be YYYY-MM-DD"
+        moment = timezone.make_aware(datetime.combine(day, dt_time(12)))
+    return period, moment, None
+
+
+def _with_usernames(entries, period):
+    """إضافة اسم المستخدم (ومستواه للوحة العامة) باستعلام واحد"""
+    users = get_user_model().objects.in_bulk([entry['user_id'] for entry in entries])
+    for entry in entries:
+        user = users.get(entry['user_id'])
+        entry['username'] = user.username if user else None
+        if period == 'all':
+            entry['level'] = level_for(entry['points'])
+    return entries
+
+
+@swagger_auto_schema(
+    method='get',
+    operation_description="أفضل المستخدمين حسب النقاط (الكل أو اليوم أو الأسبوع)",
+    operation_summary="لوحة الترتيب",
+    manual_parameters=[
+        PERIOD_PARAMETER,
+        DATE_PARAMETER,
+        openapi.Parameter('limit', openapi.IN_QUERY, description="عدد النتائج (الأقصى: 100)", type=openapi.TYPE_INTEGER),
+    ],
+    tags=['scoring'],
+    responses={200: "قائمة الترتيب", 400: "معاملات غير صالحة"}
+)
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def leaderboard_view(request):
+    """
+    أفضل N مستخدم من لوحة مرتبة في الذاكرة (blockchain.leaderboard)
+    """
+    period, moment, error = _leaderboard_params(request)
+    if error:
+        return Response({"error": error}, status=400)
+    try:
+        limit = min(max(int(request.query_params.get('limit', 10)), 1), 100)
+    except ValueError:
+        return Response({"error": "limit must be an integer"}, status=400)
+
+    entries, total = get_leaderboard().top(period, limit, moment)
+    return Response({
+        "period": period,
+        "start": period_start(period, moment),
+        "total": total,
+        "results": _with_usernames(entries, period),
+    })
+
+
+@swagger_auto_schema(
+    method='get',
+    operation_description="ترتيب المستخدم الحالي والمستخدمون حوله",
+    operation_summary="ترتيبي",
+    manual_parameters=[
+        PERIOD_PARAMETER,
+        DATE_PARAMETER,
+        openapi.Parameter('radius', openapi.IN_QUERY, description="عدد الجيران من كل جهة (الأقصى: 25)", type=openapi.TYPE_INTEGER),
+    ],
+    tags=['scoring'],
+    responses={200: "الترتيب والجيران", 400: "معاملات غير صالحة", 401: "غير مصرح"}
+)
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def my_rank_view(request):
+    """
+    ترتيب المستخدم في اللوحة مع المستخدمين قبله وبعده
+    """
+    period, moment, error = _leaderboard_params(request)
+    if error:
+        return Response({"error": error}, status=400)
+    try:
+        radius = min(max(int(request.query_params.get('radius', 5)), 0), 25)
+    except ValueError:
+        return Response({"error": "radius must be an integer"}, status=400)
+
+    entry, around, total = get_leaderboard().rank(request.user.id, period, radius, moment)
+    return Response({
+        "period": period,
+        "start": period_start(period, moment),
+        "total": total,
+        "rank": entry["rank"] if entry else None,
+        "points": entry["points"] if entry else 0,
+        "around": _with_usernames(around, period),
+    })
+
 @swagger_auto_schema(
     method='post',
     operation_description="إضافة نقاط للمستخدم بناءً على نشاط معين",
@@ -267,28 +553,8 @@ def add_points(request):
         activity_type = serializer.validated_data['activity_type']
         points = serializer.validated_data['points']
         
-        # تسجيل النشاط
-        activity = PointActivity.objects.create(
-            user=request.user,
-            activity_type=activity_type,
-            points=points
-        )
-        
-        # تحديث النقاط الإجمالية
-        user_score, created = UserScore.objects.get_or_create(user=request.user)
-        user_score.total_points += points
-        
-        # تحديث المستوى تلقائياً
-        if user_score.total_points >= 1000:
-            user_score.level = "خبير"
-        elif user_score.total_points >= 500:
-            user_score.level = "متقدم"
-        elif user_score.total_points >= 100:
-            user_score.level = "متوسط"
-        else:
-            user_score.level = "مبتدئ"
-            
-        user_score.save()
+        # تسجيل النشاط واحتسابه بزيادة ذرية (blockchain.scoring)
+        activity, user_score = award(request.user, activity_type, points)
         
         return Response(UserScoreSerializer(user_score).data)
     
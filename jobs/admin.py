@@ -0,0 +1,18 @@
+from django.contrib import admin
+from .models import BackgroundJob, ScheduledJob
+
+@admin.register(ScheduledJob)
+class ScheduledJobAdmin(admin.ModelAdmin):
+    list_display = ('name', 'next_run_at', 'run_requested', 'last_status', 'last_duration_ms', 'run_count', 'failure_count', 'overlap_count', 'locked_by')
+    list_filter = ('last_status',)
+    search_fields = ('name', 'last_error')
+    readonly_fields = ('locked_by', 'locked_until', 'last_started_at', 'last_finished_at', 'last_duration_ms',
+                       'last_result', 'run_count', 'failure_count', 'overlap_count', 'duration_histogram')
+
+@admin.register(BackgroundJob)
+class BackgroundJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'job_type', 'status', 'progress', 'attempts', 'created_by', 'created_at', 'finished_at')
+    list_filter = ('status', 'job_type')
+    search_fields = ('job_type', 'error', 'claimed_by')
+    readonly_fields = ('slot', 'claimed_by', 'locked_until', 'progress', 'progress_message', 'partial_result',
+                       'result', 'error', 'timings', 'started_at', 'finished_at')
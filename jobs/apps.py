@@ -0,0 +1,20 @@
+import os
+import sys
+from django.apps import AppConfig
+
+
+class JobsConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'jobs'
+
+    def ready(self):
+        from .scheduler import scheduler_settings, start_in_background
+        if scheduler_settings()['AUTOSTART'] and _is_server_process():
+            start_in_background()
+
+
+def _is_server_process():
+    """عملية ويب فقط: runserver (العملية الفرعية التي تخدم الطلبات) أو خادم WSGI/ASGI - وليس أوامر manage.py الأخرى"""
+    if os.path.basename(sys.argv[0]) != 'manage.py':
+        return True
+    return sys.argv[1:2] == ['runserver'] and os.environ.get('RUN_MAIN') == 'true'
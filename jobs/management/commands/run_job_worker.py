@@ -0,0 +1,49 @@
+"""
+Background job queue worker (jobs.queue). Several workers can run side by side: jobs are
+claimed with conditional updates and per-type concurrency is enforced in the database.
+Usage: python manage.py run_job_worker [--once] [--concurrency 4] [--type refresh_weather]
+"""
+import signal
+import threading
+
+from django.core.management.base import BaseCommand, CommandError
+
+from jobs.queue import JobWorker, job_types
+
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs (fleet refresh, weather refresh, test data generation) with progress tracking'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Run every job that is ready now and exit')
+        parser.add_argument('--concurrency', type=int, help='Jobs run in parallel (default: JOB_QUEUE CONCURRENCY)')
+        parser.add_argument('--type', action='append', dest='types', help='Only run this job type (repeatable)')
+        parser.add_argument('--poll-interval', type=float, help='Seconds to sleep when the queue is empty')
+
+    def handle(self, *args, **options):
+        if options['types']:
+            unknown = set(options['types']) - set(job_types())
+            if unknown:
+                raise CommandError(f"Unknown job type(s): {', '.join(sorted(unknown))}")
+
+        worker = JobWorker(
+            concurrency=options['concurrency'],
+            types=options['types'],
+            poll_interval=options['poll_interval'],
+        )
+
+        if options['once']:
+            total = worker.drain()
+            worker.shutdown(wait=True)
+            self.stdout.write(self.style.SUCCESS(f"✅ ran {total} job(s)"))
+            return
+
+        stop = threading.Event()
+        signal.signal(signal.SIGTERM, lambda *_: stop.set())
+        self.stdout.write(f'🚀 Job worker {worker.worker_id} running (concurrency={worker.concurrency}, types={", ".join(worker.types)})')
+        try:
+            worker.run_forever(stop)
+        except KeyboardInterrupt:
+            pass
+        worker.shutdown(wait=True)
+        self.stdout.write('🛑 Job worker stopped')
@@ -0,0 +1,50 @@
+"""
+Periodic job scheduler (jobs.scheduler). Safe to run in several processes: each due job
+is claimed through a DB leader lock on its ScheduledJob row, so it runs once.
+Usage: python manage.py run_scheduler [--once] [--job NAME] [--max-workers 4]
+"""
+import signal
+import threading
+
+from django.core.management.base import BaseCommand, CommandError
+
+from jobs.scheduler import Scheduler, configured_jobs
+
+
+class Command(BaseCommand):
+    help = 'Run the periodic jobs defined in SCHEDULED_JOBS (fleet refresh, weather refresh, alert sweeps)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Run one scheduler tick, wait for started jobs and exit')
+        parser.add_argument('--job', action='append', help='Only schedule this job (repeatable)')
+        parser.add_argument('--max-workers', type=int, help='Jobs run in parallel (default: SCHEDULER MAX_WORKERS)')
+        parser.add_argument('--poll-interval', type=float, help='Seconds between scheduler ticks')
+
+    def handle(self, *args, **options):
+        jobs = configured_jobs()
+        if options['job']:
+            unknown = set(options['job']) - set(jobs)
+            if unknown:
+                raise CommandError(f"Unknown job(s): {', '.join(sorted(unknown))}")
+            jobs = {name: job for name, job in jobs.items() if name in options['job']}
+
+        scheduler = Scheduler(jobs=jobs, max_workers=options['max_workers'], poll_interval=options['poll_interval'])
+
+        if options['once']:
+            scheduler.sync()
+            started = scheduler.tick()
+            scheduler.shutdown(wait=True)
+            self.stdout.write(self.style.SUCCESS(f"✅ ran: {', '.join(started) or 'nothing due'}"))
+            return
+
+        stop = threading.Event()
+        signal.signal(signal.SIGTERM, lambda *_: stop.set())
+        self.stdout.write(f'🚀 Scheduler running {len(jobs)} job(s) as {scheduler.worker_id}')
+        for job in jobs.values():
+            self.stdout.write(f'   - {job.name}: {job.schedule}')
+        try:
+            scheduler.run_forever(stop)
+        except KeyboardInterrupt:
+            pass
+        scheduler.shutdown(wait=True)
+        self.stdout.write('🛑 Scheduler stopped')
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScheduledJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('next_run_at', models.DateTimeField()),
+                ('locked_by', models.CharField(blank=True, max_length=100)),
+                ('locked_until', models.DateTimeField(blank=True, null=True)),
+                ('last_started_at', models.DateTimeField(blank=True, null=True)),
+                ('last_finished_at', models.DateTimeField(blank=True, null=True)),
+                ('last_status', models.CharField(blank=True, choices=[('', 'لم تُشغّل بعد'), ('success', 'نجحت'), ('failed', 'فشلت')], max_length=20)),
+                ('last_error', models.TextField(blank=True)),
+                ('last_duration_ms', models.FloatField(blank=True, null=True)),
+                ('last_result', models.JSONField(blank=True, default=dict)),
+                ('run_count', models.PositiveIntegerField(default=0)),
+                ('failure_count', models.PositiveIntegerField(default=0)),
+                ('overlap_count', models.PositiveIntegerField(default=0)),
+                ('duration_histogram', models.JSONField(blank=True, default=dict)),
+            ],
+            options={
+                'verbose_name': 'مهمة دورية',
+                'verbose_name_plural': 'مهام دورية',
+                'ordering': ['name'],
+            },
+        ),
+    ]
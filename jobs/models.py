@@ -0,0 +1,105 @@
+from django.db import models
+from django.contrib.auth import get_user_model
+
+User = get_user_model()
+
+
+class ScheduledJob(models.Model):
+    """حالة مهمة دورية مشتركة بين كل العمليات (jobs.scheduler)
+
+    الصف نفسه هو قفل القيادة: العملية التي تحجز locked_until بتحديث شرطي هي وحدها
+    من يشغّل المهمة، والقفل يُجدَّد أثناء التشغيل فلا تتداخل تشغيلتان.
+    """
+    STATUS_CHOICES = (
+        ('', 'لم تُشغّل بعد'),
+        ('success', 'نجحت'),
+        ('failed', 'فشلت'),
+    )
+
+    name = models.CharField(max_length=100, unique=True)
+    next_run_at = models.DateTimeField()
+    # تشغيل يدوي مطلوب (request_run) - يبقى حتى يبدأ تشغيل جديد فلا يضيع إذا كانت المهمة تعمل
+    run_requested = models.BooleanField(default=False)
+
+    # قفل القيادة
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_until = models.DateTimeField(null=True, blank=True)
+
+    # آخر تشغيل
+    last_started_at = models.DateTimeField(null=True, blank=True)
+    last_finished_at = models.DateTimeField(null=True, blank=True)
+    last_status = models.CharField(max_length=20, choices=STATUS_CHOICES, blank=True)
+    last_error = models.TextField(blank=True)
+    last_duration_ms = models.FloatField(null=True, blank=True)
+    last_result = models.JSONField(default=dict, blank=True)
+
+    # إحصائيات
+    run_count = models.PositiveIntegerField(default=0)
+    failure_count = models.PositiveIntegerField(default=0)
+    overlap_count = models.PositiveIntegerField(default=0)  # مرات كانت المهمة مستحقة وهي ما زالت تعمل
+    # {"buckets": {"100": n, ..., "inf": n}, "count": n, "sum_ms": x} - عدد التشغيلات في كل فترة مدة (مللي ثانية)
+    duration_histogram = models.JSONField(default=dict, blank=True)
+
+    class Meta:
+        ordering = ['name']
+        verbose_name = 'مهمة دورية'
+        verbose_name_plural = 'مهام دورية'
+
+    def __str__(self):
+        return f"{self.name} (التالية {self.next_run_at:%Y-%m-%d %H:%M:%S})"
+
+
+class BackgroundJob(models.Model):
+    """مهمة في طابور الخلفية (jobs.queue) - الـ endpoint يعيد id فوراً والعامل يكتب التقدم هنا
+
+    slot رقم خانة التوازي داخل نوع المهمة، والقيد الفريد على (النوع، الخانة) للمهام
+    العاملة يضمن ألا يتجاوز عدد المهام العاملة من نفس النوع حد التوازي مهما كان عدد العمال.
+    """
+    STATUS_CHOICES = (
+        ('queued', 'في الانتظار'),
+        ('running', 'قيد التشغيل'),
+        ('succeeded', 'نجحت'),
+        ('failed', 'فشلت'),
+    )
+
+    job_type = models.CharField(max_length=100)
+    params = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='background_jobs')
+
+    # الحجز والإعادة
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    run_after = models.DateTimeField()
+    slot = models.PositiveSmallIntegerField(null=True, blank=True)
+    claimed_by = models.CharField(max_length=100, blank=True)
+    locked_until = models.DateTimeField(null=True, blank=True)
+
+    # التقدم والنتيجة
+    progress = models.FloatField(default=0)  # 0..1
+    progress_message = models.CharField(max_length=255, blank=True)
+    partial_result = models.JSONField(default=dict, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    timings = models.JSONField(default=dict, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at', '-id']
+        indexes = [
+            models.Index(fields=['status', 'run_after']),
+            models.Index(fields=['job_type', 'status']),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['job_type', 'slot'], condition=models.Q(status='running'), name='unique_running_job_slot'
+            ),
+        ]
+        verbose_name = 'مهمة خلفية'
+        verbose_name_plural = 'مهام خلفية'
+
+    def __str__(self):
+        return f"#{self.id} {self.job_type} ({self.status})"
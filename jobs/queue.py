@@ -0,0 +1,279 @@
+import logging
+import os
+import random
+import socket
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.conf import settings
+from django.db import IntegrityError, connections, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from .models import BackgroundJob
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'CONCURRENCY': 4,
+    'POLL_INTERVAL': 1.0,
+    'LEASE_SECONDS': 120,
+    'BACKOFF_BASE': 5.0,
+    'BACKOFF_MAX': 600.0,
+    'PROGRESS_INTERVAL': 1.0,
+}
+
+
+def queue_settings():
+    return {**DEFAULTS, **getattr(settings, 'JOB_QUEUE', {})}
+
+
+def job_types():
+    """أنواع المهام المعرّفة في BACKGROUND_JOB_TYPES"""
+    return getattr(settings, 'BACKGROUND_JOB_TYPES', {})
+
+
+PARAM_TYPES = {'int': (int,), 'float': (int, float), 'bool': (bool,)}
+
+
+def validate_params(job_type, params):
+    """التحقق من المعاملات حسب 'params' في BACKGROUND_JOB_TYPES - ValueError برسالة للعميل"""
+    spec = job_types()[job_type].get('params', {})
+    unknown = sorted(set(params) - set(spec))
+    if unknown:
+        raise ValueError(f"unknown params for {job_type}: {', '.join(unknown)} (allowed: {', '.join(sorted(spec)) or 'none'})")
+    for name, value in params.items():
+        rule = spec[name]
+        # bool يرث من int في بايثون - لا يُقبل مكان رقم
+        if not isinstance(value, PARAM_TYPES[rule['type']]) or (rule['type'] != 'bool' and isinstance(value, bool)):
+            raise ValueError(f"{name} must be of type {rule['type']}")
+        if 'min' in rule and value < rule['min'] or 'max' in rule and value > rule['max']:
+            raise ValueError(f"{name} must be between {rule.get('min', '-inf')} and {rule.get('max', 'inf')}")
+    return params
+
+
+def enqueue(job_type, params=None, user=None):
+    """إضافة مهمة للطابور - تعود فوراً والعامل (run_job_worker) يشغّلها"""
+    config = job_types().get(job_type)
+    if config is None:
+        raise ValueError(f"unknown job type: {job_type}")
+    return BackgroundJob.objects.create(
+        job_type=job_type,
+        params=validate_params(job_type, params or {}),
+        created_by=user if user is not None and user.is_authenticated else None,
+        max_attempts=config.get('max_attempts', 3),
+        run_after=timezone.now(),
+    )
+
+
+class JobProgress:
+    """مُبلِّغ التقدم الذي تستقبله المهمة كـ progress=...
+
+    progress(fraction, message, partial=..., timings=...) - القواميس تُدمج مع السابقة،
+    والكتابة في قاعدة البيانات كل PROGRESS_INTERVAL ثانية على الأكثر وتجدد قفل المهمة.
+    """
+
+    def __init__(self, job, worker):
+        self.job = job
+        self.worker = worker
+        self.interval = float(queue_settings()['PROGRESS_INTERVAL'])
+        self._written_at = 0.0
+
+    def __call__(self, fraction=None, message=None, partial=None, timings=None, force=False):
+        job = self.job
+        if fraction is not None:
+            job.progress = round(min(1.0, max(0.0, fraction)), 4)
+        if message is not None:
+            job.progress_message = str(message)[:255]
+        if partial:
+            job.partial_result.update(partial)
+        if timings:
+            job.timings.update(timings)
+        if force or time.monotonic() - self._written_at >= self.interval:
+            self.flush()
+
+    def flush(self):
+        self._written_at = time.monotonic()
+        job = self.job
+        BackgroundJob.objects.filter(pk=job.pk, claimed_by=self.worker.worker_id, status='running').update(
+            progress=job.progress, progress_message=job.progress_message, partial_result=job.partial_result,
+            timings=job.timings, locked_until=timezone.now() + timedelta(seconds=self.worker.lease_seconds),
+        )
+
+
+class JobWorker:
+    """عامل طابور المهام: يحجز المهام الجاهزة ويشغّلها في مجمّع خيوط محدود
+
+    - حد التوازي لكل نوع (concurrency في BACKGROUND_JOB_TYPES) يُفرض بخانات slot
+      وقيد فريد في قاعدة البيانات، فيبقى صحيحاً مع أكثر من عامل.
+    - الفشل يُعاد بتأخير أُسّي مع jitter حتى max_attempts ثم يصبح failed.
+    - المهام التي انتهى قفلها (عامل متوقف) تُعاد للطابور كمحاولة فاشلة.
+    """
+
+    def __init__(self, concurrency=None, types=None, worker_id=None, poll_interval=None, lease_seconds=None):
+        config = queue_settings()
+        self.concurrency = concurrency or int(config['CONCURRENCY'])
+        self.poll_interval = poll_interval or float(config['POLL_INTERVAL'])
+        self.lease_seconds = lease_seconds or float(config['LEASE_SECONDS'])
+        self.backoff_base = float(config['BACKOFF_BASE'])
+        self.backoff_max = float(config['BACKOFF_MAX'])
+        self.types = {name: spec for name, spec in job_types().items() if types is None or name in types}
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self._pool = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='job-worker')
+        self._running = {}
+        self._lock = threading.Lock()
+
+    def _backoff(self, attempts):
+        delay = min(self.backoff_max, self.backoff_base * (2 ** (attempts - 1)))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def _release(self, now, attempts, max_attempts, error):
+        """حقول المهمة بعد محاولة فاشلة: إعادة للطابور أو فشل نهائي"""
+        fields = {'slot': None, 'claimed_by': '', 'locked_until': None, 'error': error}
+        if attempts >= max_attempts:
+            fields.update(status='failed', finished_at=now)
+        else:
+            fields.update(status='queued', run_after=now + timedelta(seconds=self._backoff(attempts)))
+        return fields
+
+    def reap(self, now=None):
+        """إعادة المهام التي انتهى قفلها (عاملها توقف) - يعيد عددها"""
+        now = now or timezone.now()
+        expired = list(BackgroundJob.objects.filter(status='running', locked_until__lt=now)
+                       .values_list('id', 'attempts', 'max_attempts', 'claimed_by'))
+        for job_id, attempts, max_attempts, claimed_by in expired:
+            BackgroundJob.objects.filter(id=job_id, status='running', claimed_by=claimed_by).update(
+                **self._release(now, attempts, max_attempts, f"lease expired (worker {claimed_by})")
+            )
+        return len(expired)
+
+    def claim(self, limit, now=None):
+        """حجز حتى limit مهمة جاهزة مع احترام حد التوازي لكل نوع"""
+        now = now or timezone.now()
+        if limit <= 0 or not self.types:
+            return []
+        candidates = list(
+            BackgroundJob.objects.filter(status='queued', run_after__lte=now, job_type__in=list(self.types))
+            .order_by('id').values_list('id', 'job_type')[:limit * 4]
+        )
+        if not candidates:
+            return []
+
+        taken = defaultdict(set)
+        for job_type, slot in BackgroundJob.objects.filter(
+            status='running', job_type__in={job_type for _, job_type in candidates}
+        ).values_list('job_type', 'slot'):
+            taken[job_type].add(slot)
+
+        claimed = []
+        for job_id, job_type in candidates:
+            free = [slot for slot in range(int(self.types[job_type].get('concurrency', 1))) if slot not in taken[job_type]]
+            if not free:
+                continue
+            try:
+                with transaction.atomic():
+                    updated = BackgroundJob.objects.filter(id=job_id, status='queued').update(
+                        status='running', slot=free[0], claimed_by=self.worker_id, started_at=now,
+                        locked_until=now + timedelta(seconds=self.lease_seconds), attempts=F('attempts') + 1,
+                    )
+            except IntegrityError:
+                # عامل آخر أخذ نفس الخانة للتو
+                taken[job_type].add(free[0])
+                continue
+            if updated:
+                taken[job_type].add(free[0])
+                claimed.append(job_id)
+                if len(claimed) >= limit:
+                    break
+        return list(BackgroundJob.objects.filter(id__in=claimed, claimed_by=self.worker_id).order_by('id'))
+
+    def execute(self, job):
+        """تشغيل مهمة محجوزة وكتابة النتيجة أو الخطأ"""
+        reporter = JobProgress(job, self)
+        started = time.perf_counter()
+        retryable = True
+        try:
+            validate_params(job.job_type, job.params)
+        except ValueError as e:
+            # معاملات مرفوضة لن تنجح بالإعادة
+            result, error, retryable = None, f"ValueError: {e}", False
+        else:
+            try:
+                task = import_string(self.types[job.job_type]['task'])
+                result, error = task(progress=reporter, **job.params), ''
+            except Exception as e:
+                result, error = None, f"{type(e).__name__}: {e}"
+                logger.exception(f"فشل تشغيل المهمة #{job.id} ({job.job_type})")
+
+        try:
+            now = timezone.now()
+            timings = {**job.timings, 'total_ms': round((time.perf_counter() - started) * 1000, 2)}
+            if error:
+                fields = self._release(now, job.attempts if retryable else job.max_attempts, job.max_attempts, error)
+            else:
+                fields = {
+                    'status': 'succeeded', 'slot': None, 'claimed_by': '', 'locked_until': None, 'error': '',
+                    'result': result if isinstance(result, (dict, list)) or result is None else {'result': str(result)},
+                    'progress': 1.0, 'finished_at': now,
+                }
+            BackgroundJob.objects.filter(pk=job.pk, claimed_by=self.worker_id, status='running').update(
+                partial_result=job.partial_result, progress_message=job.progress_message, timings=timings, **fields
+            )
+        finally:
+            with self._lock:
+                self._running.pop(job.id, None)
+            connections.close_all()
+
+    def heartbeat(self, now=None):
+        now = now or timezone.now()
+        with self._lock:
+            running = list(self._running)
+        if running:
+            BackgroundJob.objects.filter(id__in=running, claimed_by=self.worker_id, status='running').update(
+                locked_until=now + timedelta(seconds=self.lease_seconds)
+            )
+
+    def tick(self):
+        """دورة واحدة: تجديد الأقفال، استعادة المهام المتروكة، ثم حجز ما تتسع له الخيوط"""
+        now = timezone.now()
+        self.heartbeat(now)
+        self.reap(now)
+        with self._lock:
+            free = self.concurrency - len(self._running)
+        jobs = self.claim(free, now)
+        for job in jobs:
+            with self._lock:
+                self._running[job.id] = self._pool.submit(self.execute, job)
+        return jobs
+
+    def drain(self):
+        """تشغيل كل ما هو جاهز الآن ثم التوقف - يعيد عدد المهام المشغلة"""
+        total = 0
+        while True:
+            jobs = self.tick()
+            total += len(jobs)
+            with self._lock:
+                futures = list(self._running.values())
+            if not jobs and not futures:
+                return total
+            for future in futures:
+                future.result()
+
+    def run_forever(self, stop=None):
+        while not (stop and stop.is_set()):
+            try:
+                jobs = self.tick()
+            except Exception:
+                logger.exception("خطأ في دورة عامل المهام")
+                jobs = []
+            if not jobs:
+                if stop:
+                    stop.wait(self.poll_interval)
+                else:
+                    time.sleep(self.poll_interval)
+
+    def shutdown(self, wait=True):
+        self._pool.shutdown(wait=wait)
@@ -0,0 +1,313 @@
+import logging
+import os
+import random
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.conf import settings
+from django.db import connections
+from django.db.models import Case, F, Q, Value, When
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from .models import ScheduledJob
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'AUTOSTART': False,
+    'POLL_INTERVAL': 5.0,
+    'MAX_WORKERS': 4,
+}
+
+# حدود فترات مخطط المدة (مللي ثانية) - الأخيرة "inf"
+DURATION_BUCKETS_MS = (100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000, 300000)
+
+
+def scheduler_settings():
+    return {**DEFAULTS, **getattr(settings, 'SCHEDULER', {})}
+
+
+class Interval:
+    """تشغيل كل seconds ثانية"""
+
+    def __init__(self, seconds):
+        if seconds <= 0:
+            raise ValueError("interval must be positive")
+        self.seconds = seconds
+
+    def next_after(self, moment):
+        return moment + timedelta(seconds=self.seconds)
+
+    def __str__(self):
+        return f"every {self.seconds}s"
+
+
+class Cron:
+    """جدول cron بخمسة حقول: دقيقة ساعة يوم-الشهر شهر يوم-الأسبوع (0 = الأحد)
+
+    كل حقل يقبل * و n و a-b و */s و a-b/s وقوائم مفصولة بفواصل، ويُقيَّم بتوقيت TIME_ZONE.
+    """
+
+    FIELDS = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 6))
+
+    def __init__(self, expression):
+        parts = expression.split()
+        if len(parts) != 5:
+            raise ValueError(f"cron expression needs 5 fields: {expression!r}")
+        self.expression = expression
+        self.minutes, self.hours, self.days, self.months, self.weekdays = (
+            self._parse(part, low, high) for part, (low, high) in zip(parts, self.FIELDS)
+        )
+        # كما في cron: إذا قُيّد اليوم والأسبوع معاً يكفي تطابق أحدهما
+        self.any_day = parts[2] == '*'
+        self.any_weekday = parts[4] == '*'
+
+    @staticmethod
+    def _parse(field, low, high):
+        values = set()
+        for part in field.split(','):
+            step = 1
+            if '/' in part:
+                part, step = part.split('/', 1)
+                step = int(step)
+            if part == '*':
+                start, end = low, high
+            elif '-' in part:
+                start, end = (int(value) for value in part.split('-', 1))
+            else:
+                start = int(part)
+                end = high if step > 1 else start
+            if step <= 0 or start < low or end > high or start > end:
+                raise ValueError(f"invalid cron field {field!r} (allowed {low}-{high})")
+            values.update(range(start, end + 1, step))
+        return frozenset(values)
+
+    def _day_matches(self, moment):
+        day = moment.day in self.days
+        weekday = (moment.weekday() + 1) % 7 in self.weekdays
+        if self.any_day and self.any_weekday:
+            return True
+        if self.any_day:
+            return weekday
+        if self.any_weekday:
+            return day
+        return day or weekday
+
+    def next_after(self, moment):
+        """أول دقيقة مطابقة بعد moment - القفز بالشهر ثم اليوم ثم الساعة بدل المرور على كل دقيقة"""
+        current = timezone.localtime(moment).replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = current + timedelta(days=366 * 5)
+        while current < limit:
+            if current.month not in self.months:
+                current = (current.replace(day=1) + timedelta(days=32)).replace(day=1, hour=0, minute=0)
+            elif not self._day_matches(current):
+                current = (current + timedelta(days=1)).replace(hour=0, minute=0)
+            elif current.hour not in self.hours:
+                current = (current + timedelta(hours=1)).replace(minute=0)
+            elif current.minute not in self.minutes:
+                current += timedelta(minutes=1)
+            else:
+                return current
+        raise ValueError(f"cron expression never matches: {self.expression!r}")
+
+    def __str__(self):
+        return f"cron {self.expression}"
+
+
+class Job:
+    """تعريف مهمة دورية: الدالة والجدول والـ jitter والمدة القصوى لقفل التشغيل"""
+
+    def __init__(self, name, task, schedule, jitter=0, timeout=600, enabled=True):
+        self.name = name
+        self.task = task
+        self.schedule = schedule
+        self.jitter = jitter
+        self.timeout = timeout
+        self.enabled = enabled
+
+    @classmethod
+    def from_config(cls, name, config):
+        if 'cron' in config:
+            schedule = Cron(config['cron'])
+        elif 'interval' in config:
+            schedule = Interval(config['interval'])
+        else:
+            raise ValueError(f"scheduled job {name!r} needs 'interval' or 'cron'")
+        return cls(
+            name, config['task'], schedule,
+            jitter=config.get('jitter', 0), timeout=config.get('timeout', 600), enabled=config.get('enabled', True),
+        )
+
+    def next_run(self, after):
+        """موعد التشغيل التالي مع تأخير عشوائي حتى jitter ثانية حتى لا تبدأ المهام معاً"""
+        return self.schedule.next_after(after) + timedelta(seconds=random.uniform(0, self.jitter))
+
+    def run(self):
+        return import_string(self.task)()
+
+
+def configured_jobs():
+    """المهام المعرّفة في SCHEDULED_JOBS"""
+    return {
+        name: Job.from_config(name, config)
+        for name, config in getattr(settings, 'SCHEDULED_JOBS', {}).items()
+    }
+
+
+def record_duration(histogram, duration_ms):
+    """إضافة مدة تشغيل إلى مخطط المدة (قاموس JSON)"""
+    buckets = histogram.setdefault('buckets', {str(bound): 0 for bound in DURATION_BUCKETS_MS + ('inf',)})
+    bucket = next((str(bound) for bound in DURATION_BUCKETS_MS if duration_ms <= bound), 'inf')
+    buckets[bucket] = buckets.get(bucket, 0) + 1
+    histogram['count'] = histogram.get('count', 0) + 1
+    histogram['sum_ms'] = round(histogram.get('sum_ms', 0.0) + duration_ms, 2)
+    return histogram
+
+
+class Scheduler:
+    """منفذ المهام الدورية داخل العملية
+
+    يمكن تشغيله في كل عمليات الويب والعمال معاً: كل مهمة مستحقة تُحجز بتحديث شرطي
+    على صفها في ScheduledJob فتشغّلها عملية واحدة فقط، والقفل يُجدَّد كل دورة طالما
+    المهمة تعمل، وإذا توقفت العملية ينتهي القفل بعد timeout وتستلمها عملية أخرى.
+    """
+
+    def __init__(self, jobs=None, worker_id=None, max_workers=None, poll_interval=None):
+        config = scheduler_settings()
+        self.jobs = jobs if jobs is not None else configured_jobs()
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.max_workers = max_workers or int(config['MAX_WORKERS'])
+        self.poll_interval = poll_interval or float(config['POLL_INTERVAL'])
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='scheduler')
+        self._running = {}
+        self._lock = threading.Lock()
+
+    def sync(self, now=None):
+        """إنشاء صفوف المهام الجديدة - الموجودة تحتفظ بموعدها"""
+        now = now or timezone.now()
+        existing = set(ScheduledJob.objects.filter(name__in=list(self.jobs)).values_list('name', flat=True))
+        ScheduledJob.objects.bulk_create([
+            ScheduledJob(name=name, next_run_at=job.next_run(now))
+            for name, job in self.jobs.items() if name not in existing
+        ], ignore_conflicts=True)
+
+    def claim(self, job, now):
+        """قفل القيادة: True إذا حجزت هذه العملية تشغيل المهمة"""
+        unlocked = Q(locked_until__isnull=True) | Q(locked_until__lt=now)
+        claimed = ScheduledJob.objects.filter(unlocked, name=job.name, next_run_at__lte=now).update(
+            locked_by=self.worker_id, locked_until=now + timedelta(seconds=job.timeout), run_requested=False
+        )
+        if not claimed:
+            # مستحقة لكن تشغيلة سابقة ما زالت تعمل - لا تداخل، تُحسب فقط.
+            # التشغيل اليدوي المطلوب لا يُحسب ولا يُؤجل: يبدأ بعد انتهاء التشغيلة الحالية
+            ScheduledJob.objects.filter(
+                name=job.name, next_run_at__lte=now, locked_until__gte=now, run_requested=False
+            ).update(overlap_count=F('overlap_count') + 1, next_run_at=job.next_run(now))
+        return bool(claimed)
+
+    def _renew_leases(self, now):
+        with self._lock:
+            running = list(self._running)
+        for name in running:
+            ScheduledJob.objects.filter(name=name, locked_by=self.worker_id).update(
+                locked_until=now + timedelta(seconds=self.jobs[name].timeout)
+            )
+
+    def tick(self, now=None):
+        """دورة واحدة: تجديد أقفال المهام العاملة ثم حجز المستحقة وتشغيلها في الخلفية"""
+        now = now or timezone.now()
+        self._renew_leases(now)
+        started = []
+        for job in self.jobs.values():
+            with self._lock:
+                if not job.enabled or job.name in self._running:
+                    continue
+            if self.claim(job, now):
+                with self._lock:
+                    self._running[job.name] = self._pool.submit(self.execute, job)
+                started.append(job.name)
+        return started
+
+    def execute(self, job):
+        """تشغيل المهمة وتسجيل النتيجة والمدة ثم تحرير القفل وتحديد الموعد التالي"""
+        started_at = timezone.now()
+        started = time.perf_counter()
+        ScheduledJob.objects.filter(name=job.name, locked_by=self.worker_id).update(last_started_at=started_at)
+        status, error, result = 'success', '', {}
+        try:
+            result = job.run() or {}
+            if not isinstance(result, dict):
+                result = {'result': str(result)}
+        except Exception as e:
+            status, error = 'failed', f"{type(e).__name__}: {e}"
+            logger.exception(f"فشل تشغيل المهمة {job.name}")
+        duration_ms = (time.perf_counter() - started) * 1000
+
+        try:
+            record = ScheduledJob.objects.get(name=job.name)
+            finished_at = timezone.now()
+            next_run_at = job.next_run(started_at if isinstance(job.schedule, Interval) else finished_at)
+            ScheduledJob.objects.filter(name=job.name, locked_by=self.worker_id).update(
+                # طلب تشغيل وصل أثناء هذه التشغيلة يُنفذ في الدورة التالية مباشرة
+                next_run_at=Case(When(run_requested=True, then=Value(finished_at)), default=Value(next_run_at)),
+                locked_by='',
+                locked_until=None,
+                last_finished_at=finished_at,
+                last_status=status,
+                last_error=error,
+                last_duration_ms=round(duration_ms, 2),
+                last_result=result,
+                run_count=F('run_count') + 1,
+                failure_count=F('failure_count') + int(status == 'failed'),
+                duration_histogram=record_duration(record.duration_histogram or {}, duration_ms),
+            )
+        finally:
+            with self._lock:
+                self._running.pop(job.name, None)
+            connections.close_all()
+        return status
+
+    def run_forever(self, stop=None):
+        self.sync()
+        while not (stop and stop.is_set()):
+            try:
+                self.tick()
+            except Exception:
+                logger.exception("خطأ في دورة المجدول")
+            if stop:
+                stop.wait(self.poll_interval)
+            else:
+                time.sleep(self.poll_interval)
+
+    def shutdown(self, wait=True):
+        self._pool.shutdown(wait=wait)
+
+
+def request_run(name, now=None):
+    """تشغيل المهمة في أقرب دورة للمجدول بدل تشغيلها داخل طلب HTTP - False إذا لم تكن معرّفة
+
+    إذا كانت المهمة تعمل الآن يبقى الطلب معلقاً (run_requested) ويبدأ تشغيل جديد بعد انتهائها.
+    """
+    if name not in getattr(settings, 'SCHEDULED_JOBS', {}):
+        return False
+    now = now or timezone.now()
+    if not ScheduledJob.objects.filter(name=name).update(next_run_at=now, run_requested=True):
+        ScheduledJob.objects.bulk_create([ScheduledJob(name=name, next_run_at=now, run_requested=True)], ignore_conflicts=True)
+    return True
+
+
+_scheduler_thread = None
+_scheduler_lock = threading.Lock()
+
+
+def start_in_background():
+    """تشغيل المجدول في خيط خلفي داخل عملية الويب (SCHEDULER AUTOSTART)"""
+    global _scheduler_thread
+    with _scheduler_lock:
+        if _scheduler_thread is None:
+            _scheduler_thread = threading.Thread(target=Scheduler().run_forever, name='scheduler', daemon=True)
+            _scheduler_thread.start()
+        return _scheduler_thread
@@ -0,0 +1,53 @@
+"""المهام المسجلة في SCHEDULED_JOBS و BACKGROUND_JOB_TYPES
+
+كل مهمة تعيد ملخصاً صغيراً (ScheduledJob.last_result / BackgroundJob.result)،
+وتستقبل progress من طابور المهام (jobs.queue) أو None من المجدول.
+"""
+
+
+def refresh_fleet_positions(progress=None):
+    from ships.services import MarineTrafficService
+    result = MarineTrafficService().update_ship_positions(progress=progress)
+    return {
+        'updated_count': result['updated_count'],
+        'total_ships': result['total_ships'],
+        'errors': len(result['errors']),
+        'eta_changed': result['eta_changed'],
+        'elapsed_ms': result['timings']['elapsed_ms'],
+    }
+
+
+def refresh_weather(progress=None):
+    from weather.services import OpenWeatherService
+    result = OpenWeatherService().update_all_ports_weather(progress=progress)
+    return {
+        'updated_count': result['updated_count'],
+        'total_ports': result['total_ports'],
+        'alerts_created': result['alerts_created'],
+        'alerts_extended': result['alerts_extended'],
+        'alerts_expired': result['alerts_expired'],
+        'eta_changed': result['eta_changed'],
+        'elapsed_ms': result['timings']['elapsed_ms'],
+    }
+
+
+def check_ship_delays(progress=None, full=False):
+    from notifications.delays import DelayDetector
+    return DelayDetector().sweep(full=full)
+
+
+def check_weather_alerts(progress=None):
+    from notifications.services import NotificationService
+    return {'result': NotificationService().check_weather_alerts_for_ships()}
+
+
+def check_route_weather(progress=None):
+    from notifications.services import NotificationService
+    return {'result': NotificationService().check_route_weather_for_ships()}
+
+
+def generate_test_data(progress=None, ports=15, ships=50, users=20, messages=25):
+    from io import StringIO
+    from ships.management.commands.generate_test_data import Command
+    command = Command(stdout=StringIO())
+    return command.generate({'ports': ports, 'ships': ships, 'users': users, 'messages': messages}, progress=progress)
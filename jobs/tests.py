@@ -0,0 +1,248 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .models import BackgroundJob, ScheduledJob
+from .queue import JobWorker
+from .scheduler import Cron, Interval, Job, Scheduler, request_run
+
+PROBE = {'probe': {'task': 'jobs.tests.probe_task', 'interval': 3600}}
+
+
+def probe_task():
+    return {'ok': True}
+
+
+def probe_job(progress):
+    progress(0.5, "half", force=True)
+    return {'ok': True}
+
+
+def failing_job(progress):
+    raise RuntimeError("provider down")
+
+
+QUEUE_TYPES = {
+    'probe': {'task': 'jobs.tests.probe_job', 'concurrency': 2},
+    'failing': {'task': 'jobs.tests.failing_job', 'concurrency': 1},
+}
+
+
+class CronTests(TestCase):
+    """next_after يعيد أول دقيقة مطابقة بعد اللحظة (TIME_ZONE = UTC)"""
+
+    def at(self, *args):
+        return datetime(*args, tzinfo=dt_timezone.utc)
+
+    def test_steps_ranges_and_lists(self):
+        self.assertEqual(Cron('*/15 * * * *').next_after(self.at(2026, 3, 1, 10, 7, 30)), self.at(2026, 3, 1, 10, 15))
+        self.assertEqual(Cron('*/15 * * * *').next_after(self.at(2026, 3, 1, 10, 15)), self.at(2026, 3, 1, 10, 30))
+        self.assertEqual(Cron('0 9-17/4 * * *').next_after(self.at(2026, 3, 1, 13, 0)), self.at(2026, 3, 1, 17, 0))
+        self.assertEqual(Cron('5,50 23 * * *').next_after(self.at(2026, 3, 1, 23, 49)), self.at(2026, 3, 1, 23, 50))
+
+    def test_rolls_over_day_month_and_year(self):
+        self.assertEqual(Cron('30 2 * * *').next_after(self.at(2026, 3, 1, 3, 0)), self.at(2026, 3, 2, 2, 30))
+        self.assertEqual(Cron('0 0 1 * *').next_after(self.at(2026, 1, 31, 12, 0)), self.at(2026, 2, 1))
+        self.assertEqual(Cron('0 0 29 2 *').next_after(self.at(2026, 3, 1)), self.at(2028, 2, 29))
+        self.assertEqual(Cron('0 12 * 1 *').next_after(self.at(2026, 12, 31, 13, 0)), self.at(2027, 1, 1, 12, 0))
+
+    def test_weekday_and_day_of_month(self):
+        # 2026-03-01 يوم أحد (0)
+        self.assertEqual(Cron('0 8 * * 1').next_after(self.at(2026, 3, 1)), self.at(2026, 3, 2, 8, 0))
+        self.assertEqual(Cron('0 8 * * 0').next_after(self.at(2026, 3, 1, 9, 0)), self.at(2026, 3, 8, 8, 0))
+        # اليوم والأسبوع معاً: يكفي أحدهما - الجمعة 6 مارس قبل يوم 13
+        self.assertEqual(Cron('0 0 13 * 5').next_after(self.at(2026, 3, 1)), self.at(2026, 3, 6))
+
+    def test_invalid_expressions(self):
+        for expression in ('* * * *', '60 * * * *', '* 24 * * *', '*/0 * * * *', '5-2 * * * *', '* * * * 7'):
+            with self.assertRaises(ValueError, msg=expression):
+                Cron(expression)
+        with self.assertRaises(ValueError):
+            Cron('0 0 30 2 *').next_after(self.at(2026, 3, 1))
+
+
+class BackgroundJobParamsTests(TestCase):
+    """المعاملات تُقارن بقائمة 'params' لنوع المهمة قبل الإدراج"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(get_user_model().objects.create_user(username="ops", password="x", is_staff=True))
+
+    def post(self, data):
+        return self.client.post('/api/jobs/', data, format='json')
+
+    def test_rejects_invalid_params(self):
+        for params in (
+            {'bogus': 1},
+            {'ships': 10 ** 6},
+            {'ships': -1},
+            {'ships': '50'},
+            {'ships': True},
+        ):
+            response = self.post({'type': 'generate_test_data', 'params': params})
+            self.assertEqual(response.status_code, 400, params)
+        self.assertEqual(self.post({'type': 'refresh_weather', 'params': {'full': True}}).status_code, 400)
+        self.assertEqual(self.post([{'type': 'refresh_weather'}]).status_code, 400)
+        self.assertFalse(BackgroundJob.objects.exists())
+
+    def test_accepts_params_within_bounds(self):
+        response = self.post({'type': 'check_ship_delays', 'params': {'full': True}})
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(BackgroundJob.objects.get(id=response.data['job_id']).params, {'full': True})
+
+
+class JobWorkerTests(TransactionTestCase):
+    """العامل يشغّل المهام في خيوطه - TransactionTestCase حتى ترى الخيوط الكتابات"""
+
+    def worker(self, **kwargs):
+        worker = JobWorker(**kwargs)
+        self.addCleanup(worker.shutdown)
+        return worker
+
+    def queued(self, job_type, count=1, **fields):
+        return BackgroundJob.objects.bulk_create([
+            BackgroundJob(job_type=job_type, run_after=timezone.now(), **fields) for _ in range(count)
+        ])
+
+    @override_settings(BACKGROUND_JOB_TYPES=QUEUE_TYPES)
+    def test_concurrency_slots_hold_across_workers(self):
+        self.queued('probe', 5)
+        first = self.worker(worker_id='w1').claim(5)
+        self.assertEqual(sorted(job.slot for job in first), [0, 1])
+        self.assertEqual(self.worker(worker_id='w2').claim(5), [])
+
+        # القيد الفريد يمنع خانة مكررة حتى لو تجاوز عامل الفحص
+        waiting = BackgroundJob.objects.filter(status='queued').order_by('id').first()
+        with self.assertRaises(IntegrityError):
+            BackgroundJob.objects.filter(id=waiting.id).update(status='running', slot=0)
+
+    @override_settings(BACKGROUND_JOB_TYPES=QUEUE_TYPES)
+    def test_drain_runs_jobs_and_reports_progress(self):
+        jobs = self.queued('probe', 3)
+        self.assertEqual(self.worker(worker_id='w1').drain(), 3)
+        for job in BackgroundJob.objects.filter(id__in=[job.id for job in jobs]):
+            self.assertEqual((job.status, job.slot, job.progress, job.result), ('succeeded', None, 1.0, {'ok': True}))
+            self.assertEqual(job.progress_message, "half")
+
+    @override_settings(BACKGROUND_JOB_TYPES=QUEUE_TYPES)
+    def test_failure_is_retried_with_backoff_then_fails(self):
+        job, = self.queued('failing', max_attempts=3)
+        worker = self.worker(worker_id='w1')
+        for attempt in (1, 2):
+            started = timezone.now()
+            with self.assertLogs('jobs.queue', 'ERROR'):
+                self.assertEqual(worker.drain(), 1)
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.attempts, job.slot), ('queued', attempt, None))
+            self.assertIn('provider down', job.error)
+            # تأخير أُسّي مع jitter: بين نصف التأخير والتأخير كاملاً
+            delay = worker.backoff_base * 2 ** (attempt - 1)
+            self.assertGreaterEqual(job.run_after, started + timedelta(seconds=delay / 2))
+            self.assertLessEqual(job.run_after, timezone.now() + timedelta(seconds=delay))
+            self.assertEqual(worker.drain(), 0)  # لم يحن موعدها
+            BackgroundJob.objects.filter(id=job.id).update(run_after=timezone.now())
+
+        with self.assertLogs('jobs.queue', 'ERROR'):
+            self.assertEqual(worker.drain(), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('failed', 3))
+        self.assertIsNotNone(job.finished_at)
+
+    @override_settings(BACKGROUND_JOB_TYPES=QUEUE_TYPES)
+    def test_reap_requeues_jobs_of_stopped_workers(self):
+        now = timezone.now()
+        running = dict(status='running', claimed_by='gone', locked_until=now - timedelta(seconds=1))
+        retry, = self.queued('probe', attempts=1, max_attempts=3, slot=0, **running)
+        exhausted, = self.queued('probe', attempts=3, max_attempts=3, slot=1, **running)
+        alive, = self.queued('failing', attempts=1, slot=0, status='running', claimed_by='alive',
+                             locked_until=now + timedelta(minutes=1))
+
+        self.assertEqual(self.worker(worker_id='w1').reap(now), 2)
+
+        retry.refresh_from_db()
+        self.assertEqual((retry.status, retry.slot, retry.claimed_by), ('queued', None, ''))
+        self.assertIn('lease expired', retry.error)
+        exhausted.refresh_from_db()
+        self.assertEqual(exhausted.status, 'failed')
+        alive.refresh_from_db()
+        self.assertEqual((alive.status, alive.claimed_by), ('running', 'alive'))
+
+    def test_invalid_stored_params_fail_without_retry(self):
+        job = BackgroundJob.objects.create(
+            job_type='check_ship_delays', params={'everything': True}, max_attempts=3, run_after=timezone.now(),
+        )
+        self.assertEqual(self.worker(worker_id='w1', types=['check_ship_delays']).drain(), 1)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('failed', 1))
+        self.assertIn('unknown params', job.error)
+
+
+@override_settings(SCHEDULED_JOBS=PROBE)
+class SchedulerTests(TransactionTestCase):
+    """قفل القيادة على صف ScheduledJob - execute يغلق الاتصالات فتُستعمل TransactionTestCase"""
+
+    def setUp(self):
+        self.job = Job('probe', PROBE['probe']['task'], Interval(3600))
+        self.now = timezone.now()
+        ScheduledJob.objects.create(name='probe', next_run_at=self.now)
+
+    def scheduler(self, worker_id):
+        scheduler = Scheduler(jobs={'probe': self.job}, worker_id=worker_id, max_workers=1)
+        self.addCleanup(scheduler.shutdown)
+        return scheduler
+
+    def test_only_one_scheduler_claims_a_due_job(self):
+        schedulers = [self.scheduler(worker_id) for worker_id in ('a', 'b', 'c')]
+        self.assertEqual([scheduler.claim(self.job, self.now) for scheduler in schedulers], [True, False, False])
+        self.assertEqual(ScheduledJob.objects.get(name='probe').locked_by, 'a')
+
+    def test_overlap_is_counted_and_rescheduled(self):
+        leader, other = self.scheduler('a'), self.scheduler('b')
+        self.assertTrue(leader.claim(self.job, self.now))
+        later = self.now + timedelta(minutes=1)
+
+        self.assertFalse(other.claim(self.job, later))
+        record = ScheduledJob.objects.get(name='probe')
+        self.assertEqual((record.overlap_count, record.locked_by), (1, 'a'))
+        self.assertEqual(record.next_run_at, later + timedelta(hours=1))
+        # الموعد أُجّل فلا تُحسب كل دورة كتداخل جديد
+        self.assertFalse(other.claim(self.job, later + timedelta(seconds=5)))
+        self.assertEqual(ScheduledJob.objects.get(name='probe').overlap_count, 1)
+
+    def test_expired_lock_is_taken_over(self):
+        self.assertTrue(self.scheduler('a').claim(self.job, self.now))
+        # عملية 'a' توقفت دون تحرير القفل - بعد timeout تستلم المهمة عملية أخرى
+        ScheduledJob.objects.filter(name='probe').update(next_run_at=self.now)
+        self.assertTrue(self.scheduler('c').claim(self.job, self.now + timedelta(seconds=self.job.timeout + 1)))
+        self.assertEqual(ScheduledJob.objects.get(name='probe').locked_by, 'c')
+
+    def test_execute_releases_lock_and_schedules_from_start(self):
+        scheduler = self.scheduler('a')
+        self.assertTrue(scheduler.claim(self.job, self.now))
+        self.assertEqual(scheduler.execute(self.job), 'success')
+
+        record = ScheduledJob.objects.get(name='probe')
+        self.assertEqual((record.locked_by, record.locked_until, record.run_count), ('', None, 1))
+        self.assertEqual((record.last_status, record.last_result), ('success', {'ok': True}))
+        self.assertEqual(record.next_run_at, record.last_started_at + timedelta(hours=1))
+        self.assertEqual(record.duration_histogram['count'], 1)
+
+    def test_manual_run_requested_while_running_is_kept(self):
+        leader, other = self.scheduler('a'), self.scheduler('b')
+        self.assertTrue(leader.claim(self.job, self.now))
+
+        self.assertTrue(request_run('probe'))
+        self.assertFalse(other.claim(self.job, timezone.now()))
+        record = ScheduledJob.objects.get(name='probe')
+        self.assertEqual((record.overlap_count, record.run_requested), (0, True))
+
+        self.assertEqual(leader.execute(self.job), 'success')
+        # الطلب المعلق يُنفذ فور تحرير القفل بدل انتظار الموعد الدوري بعد ساعة
+        self.assertTrue(other.claim(self.job, timezone.now()))
+        record = ScheduledJob.objects.get(name='probe')
+        self.assertEqual((record.locked_by, record.run_requested), ('b', False))
@@ -0,0 +1,12 @@
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    # طابور المهام الخلفية
+    path('', views.BackgroundJobListView.as_view(), name='background-jobs'),
+    path('<int:job_id>/', views.BackgroundJobDetailView.as_view(), name='background-job'),
+
+    # المهام الدورية
+    path('scheduled/', views.ScheduledJobListView.as_view(), name='scheduled-jobs'),
+    path('scheduled/<str:name>/run/', views.ScheduledJobRunView.as_view(), name='scheduled-job-run'),
+]
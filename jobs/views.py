@@ -0,0 +1,146 @@
+from django.urls import reverse
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from .models import BackgroundJob, ScheduledJob
+from .queue import enqueue, job_types, validate_params
+from .scheduler import configured_jobs, request_run
+
+
+def job_status(record, job=None):
+    histogram = record.duration_histogram or {}
+    count = histogram.get('count', 0)
+    return {
+        'name': record.name,
+        'schedule': str(job.schedule) if job else None,
+        'enabled': job.enabled if job else False,
+        'jitter': job.jitter if job else None,
+        'timeout': job.timeout if job else None,
+        'next_run_at': record.next_run_at,
+        'running': bool(record.locked_by),
+        'run_requested': record.run_requested,
+        'locked_by': record.locked_by,
+        'locked_until': record.locked_until,
+        'last_started_at': record.last_started_at,
+        'last_finished_at': record.last_finished_at,
+        'last_status': record.last_status,
+        'last_error': record.last_error,
+        'last_duration_ms': record.last_duration_ms,
+        'last_result': record.last_result,
+        'run_count': record.run_count,
+        'failure_count': record.failure_count,
+        'overlap_count': record.overlap_count,
+        'duration_histogram': histogram.get('buckets', {}),
+        'avg_duration_ms': round(histogram.get('sum_ms', 0) / count, 2) if count else None,
+    }
+
+
+def background_job_status(job):
+    return {
+        'id': job.id,
+        'type': job.job_type,
+        'params': job.params,
+        'status': job.status,
+        'progress': job.progress,
+        'progress_message': job.progress_message,
+        'partial_result': job.partial_result,
+        'result': job.result,
+        'error': job.error,
+        'timings': job.timings,
+        'attempts': job.attempts,
+        'max_attempts': job.max_attempts,
+        'run_after': job.run_after,
+        'created_at': job.created_at,
+        'started_at': job.started_at,
+        'finished_at': job.finished_at,
+        'status_url': reverse('background-job', args=[job.id]),
+    }
+
+
+def enqueued_response(job_type, request, params=None):
+    """رد الـ endpoints الطويلة: المهمة تُضاف للطابور ويعود id فوراً (202)"""
+    job = enqueue(job_type, params, request.user)
+    return Response({"job_id": job.id, "status": job.status, "status_url": reverse('background-job', args=[job.id])}, status=202)
+
+
+def scheduled_run_response(name):
+    """رد الـ endpoints القديمة: المهمة تُجدول للدورة التالية ويعود الطلب فوراً (202)
+
+    إذا كانت تعمل الآن يُنفذ الطلب بعد انتهائها (job.running و job.run_requested في الرد).
+    """
+    if not request_run(name):
+        return Response({"error": f"Unknown job: {name}"}, status=404)
+    record = ScheduledJob.objects.get(name=name)
+    return Response({"message": f"Job '{name}' scheduled", "job": job_status(record, configured_jobs().get(name))}, status=202)
+
+
+class ScheduledJobListView(APIView):
+    """حالة المهام الدورية: الموعد التالي، القفل، آخر نتيجة ومخطط المدة"""
+    permission_classes = [IsAuthenticated]
+    
+    def get(self, request):
+        if not request.user.is_staff:
+            return Response({"error": "Permission denied"}, status=403)
+        
+        jobs = configured_jobs()
+        return Response([job_status(record, jobs.get(record.name)) for record in ScheduledJob.objects.all()])
+
+class ScheduledJobRunView(APIView):
+    """طلب تشغيل مهمة دورية الآن"""
+    permission_classes = [IsAuthenticated]
+    
+    def post(self, request, name):
+        if not request.user.is_staff:
+            return Response({"error": "Permission denied"}, status=403)
+        
+        return scheduled_run_response(name)
+
+class BackgroundJobListView(APIView):
+    """آخر مهام الطابور (GET) أو إضافة مهمة {"type": ..., "params": {...}} (POST)"""
+    permission_classes = [IsAuthenticated]
+    
+    def get(self, request):
+        if not request.user.is_staff:
+            return Response({"error": "Permission denied"}, status=403)
+        
+        jobs = BackgroundJob.objects.all()
+        for field in ('status', 'job_type'):
+            value = request.query_params.get(field)
+            if value:
+                jobs = jobs.filter(**{field: value})
+        try:
+            limit = min(int(request.query_params.get('limit', 50)), 500)
+        except ValueError:
+            return Response({"error": "limit must be an integer"}, status=400)
+        return Response([background_job_status(job) for job in jobs[:limit]])
+    
+    def post(self, request):
+        if not request.user.is_staff:
+            return Response({"error": "Permission denied"}, status=403)
+        
+        if not isinstance(request.data, dict):
+            return Response({"error": "Request body must be a JSON object"}, status=400)
+        job_type = request.data.get('type')
+        if job_type not in job_types():
+            return Response({"error": f"Unknown job type: {job_type}", "types": sorted(job_types())}, status=400)
+        params = request.data.get('params') or {}
+        if not isinstance(params, dict):
+            return Response({"error": "params must be an object"}, status=400)
+        try:
+            validate_params(job_type, params)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
+        return enqueued_response(job_type, request, params)
+
+class BackgroundJobDetailView(APIView):
+    """حالة مهمة: التقدم والنتائج الجزئية والتوقيتات ثم النتيجة النهائية"""
+    permission_classes = [IsAuthenticated]
+    
+    def get(self, request, job_id):
+        try:
+            job = BackgroundJob.objects.get(id=job_id)
+        except BackgroundJob.DoesNotExist:
+            return Response({"error": "Job not found"}, status=404)
+        if not request.user.is_staff and job.created_by_id != request.user.id:
+            return Response({"error": "Permission denied"}, status=403)
+        return Response(background_job_status(job))
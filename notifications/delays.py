@@ -0,0 +1,116 @@
+import logging
+import time
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from ships.models import Ship
+from .fanout import NotificationFanout
+from .models import ShipDelayState, SweepWatermark
+
+logger = logging.getLogger(__name__)
+
+WATERMARK = 'ship_delays'
+
+
+def delay_hours(expected_arrival, now):
+    return max(0, (now - expected_arrival).total_seconds() / 3600)
+
+
+class DelayDetector:
+    """كشف تأخيرات السفن تدريجياً بعلامة مائية (watermark)
+
+    كل مسح يقرأ فقط السفن التي تجاوز expected_arrival لها الفترة (العلامة، الآن]
+    عبر فهرس ship_expected_arrival_idx، ثم يحذف حالات التأخير التي تغير وقت وصولها.
+    فالتكلفة تتبع عدد السفن التي تغيرت حالتها وليس حجم الأسطول.
+
+    expected_arrival هو الموعد المخطط (EtaEngine يكتب تقديره في predicted_arrival)، لذلك
+    السفينة المتأخرة عن خطتها تُكتشف مهما كانت سرعتها، والتقدير يُرفق في الإشعار فقط.
+    السفينة التي حُذفت حالتها لتغير وقت وصولها تُعاد قراءتها في نفس المسح ولو صار وقتها قبل
+    العلامة؛ أما سفينة بلا حالة يُعدَّل وقتها يدوياً إلى ما قبل العلامة فلا يلتقطها إلا مسح كامل (full=True).
+    """
+
+    def __init__(self, fanout=None):
+        self.fanout = fanout or NotificationFanout()
+
+    def _claim_window(self, now, full):
+        """حجز الفترة (العلامة، now] بتحديث شرطي على العلامة
+
+        يعيد (True، بداية الفترة) - البداية None تعني كل السفن المتأخرة (أول مسح أو full)،
+        أو (False، None) إذا سبقنا مسح متزامن.
+        """
+        watermark = SweepWatermark.objects.filter(name=WATERMARK).first()
+        if watermark is None:
+            try:
+                with transaction.atomic():
+                    SweepWatermark.objects.create(name=WATERMARK, position=now)
+            except IntegrityError:
+                return False, None
+            return True, None
+        if now <= watermark.position:
+            return False, None
+        claimed = SweepWatermark.objects.filter(name=WATERMARK, position=watermark.position).update(position=now)
+        if not claimed:
+            return False, None
+        return True, (None if full else watermark.position)
+
+    def sweep(self, now=None, full=False):
+        started = time.perf_counter()
+        now = now or timezone.now()
+        result = {'scanned': 0, 'delayed': 0, 'cleared': 0, 'notifications': 0, 'skipped': False}
+
+        with transaction.atomic():
+            claimed, since = self._claim_window(now, full)
+            if not claimed:
+                result['skipped'] = True
+                return result
+
+            # 1. حالات لم تعد صحيحة: وقت الوصول تغير أو أُلغيت الوجهة
+            cleared = list(ShipDelayState.objects.filter(
+                Q(ship__expected_arrival__isnull=True)
+                | Q(ship__destination_port__isnull=True)
+                | ~Q(ship__expected_arrival=F('expected_arrival'))
+            ).values_list('ship_id', flat=True))
+            if cleared:
+                ShipDelayState.objects.filter(ship_id__in=cleared).delete()
+            result['cleared'] = len(cleared)
+
+            # 2. السفن التي أصبحت متأخرة منذ آخر مسح (مسح نطاق على الفهرس)، والتي حُذفت حالتها
+            # للتو حتى لو قُدِّم وقت وصولها إلى ما قبل العلامة
+            overdue = Ship.objects.filter(expected_arrival__lte=now, destination_port__isnull=False)
+            if since is not None:
+                overdue = overdue.filter(Q(expected_arrival__gt=since) | Q(id__in=cleared))
+            ships = list(overdue.select_related('destination_port').order_by())
+            result['scanned'] = len(ships)
+
+            known = dict(ShipDelayState.objects.filter(ship_id__in=[ship.id for ship in ships])
+                         .values_list('ship_id', 'expected_arrival'))
+            delayed = [ship for ship in ships if known.get(ship.id) != ship.expected_arrival]
+            if delayed:
+                ShipDelayState.objects.filter(ship_id__in=[ship.id for ship in delayed]).delete()
+                ShipDelayState.objects.bulk_create([
+                    ShipDelayState(ship_id=ship.id, expected_arrival=ship.expected_arrival, detected_at=now)
+                    for ship in delayed
+                ])
+
+                def build(ship, user_id):
+                    metadata = {
+                        'expected_arrival': ship.expected_arrival.isoformat(),
+                        'current_delay_hours': delay_hours(ship.expected_arrival, now),
+                    }
+                    if ship.predicted_arrival is not None:
+                        metadata['predicted_arrival'] = ship.predicted_arrival.isoformat()
+                        metadata['predicted_delay_hours'] = delay_hours(ship.expected_arrival, ship.predicted_arrival)
+                    return {
+                        'title': f"تأخير في السفينة {ship.name}",
+                        'message': f"السفينة {ship.name} متأخرة عن الوصول المتوقع إلى {ship.destination_port.name if ship.destination_port else 'الوجهة'}",
+                        'notification_type': 'delay',
+                        'severity': 'high',
+                        'metadata': metadata,
+                    }
+
+                result['notifications'] = len(self.fanout.fan_out(delayed, build))
+            result['delayed'] = len(delayed)
+
+        result['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 2)
+        logger.info(f"مسح التأخيرات: {result}")
+        return result
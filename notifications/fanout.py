@@ -0,0 +1,70 @@
+from collections import defaultdict
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from ships.models import Ship
+from .models import Notification
+from .stream import publish_notifications
+
+
+class NotificationFanout:
+    """كاتب إشعارات جماعي: المتابعون والتكرار كمجموعات والكتابة بدفعات bulk_create
+
+    عدد الاستعلامات ثابت مهما كان عدد السفن أو المتابعين:
+    استعلام للمتابعين + استعلام للإشعارات الحديثة + دفعات الكتابة.
+    """
+
+    def __init__(self, chunk_size=None):
+        self.chunk_size = chunk_size or getattr(settings, 'NOTIFICATION_BULK_CHUNK_SIZE', 1000)
+
+    def followers(self, ship_ids):
+        """{ship_id: [user_id, ...]} باستعلام واحد على جدول الربط"""
+        through = Ship.tracked_by.through
+        user_column = f"{Ship.tracked_by.field.m2m_reverse_field_name()}_id"
+        followers = defaultdict(list)
+        for ship_id, user_id in through.objects.filter(ship_id__in=ship_ids).values_list('ship_id', user_column):
+            followers[ship_id].append(user_id)
+        return followers
+
+    def recent_pairs(self, notification_type, ship_ids, hours):
+        """مجموعة (user_id, ship_id) التي استلمت إشعاراً من نفس النوع خلال آخر `hours` ساعة"""
+        return set(Notification.objects.filter(
+            notification_type=notification_type,
+            related_ship_id__in=ship_ids,
+            created_at__gte=timezone.now() - timedelta(hours=hours)
+        ).values_list('user_id', 'related_ship_id'))
+
+    def fan_out(self, ships, build, dedup_type=None, dedup_hours=None):
+        """إنشاء إشعار لكل (سفينة، متابع) ثم كتابتها دفعة واحدة
+
+        build(ship, user_id) يعيد قاموس حقول Notification أو None لتخطي المستلم.
+        عند تمرير dedup_type/dedup_hours يُتخطى كل مستلم له إشعار حديث من نفس النوع.
+        """
+        ships = {ship.id: ship for ship in ships}
+        if not ships:
+            return []
+
+        followers = self.followers(list(ships))
+        recent = set()
+        if dedup_type and dedup_hours:
+            recent = self.recent_pairs(dedup_type, list(followers), dedup_hours)
+
+        notifications = []
+        for ship_id, user_ids in followers.items():
+            ship = ships[ship_id]
+            for user_id in user_ids:
+                if (user_id, ship_id) in recent:
+                    continue
+                fields = build(ship, user_id)
+                if fields:
+                    notifications.append(Notification(user_id=user_id, related_ship=ship, **fields))
+
+        return self.write(notifications)
+
+    def write(self, notifications):
+        """كتابة الإشعارات بدفعات bulk_create ثم دفعها للمشتركين بعد تأكيد المعاملة"""
+        if notifications:
+            Notification.objects.bulk_create(notifications, batch_size=self.chunk_size)
+            transaction.on_commit(lambda: publish_notifications(notifications))
+        return notifications
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0003_message_notificatio_to_user_e092b7_idx_and_more'),
+        ('ships', '0006_ship_ship_expected_arrival_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShipDelayState',
+            fields=[
+                ('ship', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='delay_state', serialize=False, to='ships.ship')),
+                ('expected_arrival', models.DateTimeField()),
+                ('detected_at', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name': 'حالة تأخير',
+                'verbose_name_plural': 'حالات التأخير',
+            },
+        ),
+        migrations.CreateModel(
+            name='SweepWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('position', models.DateTimeField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'علامة مسح',
+                'verbose_name_plural': 'علامات المسح',
+            },
+        ),
+    ]
@@ -50,6 +50,7 @@ class Notification(models.Model):
         indexes = [
             models.Index(fields=['user', 'is_read', 'created_at']),
             models.Index(fields=['notification_type', 'created_at']),
+            models.Index(fields=['user', '-created_at', '-id']),  # صفحات cursor
         ]
         verbose_name = 'إشعار'
         verbose_name_plural = 'إشعارات'
@@ -109,6 +110,9 @@ class Message(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['to_user', '-created_at', '-id']),  # صفحات cursor
+        ]
         verbose_name = 'رسالة'
         verbose_name_plural = 'رسائل'
     
@@ -141,4 +145,33 @@ class Message(models.Model):
             content=content,
             parent_message=self,
             related_ship=self.related_ship
-        )
\ No newline at end of file
+        )
+
+class SweepWatermark(models.Model):
+    """آخر لحظة عالجتها عملية مسح تدريجية - المسح التالي يبدأ منها (notifications.delays)"""
+    name = models.CharField(max_length=50, unique=True)
+    position = models.DateTimeField()
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = 'علامة مسح'
+        verbose_name_plural = 'علامات المسح'
+    
+    def __str__(self):
+        return f"{self.name} @ {self.position:%Y-%m-%d %H:%M:%S}"
+
+class ShipDelayState(models.Model):
+    """حالة تأخير السفينة: وقت الوصول المتوقع الذي تجاوزته وأُبلغ عنه
+    
+    تُحذف عندما يتغير expected_arrival أو تُلغى الوجهة، فوجود الصف يعني أن السفينة متأخرة الآن.
+    """
+    ship = models.OneToOneField('ships.Ship', on_delete=models.CASCADE, primary_key=True, related_name='delay_state')
+    expected_arrival = models.DateTimeField()
+    detected_at = models.DateTimeField()
+    
+    class Meta:
+        verbose_name = 'حالة تأخير'
+        verbose_name_plural = 'حالات التأخير'
+    
+    def __str__(self):
+        return f"{self.ship_id} متأخرة منذ {self.expected_arrival:%Y-%m-%d %H:%M}"
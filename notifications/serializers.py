@@ -10,13 +10,7 @@ class NotificationSerializer(serializers.ModelSerializer):
         read_only_fields = ('created_at',)
     
     def get_shipment_info(self, obj):
-        if obj.related_shipment:
-            return {
-                'id': obj.related_shipment.id,
-                'ship_name': obj.related_shipment.ship.name,
-                'status': obj.related_shipment.status
-            }
-        return None
+        return obj.get_related_ship_info()
 
 class MessageSerializer(serializers.ModelSerializer):
     from_user_name = serializers.CharField(source='from_user.username', read_only=True)
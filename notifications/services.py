@@ -1,10 +1,11 @@
+from django.conf import settings
 from django.utils import timezone
 from django.contrib.auth import get_user_model
+from ships.geo import GridIndex, KM_PER_DEGREE
 from ships.models import Ship
 from weather.models import WeatherAlert
-from .models import Notification
+from .fanout import NotificationFanout
 import logging
-from datetime import timedelta
 
 logger = logging.getLogger(__name__)
 User = get_user_model()
@@ -12,45 +13,17 @@ User = get_user_model()
 class NotificationService:
     """خدمة الإشعارات التلقائية لنظام تتبع السفن"""
     
-    def check_ship_delays(self):
-        """التحقق من السفن المتأخرة بناءً على وقت الوصول المتوقع"""
+    def __init__(self):
+        self.fanout = NotificationFanout()
+    
+    def check_ship_delays(self, full=False):
+        """التحقق من السفن التي أصبحت متأخرة منذ آخر فحص (مسح تدريجي - notifications.delays)"""
         try:
-            # السفن التي تجاوزت وقت الوصول المتوقع
-            delayed_ships = Ship.objects.filter(
-                expected_arrival__lt=timezone.now(),
-                destination_port__isnull=False
-            )
+            from .delays import DelayDetector
+            result = DelayDetector(self.fanout).sweep(full=full)
+            logger.info(f"تم إنشاء {result['notifications']} إشعار تأخير")
             
-            notifications_created = 0
-            for ship in delayed_ships:
-                # لكل مستخدم يتعقب هذه السفينة
-                for user in ship.tracked_by.all():
-                    # تحقق إذا كان هناك إشعار سابق لنفس التأخير (في آخر 24 ساعة)
-                    recent_notification = Notification.objects.filter(
-                        user=user,
-                        notification_type='delay',
-                        related_ship=ship,
-                        created_at__gte=timezone.now() - timedelta(hours=24)
-                    ).exists()
-                    
-                    if not recent_notification:
-                        # إنشاء إشعار تأخير جديد
-                        Notification.objects.create(
-                            user=user,
-                            title=f"تأخير في السفينة {ship.name}",
-                            message=f"السفينة {ship.name} متأخرة عن الوصول المتوقع إلى {ship.destination_port.name if ship.destination_port else 'الوجهة'}",
-                            notification_type='delay',
-                            severity='high',
-                            related_ship=ship,
-                            metadata={
-                                'expected_arrival': ship.expected_arrival.isoformat() if ship.expected_arrival else None,
-                                'current_delay_hours': self._calculate_delay_hours(ship)
-                            }
-                        )
-                        notifications_created += 1
-                        logger.info(f"تم إنشاء إشعار تأخير للسفينة {ship.name} للمستخدم {user.username}")
-            
-            return f"تم إنشاء {notifications_created} إشعار تأخير"
+            return f"تم إنشاء {result['notifications']} إشعار تأخير"
             
         except Exception as e:
             logger.error(f"خطأ في التحقق من تأخيرات السفن: {e}")
@@ -63,49 +36,57 @@ class NotificationService:
             return max(0, delay.total_seconds() / 3600)  # التحويل لساعات
         return 0
     
+    SEVERITY_RANK = {'low': 0, 'medium': 1, 'high': 2, 'critical': 3}
+    
     def check_weather_alerts_for_ships(self):
-        """إرسال إشعارات إنذارات الطقس للسفن المتأثرة"""
+        """إرسال إشعارات إنذارات الطقس للسفن المتأثرة
+        
+        مواقع السفن تُفهرس مرة واحدة في شبكة خلايا، وكل إنذار يُطابق مع السفن
+        ضمن نصف قطر حقيقي (مسافة الدائرة العظمى) بدلاً من مربع ±3°.
+        """
         try:
-            active_alerts = WeatherAlert.objects.filter(is_active=True)
-            notifications_created = 0
+            active_alerts = list(WeatherAlert.objects.active().select_related('port'))
+            if not active_alerts:
+                return "تم إنشاء 0 إشعار طقس"
             
+            radius_km = getattr(settings, 'WEATHER_ALERT_RADIUS_KM', 333)
+            index = GridIndex(cell_deg=max(0.5, radius_km / KM_PER_DEGREE))
+            ships = Ship.objects.filter(
+                current_latitude__isnull=False,
+                current_longitude__isnull=False,
+            ).only('id', 'name', 'imo_number', 'type', 'current_latitude', 'current_longitude')
+            for ship in ships:
+                index.add(ship, ship.current_latitude, ship.current_longitude)
+            
+            # لكل سفينة: الإنذار الأشد ثم الأقرب
+            matched = {}
             for alert in active_alerts:
-                # البحث عن السفن القريبة من منطقة الإنذار (في نطاق 3 درجات)
-                nearby_ships = Ship.objects.filter(
-                    current_latitude__isnull=False,
-                    current_longitude__isnull=False,
-                    current_latitude__range=(alert.port.latitude-3, alert.port.latitude+3),
-                    current_longitude__range=(alert.port.longitude-3, alert.port.longitude+3)
-                )
-                
-                for ship in nearby_ships:
-                    # لكل مستخدم يتعقب هذه السفينة
-                    for user in ship.tracked_by.all():
-                        # تحقق من عدم وجود إشعار طقس حديث لنفس السفينة
-                        recent_weather_notification = Notification.objects.filter(
-                            user=user,
-                            notification_type='weather',
-                            related_ship=ship,
-                            created_at__gte=timezone.now() - timedelta(hours=6)
-                        ).exists()
-                        
-                        if not recent_weather_notification:
-                            Notification.objects.create(
-                                user=user,
-                                title=f"إنذار طقس - {ship.name}",
-                                message=f"{alert.message} - قد يؤثر على سفينتك المتعقبة {ship.name} في منطقة {alert.port.name}",
-                                notification_type='weather',
-                                severity=alert.severity,
-                                related_ship=ship,
-                                metadata={
-                                    'alert_type': alert.alert_type,
-                                    'port_name': alert.port.name,
-                                    'port_country': alert.port.country
-                                }
-                            )
-                            notifications_created += 1
-            
-            return f"تم إنشاء {notifications_created} إشعار طقس"
+                rank = self.SEVERITY_RANK.get(alert.severity, 0)
+                for ship, distance in index.within(alert.port.latitude, alert.port.longitude, radius_km):
+                    best = matched.get(ship.id)
+                    if best is None or (rank, -distance) > (best[2], -best[3]):
+                        matched[ship.id] = (ship, alert, rank, distance)
+            
+            def build(ship, user_id):
+                _, alert, _, distance = matched[ship.id]
+                return {
+                    'title': f"إنذار طقس - {ship.name}",
+                    'message': f"{alert.message} - قد يؤثر على سفينتك المتعقبة {ship.name} في منطقة {alert.port.name}",
+                    'notification_type': 'weather',
+                    'severity': alert.severity,
+                    'metadata': {
+                        'alert_type': alert.alert_type,
+                        'port_name': alert.port.name,
+                        'port_country': alert.port.country,
+                        'distance_km': round(distance, 1)
+                    }
+                }
+            
+            # تحقق من عدم وجود إشعار طقس حديث (6 ساعات) لنفس السفينة والمستخدم
+            created = self.fanout.fan_out(
+                [match[0] for match in matched.values()], build, dedup_type='weather', dedup_hours=6
+            )
+            return f"تم إنشاء {len(created)} إشعار طقس"
             
         except Exception as e:
             logger.error(f"خطأ في إشعارات الطقس للسفن: {e}")
@@ -114,55 +95,120 @@ class NotificationService:
     def send_ship_position_update(self, ship, old_position=None):
         """إرسال إشعار بتحديث موقع السفينة للمستخدمين المتعقبين"""
         try:
-            notifications_created = 0
-            
-            # فقط أرسل إشعارات إذا كانت السفينة لها متابعين
-            if ship.tracked_by.exists():
-                for user in ship.tracked_by.all():
-                    Notification.objects.create(
-                        user=user,
-                        title=f"تحديث موقع - {ship.name}",
-                        message=f"تم تحديث موقع السفينة {ship.name} - الاتجاه: {ship.current_heading or 'غير معروف'}° - السرعة: {ship.current_speed or 'غير معروف'} عقدة",
-                        notification_type='position',
-                        severity='low',
-                        related_ship=ship,
-                        metadata={
-                            'latitude': ship.current_latitude,
-                            'longitude': ship.current_longitude,
-                            'speed': ship.current_speed,
-                            'heading': ship.current_heading,
-                            'position_changed': old_position is not None
-                        }
-                    )
-                    notifications_created += 1
-            
-            return f"تم إرسال إشعارات تحديث الموقع لـ {notifications_created} مستخدم"
+            def build(ship, user_id):
+                return {
+                    'title': f"تحديث موقع - {ship.name}",
+                    'message': f"تم تحديث موقع السفينة {ship.name} - الاتجاه: {ship.current_heading or 'غير معروف'}° - السرعة: {ship.current_speed or 'غير معروف'} عقدة",
+                    'notification_type': 'position',
+                    'severity': 'low',
+                    'metadata': {
+                        'latitude': ship.current_latitude,
+                        'longitude': ship.current_longitude,
+                        'speed': ship.current_speed,
+                        'heading': ship.current_heading,
+                        'position_changed': old_position is not None
+                    }
+                }
+            
+            created = self.fanout.fan_out([ship], build)
+            return f"تم إرسال إشعارات تحديث الموقع لـ {len(created)} مستخدم"
             
         except Exception as e:
             logger.error(f"خطأ في إشعارات الموقع: {e}")
             return f"خطأ: {e}"
     
+    def check_route_weather_for_ships(self):
+        """تحليل طقس مسار كل سفينة متابَعة إلى ميناء وجهتها وإشعار متابعيها بالمخاطر
+
+        يعمل من المجدول (jobs.tasks.check_route_weather) وليس من صفحة التحليل: محلل واحد
+        لكل السفن فالمسارات المتقاربة تشترك في خلايا الطقس (weather.cache).
+        """
+        try:
+            from weather.routing import RouteWeatherAnalyzer
+            
+            ships = Ship.objects.filter(
+                tracked_by__isnull=False,
+                destination_port__isnull=False,
+                current_latitude__isnull=False,
+                current_longitude__isnull=False,
+            ).distinct().select_related('destination_port').only(
+                'id', 'name', 'current_latitude', 'current_longitude', 'current_speed',
+                'destination_port__latitude', 'destination_port__longitude',
+            )
+            analyzer = RouteWeatherAnalyzer()
+            alerts = {}
+            for ship in ships:
+                analysis = analyzer.analyze(
+                    ship.current_latitude, ship.current_longitude,
+                    ship.destination_port.latitude, ship.destination_port.longitude,
+                    ship.current_speed or None,
+                )
+                if analysis['issues']:
+                    severity = 'high' if analysis['risk_level'] == 'high' else 'medium'
+                    alerts[ship.id] = (ship, analysis['issues'], severity)
+            
+            created = self.send_route_weather_alerts(alerts.values())
+            return f"تم إنشاء {len(created)} إشعار طقس المسار"
+            
+        except Exception as e:
+            logger.error(f"خطأ في تحليل طقس المسارات: {e}")
+            return f"خطأ: {e}"
+    
+    def send_route_weather_alert(self, ship, weather_issues, severity='medium'):
+        """إشعار متابعي السفينة بمخاطر الطقس عند موقعها أو على مسارها"""
+        try:
+            created = self.send_route_weather_alerts([(ship, weather_issues, severity)])
+            return f"تم إرسال إشعارات طقس المسار لـ {len(created)} مستخدم"
+            
+        except Exception as e:
+            logger.error(f"خطأ في إشعارات طقس المسار: {e}")
+            return f"خطأ: {e}"
+    
+    def send_route_weather_alerts(self, alerts):
+        """إشعارات طقس المسار لدفعة [(ship, issues, severity), ...] بكتابة واحدة"""
+        alerts = list(alerts)
+        by_ship = {ship.id: (issues, severity) for ship, issues, severity in alerts}
+        
+        def build(ship, user_id):
+            weather_issues, severity = by_ship[ship.id]
+            return {
+                'title': f"طقس على مسار {ship.name}",
+                'message': f"مخاطر طقس للسفينة {ship.name}: " + "، ".join(weather_issues[:5]),
+                'notification_type': 'weather',
+                'severity': severity,
+                'metadata': {
+                    'issues': weather_issues,
+                    'latitude': ship.current_latitude,
+                    'longitude': ship.current_longitude,
+                }
+            }
+        
+        # لا تكرار إذا وصل المستخدم إشعار طقس لنفس السفينة مؤخراً
+        return self.fanout.fan_out(
+            [ship for ship, _, _ in alerts], build, dedup_type='weather',
+            dedup_hours=getattr(settings, 'ROUTE_WEATHER_ALERT_DEDUP_HOURS', 6),
+        )
+    
     def send_ship_arrival_notification(self, ship):
         """إرسال إشعار وصول السفينة"""
         try:
-            notifications_created = 0
-            
-            for user in ship.tracked_by.all():
-                Notification.objects.create(
-                    user=user,
-                    title=f"وصول السفينة {ship.name}",
-                    message=f"السفينة {ship.name} قد وصلت إلى {ship.destination_port.name if ship.destination_port else 'الوجهة'}",
-                    notification_type='arrival',
-                    severity='medium',
-                    related_ship=ship,
-                    metadata={
-                        'destination': ship.destination_port.name if ship.destination_port else None,
-                        'arrival_time': timezone.now().isoformat()
+            destination = ship.destination_port.name if ship.destination_port else None
+            arrival_time = timezone.now().isoformat()
+            
+            def build(ship, user_id):
+                return {
+                    'title': f"وصول السفينة {ship.name}",
+                    'message': f"السفينة {ship.name} قد وصلت إلى {destination or 'الوجهة'}",
+                    'notification_type': 'arrival',
+                    'severity': 'medium',
+                    'metadata': {
+                        'destination': destination,
+                        'arrival_time': arrival_time
                     }
-                )
-                notifications_created += 1
+                }
             
-            return f"تم إرسال إشعارات الوصول لـ {notifications_created} مستخدم"
+            created = self.fanout.fan_out([ship], build)
+            return f"تم إرسال إشعارات الوصول لـ {len(created)} مستخدم"
             
         except Exception as e:
             logger.error(f"خطأ في إشعارات الوصول: {e}")
@@ -171,42 +217,48 @@ class NotificationService:
     def send_eta_change_notification(self, ship, old_eta, new_eta):
         """إرسال إشعار تغيير وقت الوصول المتوقع"""
         try:
-            notifications_created = 0
-            
-            for user in ship.tracked_by.all():
-                Notification.objects.create(
-                    user=user,
-                    title=f"تغيير وقت الوصول - {ship.name}",
-                    message=f"تم تغيير وقت الوصول المتوقع للسفينة {ship.name} من {old_eta.strftime('%Y-%m-%d %H:%M')} إلى {new_eta.strftime('%Y-%m-%d %H:%M')}",
-                    notification_type='eta_change',
-                    severity='medium',
-                    related_ship=ship
-                )
-                notifications_created += 1
-            
-            return f"تم إرسال إشعارات تغيير وقت الوصول لـ {notifications_created} مستخدم"
+            created = self.send_eta_change_notifications([(ship, old_eta, new_eta)])
+            return f"تم إرسال إشعارات تغيير وقت الوصول لـ {len(created)} مستخدم"
             
         except Exception as e:
             logger.error(f"خطأ في إشعارات تغيير وقت الوصول: {e}")
             return f"خطأ: {e}"
     
+    def send_eta_change_notifications(self, changes):
+        """إشعارات تغيير وقت الوصول لدفعة [(ship, old_eta, new_eta), ...] بكتابة واحدة (ships.eta)"""
+        etas = {ship.id: (old_eta, new_eta) for ship, old_eta, new_eta in changes}
+        
+        def build(ship, user_id):
+            old_eta, new_eta = etas[ship.id]
+            return {
+                'title': f"تغيير وقت الوصول - {ship.name}",
+                'message': f"تم تغيير وقت الوصول المتوقع للسفينة {ship.name} من {old_eta.strftime('%Y-%m-%d %H:%M')} إلى {new_eta.strftime('%Y-%m-%d %H:%M')}",
+                'notification_type': 'eta_change',
+                'severity': 'medium',
+                'metadata': {
+                    'old_eta': old_eta.isoformat(),
+                    'new_eta': new_eta.isoformat(),
+                    'change_hours': round((new_eta - old_eta).total_seconds() / 3600, 2),
+                },
+            }
+        
+        return self.fanout.fan_out([ship for ship, _, _ in changes], build)
+    
     def send_departure_notification(self, ship, departure_port):
         """إرسال إشعار مغادرة السفينة"""
         try:
-            notifications_created = 0
-            
-            for user in ship.tracked_by.all():
-                Notification.objects.create(
-                    user=user,
-                    title=f"مغادرة السفينة {ship.name}",
-                    message=f"السفينة {ship.name} قد غادرت {departure_port.name} متجهة إلى {ship.destination_port.name if ship.destination_port else 'الوجهة التالية'}",
-                    notification_type='departure',
-                    severity='low',
-                    related_ship=ship
-                )
-                notifications_created += 1
+            destination = ship.destination_port.name if ship.destination_port else 'الوجهة التالية'
+            
+            def build(ship, user_id):
+                return {
+                    'title': f"مغادرة السفينة {ship.name}",
+                    'message': f"السفينة {ship.name} قد غادرت {departure_port.name} متجهة إلى {destination}",
+                    'notification_type': 'departure',
+                    'severity': 'low',
+                }
             
-            return f"تم إرسال إشعارات المغادرة لـ {notifications_created} مستخدم"
+            created = self.fanout.fan_out([ship], build)
+            return f"تم إرسال إشعارات المغادرة لـ {len(created)} مستخدم"
             
         except Exception as e:
             logger.error(f"خطأ في إشعارات المغادرة: {e}")
@@ -0,0 +1,12 @@
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from .models import Notification
+from .stream import publish_notifications
+
+
+@receiver(post_save, sender=Notification)
+def push_created_notification(sender, instance, created, **kwargs):
+    """دفع الإشعارات المنشأة فردياً (bulk_create يُدفع من NotificationFanout.write)"""
+    if created:
+        transaction.on_commit(lambda: publish_notifications([instance]))
@@ -0,0 +1,301 @@
+import asyncio
+import json
+import logging
+import queue
+import secrets
+import threading
+from collections import defaultdict
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
+from django.db.models import Count, Max
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from .models import Notification
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription(queue.Queue):
+    """اشتراك خيط متزامن (بث WSGI)
+
+    overflowed يعني أن أحداثاً سقطت لبطء العميل، فيستعيدها البث من الجدول.
+    """
+
+    overflowed = False
+
+    def offer(self, event):
+        try:
+            self.put_nowait(event)
+        except queue.Full:
+            self.overflowed = True
+
+
+class LoopSubscription:
+    """اشتراك مولّد async (بث ASGI): النشر من خيط آخر يمر بحلقة الأحداث"""
+
+    overflowed = False
+
+    def __init__(self, loop, maxsize):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=maxsize)
+
+    def offer(self, event):
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            pass  # الحلقة أُغلقت - الاتصال انتهى
+
+    def _put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    async def get(self):
+        return await self.queue.get()
+
+
+class LocalBroker:
+    """وسيط نشر/اشتراك داخل العملية
+
+    الناشر الوحيد هو StreamPoller الخاص بالعملية، فكل اشتراك يرى الأحداث مرتبة
+    مهما كانت العملية التي كتبت الإشعار.
+    """
+
+    def __init__(self, queue_size=100):
+        self.queue_size = queue_size
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id, loop=None):
+        if loop is None:
+            subscription = Subscription(maxsize=self.queue_size)
+        else:
+            subscription = LoopSubscription(loop, self.queue_size)
+        with self._lock:
+            self._subscribers[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, user_id, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(user_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[user_id]
+
+    def wants(self, user_id):
+        """هل يوجد مشترك لهذا المستخدم (لتجنب تسلسل الأحداث بلا فائدة)"""
+        return user_id in self._subscribers
+
+    def subscribed_users(self):
+        with self._lock:
+            return set(self._subscribers)
+
+    def publish(self, user_id, event):
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        for subscription in subscribers:
+            subscription.offer(event)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    """الوسيط المهيأ في NOTIFICATION_BROKER (LocalBroker افتراضياً)"""
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            broker_class = import_string(getattr(settings, 'NOTIFICATION_BROKER', 'notifications.stream.LocalBroker'))
+            _broker = broker_class()
+        return _broker
+
+
+def notification_event(notification):
+    from .serializers import NotificationSerializer
+    return {
+        'id': notification.id,
+        'event': 'notification',
+        'data': {'notification': NotificationSerializer(notification).data, 'unread_delta': 0 if notification.is_read else 1},
+    }
+
+
+def unread_event(user_id, unread_count):
+    return {'event': 'unread', 'data': {'unread_count': unread_count}}
+
+
+class StreamPoller:
+    """مستطلع واحد لكل عملية يوزع الإشعارات الجديدة على مشتركي الوسيط
+
+    الجدول مشترك بين كل العمليات، فالإشعارات التي يكتبها run_job_worker أو run_scheduler
+    تصل كما تصل إشعارات عملية الويب. كل NOTIFICATION_STREAM_POLL_SECONDS (أو فور
+    الإيقاظ بعد كتابة في هذه العملية) يقرأ ما بعد علامة id عامة بدل استعلام لكل عميل،
+    ويعيد عدّ غير المقروء فقط لمن وصله إشعار أو قرأ إشعاراً (read_at) منذ الدورة السابقة.
+    """
+
+    def __init__(self, broker, batch_size=500):
+        self.broker = broker
+        self.batch_size = batch_size
+        self.high_water = None
+        self.read_since = None
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def ensure_started(self):
+        """بدء الخيط عند أول اشتراك - العلامة تُضبط قبل أن يقرأ الاتصال ما فاته"""
+        with self._lock:
+            if self._thread is None:
+                self.high_water = Notification.objects.aggregate(last=Max('id'))['last'] or 0
+                self.read_since = timezone.now()
+                self._thread = threading.Thread(target=self.run, name='notification-stream-poller', daemon=True)
+                self._thread.start()
+
+    def wake(self):
+        self._wake.set()
+
+    def run(self):
+        while True:
+            self._wake.wait(getattr(settings, 'NOTIFICATION_STREAM_POLL_SECONDS', 2))
+            self._wake.clear()
+            try:
+                self.poll()
+            except Exception:
+                logger.exception("فشل استطلاع إشعارات البث")
+                connection.close()
+
+    def poll(self):
+        changed = set()
+        while True:
+            rows = list(
+                Notification.objects.filter(id__gt=self.high_water).order_by('id').values_list('id', 'user_id')[:self.batch_size]
+            )
+            if not rows:
+                break
+            self.high_water = rows[-1][0]
+            # المشتركون بعد قراءة الصفوف: من اشترك لاحقاً يجدها في استعادته من الجدول
+            users = self.broker.subscribed_users()
+            wanted = [notification_id for notification_id, user_id in rows if user_id in users]
+            if wanted:
+                for notification in Notification.objects.filter(id__in=wanted).select_related('related_ship').order_by('id'):
+                    self.broker.publish(notification.user_id, notification_event(notification))
+                    changed.add(notification.user_id)
+            if len(rows) < self.batch_size:
+                break
+
+        users = self.broker.subscribed_users()
+        checked_at = timezone.now()
+        if users:
+            # تداخل دورة واحدة: read_at يُضبط قبل الالتزام فقد يظهر متأخراً عن وقته
+            lookback = timedelta(seconds=getattr(settings, 'NOTIFICATION_STREAM_POLL_SECONDS', 2))
+            changed.update(Notification.objects.filter(
+                user_id__in=users, read_at__gt=self.read_since - lookback,
+            ).values_list('user_id', flat=True).distinct())
+        self.read_since = checked_at
+
+        changed &= users
+        if changed:
+            counts = dict(
+                Notification.objects.filter(user_id__in=changed, is_read=False)
+                .values('user_id').annotate(unread=Count('id')).values_list('user_id', 'unread')
+            )
+            for user_id in changed:
+                self.broker.publish(user_id, unread_event(user_id, counts.get(user_id, 0)))
+
+
+_poller = None
+_poller_lock = threading.Lock()
+
+
+def get_poller():
+    global _poller
+    with _poller_lock:
+        if _poller is None:
+            _poller = StreamPoller(get_broker())
+        return _poller
+
+
+class NotificationFeed:
+    """حالة بث اتصال واحد: ما فاته من الجدول ثم أحداث المستطلع بلا تكرار
+
+    backlog() يقرأ صفحة بعد آخر id أُرسل (Last-Event-ID)، والصفحة الأخيرة تحمل عدد
+    غير المقروء؛ accept() يسقط ما أُرسل مسبقاً والعدد غير المتغير.
+    """
+
+    def __init__(self, user_id, last_event_id=None, batch_size=100):
+        self.user_id = user_id
+        self.sent_id = last_event_id
+        self.batch_size = batch_size
+        self.unread_count = None
+        self.caught_up = False
+
+    def backlog(self):
+        get_poller().ensure_started()
+        notifications = Notification.objects.filter(user_id=self.user_id)
+        if self.sent_id is None:
+            # اتصال جديد بلا Last-Event-ID: نبدأ من الآن بلا استعادة
+            self.sent_id = notifications.aggregate(last=Max('id'))['last'] or 0
+
+        page = list(notifications.filter(id__gt=self.sent_id).select_related('related_ship').order_by('id')[:self.batch_size])
+        events = [notification_event(notification) for notification in page]
+        if len(page) < self.batch_size:
+            self.caught_up = True
+            events.append(unread_event(self.user_id, notifications.filter(is_read=False).count()))
+        return [event for event in events if self.accept(event)]
+
+    def accept(self, event):
+        if event['event'] == 'notification':
+            if event['id'] <= self.sent_id:
+                return False
+            self.sent_id = event['id']
+            if self.unread_count is not None:
+                self.unread_count += event['data']['unread_delta']  # العميل يضيف unread_delta بنفسه
+            return True
+        unread_count = event['data']['unread_count']
+        if unread_count == self.unread_count:
+            return False
+        self.unread_count = unread_count
+        return True
+
+
+def wake_poller():
+    """إيقاظ مستطلع العملية بعد كتابة فيها (إشعار جديد أو قراءة) - لا انتظار للدورة"""
+    if _poller is not None:
+        _poller.wake()
+
+
+def publish_notifications(notifications):
+    """نشر إشعارات محفوظة لمشتركيها: المستطلع يقرؤها من الجدول بترتيبها"""
+    wake_poller()
+
+
+def issue_stream_ticket(user_id):
+    """تذكرة قصيرة العمر لفتح البث مرة واحدة (EventSource لا يرسل ترويسات، والـ JWT في الرابط يظهر في السجلات)"""
+    ticket = secrets.token_urlsafe(32)
+    cache = caches[getattr(settings, 'NOTIFICATION_STREAM_TICKET_CACHE', 'shared')]
+    cache.add(f"notification-stream-ticket:{ticket}", user_id, getattr(settings, 'NOTIFICATION_STREAM_TICKET_SECONDS', 30))
+    return ticket
+
+
+def redeem_stream_ticket(ticket):
+    """المستخدم صاحب التذكرة، أو None إذا انتهت أو استُعملت - الحذف الناجح هو ما يثبت أول استعمال"""
+    cache = caches[getattr(settings, 'NOTIFICATION_STREAM_TICKET_CACHE', 'shared')]
+    key = f"notification-stream-ticket:{ticket}"
+    user_id = cache.get(key)
+    if user_id is None or not cache.delete(key):
+        return None
+    return user_id
+
+
+def format_sse(event):
+    """تحويل حدث إلى إطار text/event-stream"""
+    lines = []
+    if event.get('id') is not None:
+        lines.append(f"id: {event['id']}")
+    lines.append(f"event: {event['event']}")
+    lines.append(f"data: {json.dumps(event['data'], ensure_ascii=False, default=str)}")
+    return '\n'.join(lines) + '\n\n'
@@ -1,3 +1,266 @@
-from django.test import TestCase
+import json
+import threading
+from datetime import timedelta
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import AsyncClient, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from ships.models import Port, Ship
+from .delays import DelayDetector
+from .fanout import NotificationFanout
+from .models import Notification, ShipDelayState, SweepWatermark
+from .stream import issue_stream_ticket
+from .views import NotificationStreamView
+
+
+def parse_frame(frame):
+    """(الحدث، البيانات) من إطار text/event-stream"""
+    fields = dict(line.split(': ', 1) for line in frame.strip().splitlines() if not line.startswith(':'))
+    return fields.get('event'), json.loads(fields['data']) if 'data' in fields else None
+
+
+@override_settings(
+    NOTIFICATION_STREAM_POLL_SECONDS=0.05,
+    NOTIFICATION_STREAM_KEEPALIVE_SECONDS=60,
+    NOTIFICATION_STREAM_MAX_SECONDS=10,
+)
+class NotificationStreamTests(TransactionTestCase):
+    """مستطلع العملية يقرأ جدول الإشعارات فيصل ما تكتبه عمليات أخرى (العامل، المجدول)"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="listener", password="x")
+
+    def _in_other_thread(self, target):
+        # bulk_create/update لا يمران بالوسيط - مثل كتابة run_job_worker من عملية أخرى
+        def run():
+            try:
+                target()
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        thread.join()
+
+    def _open(self, last_event_id=None):
+        events = NotificationStreamView().events(self.user.id, last_event_id)
+        self.addCleanup(events.close)
+        self.assertTrue(next(events).startswith('retry:'))
+        return events
+
+    def test_delivers_notification_written_outside_the_stream(self):
+        events = self._open()
+        self.assertEqual(parse_frame(next(events)), ('unread', {'unread_count': 0}))
+
+        self._in_other_thread(lambda: Notification.objects.bulk_create([
+            Notification(user=self.user, title="تأخير", message="متأخرة", notification_type='delay')
+        ]))
+
+        # الاتصال لا يستطلع قاعدة البيانات بنفسه - المستطلع المشترك يسلمه الحدث
+        with self.assertNumQueries(0):
+            event, data = parse_frame(next(events))
+        self.assertEqual(event, 'notification')
+        self.assertEqual(data['notification']['title'], "تأخير")
+        self.assertEqual(data['unread_delta'], 1)
+
+    def test_unread_count_follows_reads_from_other_processes(self):
+        notification = Notification.objects.create(user=self.user, title="t", message="m", notification_type='system')
+        events = self._open()
+        self.assertEqual(parse_frame(next(events)), ('unread', {'unread_count': 1}))
+
+        self._in_other_thread(lambda: Notification.objects.filter(id=notification.id).update(is_read=True, read_at=timezone.now()))
+
+        self.assertEqual(parse_frame(next(events)), ('unread', {'unread_count': 0}))
+
+    def test_replays_only_after_last_event_id(self):
+        first, second = Notification.objects.bulk_create([
+            Notification(user=self.user, title=title, message="m", notification_type='system')
+            for title in ("first", "second")
+        ])
+        events = self._open(last_event_id=first.id)
+
+        event, data = parse_frame(next(events))
+        self.assertEqual((event, data['notification']['id']), ('notification', second.id))
+        self.assertEqual(parse_frame(next(events)), ('unread', {'unread_count': 2}))
+
+    async def test_asgi_stream_is_async(self):
+        # تحت ASGI لا يحجز البث خيطاً: المولّد async وينتظر بـ asyncio
+        ticket = await sync_to_async(issue_stream_ticket)(self.user.id)
+        response = await AsyncClient().get('/api/notifications/notifications/stream/', {'ticket': ticket})
+        self.assertTrue(response.is_async)
+        events = aiter(response.streaming_content)
+        self.assertTrue((await anext(events)).decode().startswith('retry:'))
+        self.assertEqual(parse_frame((await anext(events)).decode()), ('unread', {'unread_count': 0}))
+
+        await sync_to_async(Notification.objects.bulk_create)([
+            Notification(user=self.user, title="طقس", message="عاصفة", notification_type='weather')
+        ])
+
+        event, data = parse_frame((await anext(events)).decode())
+        self.assertEqual((event, data['notification']['title']), ('notification', "طقس"))
+        await events.aclose()
+
+    def test_ticket_opens_the_stream_once(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        ticket = client.post('/api/notifications/notifications/stream/ticket/').json()['ticket']
+
+        response = self.client.get('/api/notifications/notifications/stream/', {'ticket': ticket})
+        self.assertEqual(response.status_code, 200)
+        response.close()
+        self.assertEqual(self.client.get('/api/notifications/notifications/stream/', {'ticket': ticket}).status_code, 401)
+        # الـ JWT لا يُقبل في الرابط
+        token = str(AccessToken.for_user(self.user))
+        self.assertEqual(self.client.get('/api/notifications/notifications/stream/', {'token': token}).status_code, 401)
+
+
+class DelayDetectorTests(TestCase):
+    """كل مسح يقرأ فقط السفن التي تجاوزت موعدها في الفترة (العلامة، الآن]"""
+
+    def setUp(self):
+        self.now = timezone.now()
+        self.port = Port.objects.create(name="Nouadhibou", country="MR", city="Nouadhibou", latitude=20.9, longitude=-17.0, code="MRNDB")
+        self.user = get_user_model().objects.create_user(username="follower", password="x")
+
+    def ship(self, imo, arrival_in_hours):
+        ship = Ship.objects.create(
+            name=f"Ship {imo}", imo_number=imo, destination_port=self.port,
+            expected_arrival=self.now + timedelta(hours=arrival_in_hours),
+        )
+        ship.tracked_by.add(self.user)
+        return ship
+
+    def sweep(self, hours, **kwargs):
+        return DelayDetector().sweep(now=self.now + timedelta(hours=hours), **kwargs)
+
+    def test_sweeps_only_the_window_since_the_watermark(self):
+        late = self.ship("9000001", -5)
+        self.ship("9000002", 2)
+        self.ship("9000003", 6)
+
+        first = self.sweep(0)
+        self.assertEqual((first['scanned'], first['delayed'], first['notifications']), (1, 1, 1))
+        self.assertEqual(SweepWatermark.objects.get().position, self.now)
+
+        second = self.sweep(3)
+        self.assertEqual((second['scanned'], second['delayed'], second['notifications']), (1, 1, 1))
+        self.assertEqual(set(ShipDelayState.objects.values_list('ship__imo_number', flat=True)), {"9000001", "9000002"})
+
+        # السفينة المتأخرة منذ البداية لا تُقرأ ولا يُعاد إشعارها
+        self.assertEqual(self.sweep(4)['scanned'], 0)
+        self.assertEqual(Notification.objects.filter(related_ship=late).count(), 1)
+        self.assertEqual(Notification.objects.count(), 2)
+
+    def test_stale_or_concurrent_window_is_skipped(self):
+        self.sweep(1)
+        self.assertTrue(self.sweep(1)['skipped'])
+        self.assertTrue(self.sweep(0)['skipped'])
+        self.assertEqual(SweepWatermark.objects.get().position, self.now + timedelta(hours=1))
+
+    def test_changed_arrival_is_cleared_and_redetected(self):
+        ship = self.ship("9000001", -1)
+        self.sweep(0)
+
+        Ship.objects.filter(id=ship.id).update(expected_arrival=self.now + timedelta(hours=1))
+        result = self.sweep(2)
+        self.assertEqual((result['cleared'], result['delayed']), (1, 1))
+        self.assertEqual(ShipDelayState.objects.get().expected_arrival, self.now + timedelta(hours=1))
+        self.assertEqual(Notification.objects.count(), 2)
+
+    def test_arrival_moved_behind_watermark_is_redetected(self):
+        ship = self.ship("9000001", -1)
+        self.sweep(0)
+        # الموعد الجديد قبل العلامة: لا يقع في الفترة لكن حالته حُذفت فيُعاد فحصه في نفس المسح
+        Ship.objects.filter(id=ship.id).update(expected_arrival=self.now - timedelta(hours=3))
+
+        result = self.sweep(1)
+        self.assertEqual((result['cleared'], result['delayed']), (1, 1))
+        self.assertEqual(ShipDelayState.objects.get(ship=ship).expected_arrival, self.now - timedelta(hours=3))
+        self.assertEqual(Notification.objects.filter(related_ship=ship).count(), 2)
+
+    def test_arrival_moved_behind_watermark_without_state_needs_full_sweep(self):
+        ship = self.ship("9000001", 10)
+        self.sweep(0)
+        Ship.objects.filter(id=ship.id).update(expected_arrival=self.now - timedelta(hours=1))
+
+        self.assertEqual(self.sweep(1)['delayed'], 0)
+        self.assertEqual(self.sweep(2, full=True)['delayed'], 1)
+        self.assertTrue(ShipDelayState.objects.filter(ship=ship).exists())
+
+
+class NotificationFanoutTests(TestCase):
+    """إشعار لكل (سفينة، متابع) بعدد استعلامات ثابت، مع تخطي من وصله إشعار حديث من نفس النوع"""
+
+    def setUp(self):
+        self.users = [get_user_model().objects.create_user(username=f"u{i}", password="x") for i in range(3)]
+        self.ships = []
+        for i in range(4):
+            ship = Ship.objects.create(name=f"Ship {i}", imo_number=f"900000{i}")
+            ship.tracked_by.add(*self.users)
+            self.ships.append(ship)
+
+    def build(self, ship, user_id):
+        return {'title': f"طقس {ship.name}", 'message': "عاصفة", 'notification_type': 'weather', 'severity': 'medium'}
+
+    def test_recent_notification_of_same_type_is_skipped(self):
+        ship = self.ships[0]
+        recent, old = self.users[0], self.users[1]
+        Notification.objects.create(user=recent, related_ship=ship, title="t", message="m", notification_type='weather')
+        Notification.objects.create(user=recent, related_ship=self.ships[1], title="t", message="m", notification_type='delay')
+        stale = Notification.objects.create(user=old, related_ship=ship, title="t", message="m", notification_type='weather')
+        Notification.objects.filter(id=stale.id).update(created_at=timezone.now() - timedelta(hours=7))
+
+        created = NotificationFanout().fan_out(self.ships[:2], self.build, dedup_type='weather', dedup_hours=6)
+
+        pairs = {(n.user_id, n.related_ship_id) for n in created}
+        self.assertEqual(len(created), 5)
+        self.assertNotIn((recent.id, ship.id), pairs)
+        self.assertIn((old.id, ship.id), pairs)
+        self.assertIn((recent.id, self.ships[1].id), pairs)  # نوع آخر لا يمنع
+
+    def test_query_count_does_not_grow_with_recipients(self):
+        with self.assertNumQueries(3):  # المتابعون + الإشعارات الحديثة + bulk_create
+            created = NotificationFanout().fan_out(self.ships, self.build, dedup_type='weather', dedup_hours=6)
+        self.assertEqual(len(created), 12)
+        self.assertEqual(Notification.objects.count(), 12)
+
+
+class KeysetPaginationTests(TestCase):
+    """الصفحات المتتالية تعطي ترتيب (-created_at، -id) كاملاً بلا تكرار حتى مع تساوي الأوقات"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="reader", password="x")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        created = Notification.objects.bulk_create([
+            Notification(user=self.user, title=f"n{n}", message="m", notification_type='system') for n in range(120)
+        ])
+        # مجموعات من خمسة إشعارات بنفس الوقت، والأوقات لا تتبع ترتيب id
+        base = timezone.now()
+        for index, notification in enumerate(created):
+            notification.created_at = base - timedelta(minutes=(index * 7) % 24)
+        Notification.objects.bulk_update(created, ['created_at'])
+        Notification.objects.create(user=get_user_model().objects.create_user(username="other"), title="x", message="m")
+
+    def test_pages_follow_ordering_without_gaps(self):
+        expected = list(Notification.objects.filter(user=self.user).order_by('-created_at', '-id').values_list('id', flat=True))
+        seen = []
+        response = self.client.get('/api/notifications/notifications/', {'page_size': 7})
+        while True:
+            self.assertEqual(response.status_code, 200)
+            seen.extend(item['id'] for item in response.data['results'])
+            if not response.data['next']:
+                break
+            response = self.client.get(response.data['next'])
+        self.assertEqual(seen, expected)
+
+    def test_page_size_is_bounded(self):
+        response = self.client.get('/api/notifications/notifications/', {'page_size': 1000})
+        self.assertEqual(len(response.data['results']), 100)
+        self.assertIsNotNone(response.data['next'])
+        self.assertEqual(len(self.client.get('/api/notifications/notifications/').data['results']), 20)
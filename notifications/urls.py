@@ -6,6 +6,8 @@ urlpatterns = [
     path('notifications/', views.UserNotificationsView.as_view(), name='user-notifications'),
     path('notifications/<int:notification_id>/read/', views.MarkNotificationReadView.as_view(), name='mark-notification-read'),
     path('notifications/unread-count/', views.UnreadNotificationsCountView.as_view(), name='unread-count'),
+    path('notifications/stream/', views.NotificationStreamView.as_view(), name='notification-stream'),
+    path('notifications/stream/ticket/', views.NotificationStreamTicketView.as_view(), name='notification-stream-ticket'),
     
     # الرسائل
     path('messages/', views.MessageListCreateView.as_view(), name='messages'),
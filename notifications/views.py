@@ -2,18 +2,31 @@ from rest_framework import generics, status
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.views import APIView
 from rest_framework.response import Response
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, AuthenticationFailed
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
 from django.utils import timezone
+from django.views import View
+import asyncio
+import queue
+import time
+from portflow_ai.pagination import KeysetPagination
 from .models import Notification, Message
 from .serializers import NotificationSerializer, MessageSerializer, CreateMessageSerializer
-from .services import NotificationService
+from .stream import NotificationFeed, get_broker, wake_poller, format_sse, issue_stream_ticket, redeem_stream_ticket
 
 class UserNotificationsView(generics.ListAPIView):
     """جلب إشعارات المستخدم"""
     permission_classes = [IsAuthenticated]
     serializer_class = NotificationSerializer
+    pagination_class = KeysetPagination
     
     def get_queryset(self):
-        return Notification.objects.filter(user=self.request.user).order_by('-created_at')
+        return Notification.objects.filter(user=self.request.user).select_related('related_ship').order_by('-created_at', '-id')
 
 class MarkNotificationReadView(APIView):
     """تحديث حالة الإشعار كمقروء"""
@@ -22,8 +35,11 @@ class MarkNotificationReadView(APIView):
     def post(self, request, notification_id):
         try:
             notification = Notification.objects.get(id=notification_id, user=request.user)
-            notification.is_read = True
-            notification.save()
+            if not notification.is_read:
+                notification.is_read = True
+                notification.read_at = timezone.now()
+                notification.save(update_fields=['is_read', 'read_at'])
+                wake_poller()
             return Response({"message": "تم تحديد الإشعار كمقروء"})
         except Notification.DoesNotExist:
             return Response({"error": "الإشعار غير موجود"}, status=404)
@@ -36,9 +52,145 @@ class UnreadNotificationsCountView(APIView):
         count = Notification.objects.filter(user=request.user, is_read=False).count()
         return Response({"unread_count": count})
 
+class NotificationStreamTicketView(APIView):
+    """تذكرة لفتح بث الإشعارات: تُطلب بالـ JWT في الترويسة وتُستعمل مرة واحدة خلال ثوانٍ"""
+    permission_classes = [IsAuthenticated]
+    
+    def post(self, request):
+        return Response({
+            'ticket': issue_stream_ticket(request.user.id),
+            'expires_in': getattr(settings, 'NOTIFICATION_STREAM_TICKET_SECONDS', 30),
+        })
+
+class NotificationStreamView(View):
+    """بث الإشعارات الجديدة وتغيّر عدد غير المقروء عبر Server-Sent Events
+    
+    يُرسل أولاً ما فات منذ Last-Event-ID والعدد الحالي، وبعدها ما يوزعه مستطلع العملية
+    (stream.StreamPoller) من إشعارات أي عملية؛ الاتصال نفسه لا يستطلع قاعدة البيانات.
+    المصادقة بـ JWT في ترويسة Authorization أو ?ticket= من NotificationStreamTicketView
+    (EventSource لا يدعم الترويسات، والتذكرة تُستعمل مرة واحدة فلا يفيد ظهورها في السجلات).
+    الاتصال يُغلق بعد NOTIFICATION_STREAM_MAX_SECONDS والعميل يعيد الاتصال بتذكرة جديدة
+    مع last_event_id.
+
+    تحت ASGI (portflow_ai.asgi مع uvicorn أو daphne) البث مولّد async ينتظر على حلقة
+    الأحداث فلا يحجز خيطاً لكل عميل. تحت WSGI كل عميل يحجز خيط عامل طوال الاتصال، لذلك
+    المدة محدودة بـ NOTIFICATION_STREAM_WSGI_MAX_SECONDS ويجب تشغيل عمال بخيوط
+    (gunicorn --worker-class gthread --threads N).
+    """
+    
+    def authenticate(self, request):
+        ticket = request.GET.get('ticket')
+        if ticket:
+            user_id = redeem_stream_ticket(ticket)
+            return get_user_model().objects.filter(id=user_id).first() if user_id is not None else None
+        auth = JWTAuthentication()
+        try:
+            result = auth.authenticate(request)
+            return result[0] if result else None
+        except (InvalidToken, AuthenticationFailed):
+            return None
+    
+    def get(self, request):
+        user = self.authenticate(request)
+        if user is None or not user.is_active:
+            return JsonResponse({"error": "المصادقة مطلوبة"}, status=401)
+        
+        last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+        try:
+            last_event_id = int(last_event_id) if last_event_id else None
+        except ValueError:
+            last_event_id = None
+        
+        if isinstance(request, ASGIRequest):
+            events = self.async_events(user.id, last_event_id)
+        else:
+            max_seconds = min(
+                getattr(settings, 'NOTIFICATION_STREAM_MAX_SECONDS', 300),
+                getattr(settings, 'NOTIFICATION_STREAM_WSGI_MAX_SECONDS', 55),
+            )
+            events = self.events(user.id, last_event_id, max_seconds)
+        response = StreamingHttpResponse(events, content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+    
+    def events(self, user_id, last_event_id, max_seconds=None):
+        """البث تحت WSGI: مولّد متزامن يشغل خيط العامل حتى ينتهي"""
+        keepalive = getattr(settings, 'NOTIFICATION_STREAM_KEEPALIVE_SECONDS', 15)
+        deadline = time.monotonic() + (max_seconds or getattr(settings, 'NOTIFICATION_STREAM_MAX_SECONDS', 300))
+        feed = NotificationFeed(user_id, last_event_id)
+        # الاشتراك قبل قراءة ما فات، فلا يضيع ما يوزعه المستطلع بينهما (المكرر يسقطه feed.accept)
+        broker = get_broker()
+        subscription = broker.subscribe(user_id)
+        try:
+            yield f"retry: {keepalive * 1000}\n\n"
+            last_sent = time.monotonic()
+            while True:
+                if subscription.overflowed:
+                    # عميل بطيء سقطت أحداثه من الطابور: تُستعاد من الجدول
+                    subscription.overflowed = False
+                    feed.caught_up = False
+                while not feed.caught_up:
+                    for event in feed.backlog():
+                        yield format_sse(event)
+                        last_sent = time.monotonic()
+                now = time.monotonic()
+                if now >= deadline:
+                    break
+                if now - last_sent >= keepalive:
+                    yield ": keepalive\n\n"
+                    last_sent = now
+                try:
+                    event = subscription.get(timeout=max(0.01, min(keepalive - (now - last_sent), deadline - now)))
+                except queue.Empty:
+                    continue
+                if feed.accept(event):
+                    yield format_sse(event)
+                    last_sent = time.monotonic()
+        finally:
+            broker.unsubscribe(user_id, subscription)
+
+    async def async_events(self, user_id, last_event_id):
+        """البث تحت ASGI: الانتظار على حلقة الأحداث، وقراءة ما فات فقط في خيط"""
+        keepalive = getattr(settings, 'NOTIFICATION_STREAM_KEEPALIVE_SECONDS', 15)
+        deadline = time.monotonic() + getattr(settings, 'NOTIFICATION_STREAM_MAX_SECONDS', 300)
+        feed = NotificationFeed(user_id, last_event_id)
+        backlog = sync_to_async(feed.backlog)
+        broker = get_broker()
+        subscription = broker.subscribe(user_id, loop=asyncio.get_running_loop())
+        try:
+            yield f"retry: {keepalive * 1000}\n\n"
+            last_sent = time.monotonic()
+            while True:
+                if subscription.overflowed:
+                    subscription.overflowed = False
+                    feed.caught_up = False
+                while not feed.caught_up:
+                    for event in await backlog():
+                        yield format_sse(event)
+                        last_sent = time.monotonic()
+                now = time.monotonic()
+                if now >= deadline:
+                    break
+                if now - last_sent >= keepalive:
+                    yield ": keepalive\n\n"
+                    last_sent = now
+                try:
+                    event = await asyncio.wait_for(
+                        subscription.get(), timeout=max(0.01, min(keepalive - (now - last_sent), deadline - now))
+                    )
+                except asyncio.TimeoutError:
+                    continue
+                if feed.accept(event):
+                    yield format_sse(event)
+                    last_sent = time.monotonic()
+        finally:
+            broker.unsubscribe(user_id, subscription)
+
 class MessageListCreateView(generics.ListCreateAPIView):
     """قائمة الرسائل وإنشاء رسائل جديدة"""
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
     
     def get_serializer_class(self):
         if self.request.method == 'POST':
@@ -47,7 +199,7 @@ class MessageListCreateView(generics.ListCreateAPIView):
     
     def get_queryset(self):
         user = self.request.user
-        return Message.objects.filter(to_user=user).order_by('-created_at')
+        return Message.objects.filter(to_user=user).select_related('from_user', 'to_user').order_by('-created_at', '-id')
     
     def perform_create(self, serializer):
         serializer.save(from_user=self.request.user)
@@ -60,9 +212,11 @@ class CheckDelayedShipsView(APIView):
         if not request.user.is_staff:
             return Response({"error": "صلاحية مرفوضة"}, status=403)
         
-        service = NotificationService()
-        result = service.check_ship_delays()
-        return Response({"message": result})
+        # full=true يضيف مسحاً كاملاً لطابور المهام، وإلا يُجدول المسح التدريجي في المجدول (jobs)
+        from jobs.views import enqueued_response, scheduled_run_response
+        if str(request.data.get('full', '')).lower() in ('1', 'true'):
+            return enqueued_response('check_ship_delays', request, {'full': True})
+        return scheduled_run_response('check_ship_delays')
 
 class CheckWeatherAlertsView(APIView):
     """فحص إنذارات الطقس وإنشاء إشعارات"""
@@ -72,6 +226,6 @@ class CheckWeatherAlertsView(APIView):
         if not request.user.is_staff:
             return Response({"error": "صلاحية مرفوضة"}, status=403)
         
-        service = NotificationService()
-        result = service.check_weather_alerts()
-        return Response({"message": result})
\ No newline at end of file
+        # check_weather_alerts_for_ships يعمل في المجدول (jobs) وليس داخل طلب HTTP
+        from jobs.views import scheduled_run_response
+        return scheduled_run_response('check_weather_alerts')
\ No newline at end of file
@@ -37,6 +37,21 @@ export const NotificationProvider: React.FC<NotificationProviderProps> = ({ chil
     loadInitialData();
   }, []);
 
+  // Recevoir les nouvelles notifications en temps réel (SSE) au lieu du polling
+  useEffect(() => {
+    return notificationService.subscribeStream({
+      notification: (data) => {
+        setNotifications((current) =>
+          current.some((item) => item.id === data.notification.id) ? current : [data.notification, ...current]
+        );
+        setUnreadCount((current) => ({ ...current, notifications: current.notifications + data.unread_delta }));
+      },
+      unread: (data) => {
+        setUnreadCount((current) => ({ ...current, notifications: data.unread_count }));
+      },
+    });
+  }, []);
+
   const loadInitialData = async () => {
     setIsLoading(true);
     try {
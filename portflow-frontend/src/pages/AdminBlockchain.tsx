@@ -2,6 +2,7 @@ import React, { useState, useEffect } from 'react';
 import { Shield, Activity, TrendingUp, CheckCircle, XCircle, Clock } from 'lucide-react';
 import AdminHubLayout from '@/components/AdminHub/Layout';
 import { apiService } from '@/services/api';
+import { CursorPage } from '@/types';
 
 interface Prediction {
   id: number;
@@ -43,7 +44,9 @@ const AdminBlockchain: React.FC = () => {
       setLoading(true);
       
       // Load predictions
-      const preds = await apiService.get<Prediction[]>('/blockchain/predictions/?limit=50').catch(() => []);
+      const preds = await apiService.get<CursorPage<Prediction>>('/blockchain/predictions/?limit=50')
+        .then((page) => page.results)
+        .catch(() => []);
       setPredictions(preds || []);
 
       // Load transactions info
@@ -2,6 +2,7 @@ import React, { useState, useEffect } from 'react';
 import { Search, Users, Shield, Mail, Phone, Building, Trophy, Filter } from 'lucide-react';
 import AdminHubLayout from '@/components/AdminHub/Layout';
 import { apiService } from '@/services/api';
+import { CursorPage } from '@/types';
 
 interface User {
   id: number;
@@ -28,7 +29,9 @@ const AdminUsers: React.FC = () => {
     try {
       setLoading(true);
       // Admin endpoint to list all users
-      const data = await apiService.get<User[]>('/users/admin/list/').catch(() => null);
+      const data = await apiService.get<CursorPage<User>>('/users/admin/list/?page_size=100')
+        .then((page) => page.results)
+        .catch(() => null);
       
       if (data) {
         setUsers(data);
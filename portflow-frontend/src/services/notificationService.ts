@@ -1,4 +1,5 @@
-import { apiService } from './api';
+import { apiService, API_BASE_URL } from './api';
+import { CursorPage } from '../types';
 
 // Interfaces pour les notifications
 export interface Notification {
@@ -56,8 +57,8 @@ export interface UnreadCount {
 class NotificationService {
   // Obtenir les notifications de l'utilisateur
   async getNotifications(): Promise<Notification[]> {
-    const response = await apiService.get<Notification[]>('/notifications/notifications/');
-    return response;
+    const response = await apiService.get<CursorPage<Notification>>('/notifications/notifications/');
+    return response.results;
   }
 
   // Marquer une notification comme lue
@@ -66,6 +67,57 @@ class NotificationService {
     return response;
   }
 
+  // Flux SSE des nouvelles notifications (remplace le polling)
+  // Chaque connexion utilise un ticket à usage unique: le JWT n'apparaît jamais dans l'URL
+  subscribeStream(listeners: Record<string, (data: any) => void>): () => void {
+    let source: EventSource | null = null;
+    let closed = false;
+    let lastEventId: string | null = null;
+
+    const open = async () => {
+      if (closed || !localStorage.getItem('access_token') || typeof EventSource === 'undefined') {
+        return;
+      }
+      try {
+        const { ticket } = await apiService.post<{ ticket: string }>('/notifications/notifications/stream/ticket/');
+        if (closed) {
+          return;
+        }
+        const params = new URLSearchParams({ ticket });
+        if (lastEventId) {
+          params.set('last_event_id', lastEventId);
+        }
+        source = new EventSource(`${API_BASE_URL}/notifications/notifications/stream/?${params}`);
+      } catch (error) {
+        setTimeout(open, 5000);
+        return;
+      }
+
+      Object.entries(listeners).forEach(([name, listener]) => {
+        source?.addEventListener(name, (event) => {
+          const message = event as MessageEvent;
+          if (message.lastEventId) {
+            lastEventId = message.lastEventId;
+          }
+          listener(JSON.parse(message.data));
+        });
+      });
+
+      // La reconnexion automatique réutiliserait le ticket déjà consommé: on en demande un nouveau
+      source.onerror = () => {
+        source?.close();
+        source = null;
+        setTimeout(open, 3000);
+      };
+    };
+
+    open();
+    return () => {
+      closed = true;
+      source?.close();
+    };
+  }
+
   // Obtenir le nombre de notifications non lues
   async getUnreadCount(): Promise<UnreadCount> {
     const response = await apiService.get<UnreadCount>('/notifications/notifications/unread-count/');
@@ -74,8 +126,8 @@ class NotificationService {
 
   // Obtenir les messages
   async getMessages(): Promise<Message[]> {
-    const response = await apiService.get<Message[]>('/notifications/messages/');
-    return response;
+    const response = await apiService.get<CursorPage<Message>>('/notifications/messages/');
+    return response.results;
   }
 
   // Envoyer un message
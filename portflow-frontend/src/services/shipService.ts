@@ -24,6 +24,7 @@ export interface Ship {
   destination_port?: Port;
   destination_name?: string;
   expected_arrival?: string;
+  predicted_arrival?: string;
   tracked_by: number[];
   last_updated: string;
   created_at: string;
@@ -57,3 +57,10 @@ export interface WeatherData {
   wave_height: number;
   visibility: number;
 }
+
+// Réponse paginée par curseur (keyset) du backend
+export interface CursorPage<T> {
+  next: string | null;
+  previous: string | null;
+  results: T[];
+}
@@ -0,0 +1,251 @@
+"""
+Read-through cache with TTL, LRU eviction, single-flight and
+stale-while-revalidate.
+
+Values are stored with their fetch time. Fresh entries (age < ttl) are served
+directly; stale entries (age < ttl + stale_ttl) are served immediately while a
+background thread refreshes them; anything older is a miss. Concurrent misses
+for the same key share one upstream fetch. A fetch that returns None (upstream
+failure) is handed to the caller but never stored.
+
+With the django backend the entries and the hit/miss counters live in a shared
+cache alias, so every process (web, job worker, scheduler) sees the same data
+and the same statistics.
+"""
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+from django.core.cache import caches
+
+
+class LocalBackend:
+    """In-process LRU store bounded by max_entries"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                self._data.move_to_end(key)
+            return entry
+
+    def set(self, key, entry, timeout):
+        with self._lock:
+            self._data[key] = entry
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def __len__(self):
+        return len(self._data)
+
+    def size(self):
+        return len(self)
+
+
+class DjangoCacheBackend:
+    """Store entries in a Django cache alias (shared across workers)"""
+
+    def __init__(self, alias, prefix):
+        self.cache = caches[alias]
+        self.prefix = prefix
+        self.evictions = 0
+
+    def get(self, key):
+        return self.cache.get(f"{self.prefix}:{key}")
+
+    def set(self, key, entry, timeout):
+        self.cache.set(f"{self.prefix}:{key}", entry, timeout)
+
+    def delete(self, key):
+        self.cache.delete(f"{self.prefix}:{key}")
+
+    def size(self):
+        return None  # not tracked by Django cache backends
+
+
+class LocalCounters:
+    """Statistics counters of one process"""
+
+    def __init__(self):
+        self._values = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def incr(self, name, delta=1):
+        with self._lock:
+            self._values[name] += delta
+
+    def values(self, names):
+        with self._lock:
+            return {name: self._values.get(name, 0) for name in names}
+
+
+class SharedCounters:
+    """Statistics counters summed across processes in a Django cache alias
+
+    Increments are buffered per process and added to the cache with incr() at
+    most every flush_seconds, so counting a lookup does not cost a cache write.
+    """
+
+    def __init__(self, alias, prefix, flush_seconds=5.0):
+        self.cache = caches[alias]
+        self.prefix = prefix
+        self.flush_seconds = flush_seconds
+        self._pending = defaultdict(int)
+        self._flushed_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _key(self, name):
+        return f"{self.prefix}:stats:{name}"
+
+    def incr(self, name, delta=1):
+        with self._lock:
+            self._pending[name] += delta
+            due = time.monotonic() - self._flushed_at >= self.flush_seconds
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(int)
+            self._flushed_at = time.monotonic()
+        for name, delta in pending.items():
+            key = self._key(name)
+            try:
+                self.cache.incr(key, delta)
+            except ValueError:
+                # first increment anywhere - another process may create the key at the same time
+                if not self.cache.add(key, delta, timeout=None):
+                    self.cache.incr(key, delta)
+
+    def values(self, names):
+        self.flush()
+        stored = self.cache.get_many([self._key(name) for name in names])
+        return {name: stored.get(self._key(name), 0) for name in names}
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class ReadThroughCache:
+    """TTL cache in front of an expensive fetch function"""
+
+    COUNTERS = ('hits', 'stale_hits', 'misses', 'coalesced', 'refreshes', 'errors', 'uncached')
+
+    def __init__(self, name, ttl, stale_ttl=0, max_entries=None, backend='local', cache_alias='default',
+                 stats_flush_seconds=5.0):
+        self.name = name
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        if backend == 'django':
+            if max_entries is not None:
+                # the Django cache evicts by itself and cannot enforce a per-name bound
+                raise ValueError(
+                    f"max_entries only applies to the local backend; bound the '{cache_alias}' cache "
+                    f"with OPTIONS['MAX_ENTRIES'] instead"
+                )
+            self.backend = DjangoCacheBackend(cache_alias, prefix=name)
+            self.counters = SharedCounters(cache_alias, prefix=name, flush_seconds=stats_flush_seconds)
+        else:
+            self.backend = LocalBackend(max_entries or 1000)
+            self.counters = LocalCounters()
+
+        self._lock = threading.Lock()
+        self._inflight = {}
+
+    def _count(self, counter):
+        self.counters.incr(counter)
+
+    def get_or_fetch(self, key, fetch):
+        """Return the cached value for key, calling fetch() on a miss"""
+        entry = self.backend.get(key)
+        if entry is not None:
+            value, stored_at = entry
+            age = time.time() - stored_at
+            if age < self.ttl:
+                self._count('hits')
+                return value
+            if age < self.ttl + self.stale_ttl:
+                self._count('stale_hits')
+                self._refresh_in_background(key, fetch)
+                return value
+
+        self._count('misses')
+        return self._fetch_once(key, fetch)
+
+    def set(self, key, value):
+        """Write-through from callers that already hold a fresh value"""
+        self.backend.set(key, (value, time.time()), self.ttl + self.stale_ttl)
+
+    def invalidate(self, key):
+        self.backend.delete(key)
+
+    def _fetch_once(self, key, fetch):
+        with self._lock:
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self._inflight[key] = _Call()
+        if not leader:
+            self._count('coalesced')
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            call.value = fetch()
+            if call.value is None:
+                self._count('uncached')  # upstream failure - the next lookup tries again
+            else:
+                self.set(key, call.value)
+            return call.value
+        except Exception as e:
+            call.error = e
+            self._count('errors')
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            call.event.set()
+
+    def _refresh_in_background(self, key, fetch):
+        with self._lock:
+            if key in self._inflight:
+                return
+        self._count('refreshes')
+
+        def refresh():
+            try:
+                self._fetch_once(key, fetch)
+            except Exception:
+                pass  # the stale value stays until it expires
+
+        threading.Thread(target=refresh, daemon=True).start()
+
+    def stats(self):
+        counters = self.counters.values(self.COUNTERS)
+        lookups = counters['hits'] + counters['stale_hits'] + counters['misses']
+        counters.update({
+            'hit_rate': round((counters['hits'] + counters['stale_hits']) / lookups, 4) if lookups else None,
+            'size': self.backend.size(),
+            'evictions': self.backend.evictions,
+            'ttl': self.ttl,
+            'stale_ttl': self.stale_ttl,
+        })
+        return counters
@@ -0,0 +1,177 @@
+"""
+Shared outbound HTTP transport for provider calls.
+
+One ``requests.Session`` per host keeps TCP/TLS connections alive between
+calls (MarineTraffic, OpenWeatherMap, Hedera sidecar). Pool sizes, timeouts
+and retry policy come from ``settings.HTTP_TRANSPORT`` with optional
+per-host overrides under ``HOSTS``.
+"""
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+
+DEFAULTS = {
+    'TIMEOUT': 10,
+    'POOL_CONNECTIONS': 4,
+    'POOL_MAXSIZE': 16,
+    'POOL_BLOCK': True,
+    'MAX_RETRIES': 2,
+    'BACKOFF_BASE': 0.2,
+    'BACKOFF_MAX': 5.0,
+    'RETRY_STATUSES': (429, 500, 502, 503, 504),
+}
+
+IDEMPOTENT_METHODS = frozenset({'GET', 'HEAD', 'OPTIONS'})
+
+
+class _HostPool:
+    """Session + counters for a single upstream host"""
+
+    def __init__(self, host, config):
+        self.host = host
+        self.config = config
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=config['POOL_CONNECTIONS'],
+            pool_maxsize=config['POOL_MAXSIZE'],
+            pool_block=config['POOL_BLOCK'],
+        )
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.saturated = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def enter(self):
+        with self.lock:
+            if self.in_flight >= self.config['POOL_MAXSIZE']:
+                self.saturated += 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def leave(self, elapsed_ms, failed):
+        with self.lock:
+            self.in_flight -= 1
+            self.requests += 1
+            self.total_ms += elapsed_ms
+            self.max_ms = max(self.max_ms, elapsed_ms)
+            if failed:
+                self.errors += 1
+
+    def stats(self):
+        with self.lock:
+            return {
+                'requests': self.requests,
+                'errors': self.errors,
+                'retries': self.retries,
+                'avg_ms': round(self.total_ms / self.requests, 2) if self.requests else None,
+                'max_ms': round(self.max_ms, 2),
+                'in_flight': self.in_flight,
+                'peak_in_flight': self.peak_in_flight,
+                'pool_maxsize': self.config['POOL_MAXSIZE'],
+                'saturated': self.saturated,
+            }
+
+
+class HttpTransport:
+    """Pooled keep-alive transport with jittered retries and per-host metrics"""
+
+    def __init__(self, config=None):
+        config = config if config is not None else getattr(settings, 'HTTP_TRANSPORT', {})
+        self.defaults = {**DEFAULTS, **{k: v for k, v in config.items() if k != 'HOSTS'}}
+        self.host_overrides = config.get('HOSTS', {})
+        self._pools = {}
+        self._lock = threading.Lock()
+
+    def _pool_for(self, url):
+        host = urlsplit(url).netloc
+        pool = self._pools.get(host)
+        if pool is None:
+            with self._lock:
+                pool = self._pools.get(host)
+                if pool is None:
+                    config = {**self.defaults, **self.host_overrides.get(host, {})}
+                    pool = self._pools[host] = _HostPool(host, config)
+        return pool
+
+    def _backoff(self, pool, attempt, response=None):
+        delay = min(pool.config['BACKOFF_MAX'], pool.config['BACKOFF_BASE'] * (2 ** attempt))
+        delay = random.uniform(0, delay)  # full jitter
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, min(float(retry_after), pool.config['BACKOFF_MAX']))
+        time.sleep(delay)
+
+    def request(self, method, url, timeout=None, retries=None, **kwargs):
+        """Send a request through the host pool, retrying transient failures.
+
+        Non-idempotent methods are only retried when the connection could not
+        be opened, so a POST is never sent twice.
+        """
+        method = method.upper()
+        pool = self._pool_for(url)
+        timeout = timeout if timeout is not None else pool.config['TIMEOUT']
+        retries = retries if retries is not None else pool.config['MAX_RETRIES']
+        idempotent = method in IDEMPOTENT_METHODS
+
+        attempt = 0
+        while True:
+            pool.enter()
+            started = time.monotonic()
+            response = None
+            try:
+                response = pool.session.request(method, url, timeout=timeout, **kwargs)
+            except requests.RequestException as e:
+                pool.leave((time.monotonic() - started) * 1000, failed=True)
+                retryable = isinstance(e, requests.ConnectTimeout) or (
+                    idempotent and isinstance(e, (requests.ConnectionError, requests.Timeout))
+                )
+                if not retryable or attempt >= retries:
+                    raise
+            else:
+                failed = response.status_code >= 500
+                pool.leave((time.monotonic() - started) * 1000, failed=failed)
+                if not (idempotent and response.status_code in pool.config['RETRY_STATUSES']) or attempt >= retries:
+                    return response
+
+            with pool.lock:
+                pool.retries += 1
+            self._backoff(pool, attempt, response)
+            attempt += 1
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def stats(self):
+        """Per-host latency, retry and pool-saturation counters"""
+        with self._lock:
+            pools = list(self._pools.values())
+        return {pool.host: pool.stats() for pool in pools}
+
+
+_transport = None
+_transport_lock = threading.Lock()
+
+
+def get_transport():
+    """Process-wide shared transport"""
+    global _transport
+    with _transport_lock:
+        if _transport is None:
+            _transport = HttpTransport()
+        return _transport
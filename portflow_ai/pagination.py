@@ -0,0 +1,40 @@
+"""
+Keyset (cursor) pagination shared by the list endpoints.
+
+Every page is fetched with ``WHERE <ordering field> < <cursor position>
+ORDER BY <ordering> LIMIT page_size`` against a composite index on the same
+columns, so page 1000 costs the same as page 1. Cursors are opaque
+(base64-encoded by DRF) and page sizes are bounded by ``max_page_size``.
+
+The trailing ``-id`` in each ordering is the tie-breaker for rows sharing a
+timestamp; DRF resolves those ties with a small offset inside the cursor.
+"""
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+
+class KeysetPagination(CursorPagination):
+    """Newest first on ``created_at`` then ``id``."""
+
+    ordering = ('-created_at', '-id')
+    page_size = getattr(settings, 'KEYSET_PAGE_SIZE', 20)
+    page_size_query_param = 'page_size'
+    max_page_size = getattr(settings, 'KEYSET_MAX_PAGE_SIZE', 100)
+
+
+class TimestampKeysetPagination(KeysetPagination):
+    """Newest first on ``timestamp`` then ``id``."""
+
+    ordering = ('-timestamp', '-id')
+
+
+class DateJoinedKeysetPagination(KeysetPagination):
+    """Most recently joined users first."""
+
+    ordering = ('-date_joined', '-id')
+
+
+class LimitKeysetPagination(KeysetPagination):
+    """Same as KeysetPagination but keeps the historical ``?limit=`` page size parameter."""
+
+    page_size_query_param = 'limit'
@@ -56,6 +56,7 @@ INSTALLED_APPS = [
     'weather',
     'notifications',
     'blockchain',
+    'jobs',
     'myapp',
   
 
@@ -132,6 +133,19 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Take the write lock at BEGIN and wait for it instead of failing with
+        # "database is locked" when concurrent requests update the same rows.
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': int(os.getenv('SQLITE_TIMEOUT_SECONDS', '20')),
+        },
+        # File-backed test database: the threaded tests (blockchain, notifications, jobs) need
+        # real SQLite file locking with the busy timeout above. The in-memory default uses a
+        # shared cache whose table locks fail at once with "database table is locked" instead
+        # of waiting. Django deletes the file after the run; it is listed in .gitignore.
+        'TEST': {
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
     }
 }
 
@@ -207,4 +221,187 @@ if MARINETRAFFIC_API_KEY == 'demo_key':
 # MyShipTracking
 MYSHIPTRACKING_BASE_URL = os.getenv('MYSHIPTRACKING_BASE_URL', 'https://api.myshiptracking.com')
 MYSHIPTRACKING_API_KEY = os.getenv('MYSHIPTRACKING_API_KEY')
-MYSHIPTRACKING_SECRET_KEY = os.getenv('MYSHIPTRACKING_SECRET_KEY')
\ No newline at end of file
+MYSHIPTRACKING_SECRET_KEY = os.getenv('MYSHIPTRACKING_SECRET_KEY')
+
+# Fleet position refresh
+MARINETRAFFIC_RATE_LIMIT = float(os.getenv('MARINETRAFFIC_RATE_LIMIT', '10'))  # requests/second, 0 = unlimited
+MARINETRAFFIC_RATE_BURST = int(os.getenv('MARINETRAFFIC_RATE_BURST', '10'))
+FLEET_REFRESH_WORKERS = int(os.getenv('FLEET_REFRESH_WORKERS', '8'))
+FLEET_REFRESH_CHUNK_SIZE = int(os.getenv('FLEET_REFRESH_CHUNK_SIZE', '500'))
+
+# Shared outbound HTTP transport (portflow_ai/http_client.py)
+HTTP_TRANSPORT = {
+    'TIMEOUT': float(os.getenv('HTTP_TIMEOUT', '10')),
+    'POOL_CONNECTIONS': int(os.getenv('HTTP_POOL_CONNECTIONS', '4')),
+    'POOL_MAXSIZE': int(os.getenv('HTTP_POOL_MAXSIZE', '16')),
+    'MAX_RETRIES': int(os.getenv('HTTP_MAX_RETRIES', '2')),
+    'BACKOFF_BASE': float(os.getenv('HTTP_BACKOFF_BASE', '0.2')),
+    'BACKOFF_MAX': float(os.getenv('HTTP_BACKOFF_MAX', '5')),
+    # Per-host overrides, e.g. {'127.0.0.1:8787': {'POOL_MAXSIZE': 4, 'MAX_RETRIES': 0}}
+    'HOSTS': {},
+}
+
+# Ship position cache keyed by IMO (ships.services.get_position_cache)
+SHIP_POSITION_CACHE = {
+    'BACKEND': os.getenv('SHIP_POSITION_CACHE_BACKEND', 'local'),  # 'local' or 'django'
+    'CACHE_ALIAS': 'default',
+    'TTL': int(os.getenv('SHIP_POSITION_CACHE_TTL', '60')),  # seconds served as fresh
+    'STALE_TTL': int(os.getenv('SHIP_POSITION_CACHE_STALE_TTL', '240')),  # served stale while refreshing
+    'MAX_ENTRIES': int(os.getenv('SHIP_POSITION_CACHE_MAX_ENTRIES', '10000')),  # local backend only (see CACHES OPTIONS)
+}
+
+# Weather refresh
+WEATHER_REFRESH_WORKERS = int(os.getenv('WEATHER_REFRESH_WORKERS', '8'))
+
+# Radius (great-circle km) around an alerted port in which tracked ships are notified
+WEATHER_ALERT_RADIUS_KM = float(os.getenv('WEATHER_ALERT_RADIUS_KM', '333'))
+
+# Notification fan-out
+NOTIFICATION_BULK_CHUNK_SIZE = int(os.getenv('NOTIFICATION_BULK_CHUNK_SIZE', '1000'))
+
+# Notification push stream (notifications/stream.py)
+NOTIFICATION_BROKER = os.getenv('NOTIFICATION_BROKER', 'notifications.stream.LocalBroker')
+NOTIFICATION_STREAM_KEEPALIVE_SECONDS = int(os.getenv('NOTIFICATION_STREAM_KEEPALIVE_SECONDS', '15'))
+NOTIFICATION_STREAM_MAX_SECONDS = int(os.getenv('NOTIFICATION_STREAM_MAX_SECONDS', '300'))
+NOTIFICATION_STREAM_POLL_SECONDS = float(os.getenv('NOTIFICATION_STREAM_POLL_SECONDS', '2'))  # one poller per process picks up other processes' writes
+# EventSource cannot send headers: clients trade their JWT for a single-use ticket kept in this cache alias
+NOTIFICATION_STREAM_TICKET_CACHE = os.getenv('NOTIFICATION_STREAM_TICKET_CACHE', 'shared')
+NOTIFICATION_STREAM_TICKET_SECONDS = int(os.getenv('NOTIFICATION_STREAM_TICKET_SECONDS', '30'))
+# Serve the stream from ASGI (`uvicorn portflow_ai.asgi:application`): it is then an async generator and holds no
+# thread. Under WSGI every open stream occupies a worker thread, so connections are cut after this many seconds
+# (the browser reconnects with Last-Event-ID) and workers must be threaded (`gunicorn --worker-class gthread`).
+NOTIFICATION_STREAM_WSGI_MAX_SECONDS = int(os.getenv('NOTIFICATION_STREAM_WSGI_MAX_SECONDS', '55'))
+
+# Ship position history (ships/history.py)
+HISTORY_ROLLUP_BUCKET_MINUTES = int(os.getenv('HISTORY_ROLLUP_BUCKET_MINUTES', '15'))  # one rolled-up point per bucket
+HISTORY_RAW_MAX_HOURS = int(os.getenv('HISTORY_RAW_MAX_HOURS', '48'))  # longer windows are served from daily rollups
+HISTORY_MAX_POINTS = int(os.getenv('HISTORY_MAX_POINTS', '5000'))
+HISTORY_MAX_DAYS = int(os.getenv('HISTORY_MAX_DAYS', '366'))  # upper bound for ?days= on the history endpoint
+
+# Zone / radius vessel queries (ships.models.ShipQuerySet.in_bbox / near)
+ZONE_QUERY_MAX_RESULTS = int(os.getenv('ZONE_QUERY_MAX_RESULTS', '1000'))
+
+# Hedera HCS outbox (blockchain/outbox.py, `manage.py run_hcs_publisher`)
+# 'blockchain.hedera_client.stub_send_message' replaces the sidecar in tests/local runs
+HCS_PUBLISHER = os.getenv('HCS_PUBLISHER', 'blockchain.hedera_client.send_message')
+HCS_OUTBOX = {
+    'CONCURRENCY': int(os.getenv('HCS_OUTBOX_CONCURRENCY', '4')),
+    'BATCH_SIZE': int(os.getenv('HCS_OUTBOX_BATCH_SIZE', '100')),
+    'MAX_ATTEMPTS': int(os.getenv('HCS_OUTBOX_MAX_ATTEMPTS', '8')),
+    'BACKOFF_BASE': float(os.getenv('HCS_OUTBOX_BACKOFF_BASE', '2')),
+    'BACKOFF_MAX': float(os.getenv('HCS_OUTBOX_BACKOFF_MAX', '300')),
+    'LEASE_SECONDS': int(os.getenv('HCS_OUTBOX_LEASE_SECONDS', '120')),
+    'POLL_INTERVAL': float(os.getenv('HCS_OUTBOX_POLL_INTERVAL', '2')),
+}
+
+# Merkle batch anchoring (blockchain/anchoring.py). MODE 'single' publishes one HCS message per record,
+# 'batch' publishes one Merkle root per window and stores an inclusion proof on every record.
+HCS_ANCHOR = {
+    'MODE': os.getenv('HCS_ANCHOR_MODE', 'single'),
+    'WINDOW_SECONDS': int(os.getenv('HCS_ANCHOR_WINDOW_SECONDS', '60')),
+    'MAX_LEAVES': int(os.getenv('HCS_ANCHOR_MAX_LEAVES', '1024')),
+}
+
+# Leaderboard (blockchain.leaderboard) - in-process ordered boards rebuilt from the DB periodically
+LEADERBOARD_BACKEND = os.getenv('LEADERBOARD_BACKEND', 'blockchain.leaderboard.LocalLeaderboard')
+LEADERBOARD_REFRESH_SECONDS = int(os.getenv('LEADERBOARD_REFRESH_SECONDS', '300'))
+LEADERBOARD_MAX_BOARDS = int(os.getenv('LEADERBOARD_MAX_BOARDS', '8'))
+
+# Vessel risk engine (ships/risk.py) - fleet rescored after every weather refresh
+RISK_WEATHER_RADIUS_KM = float(os.getenv('RISK_WEATHER_RADIUS_KM', '300'))
+RISK_ALERT_RADIUS_KM = float(os.getenv('RISK_ALERT_RADIUS_KM', '500'))
+RISK_CHUNK_SIZE = int(os.getenv('RISK_CHUNK_SIZE', '4096'))
+
+# Batch prediction endpoint (POST /api/blockchain/predict/batch/)
+PREDICTION_BATCH_MAX_SIZE = int(os.getenv('PREDICTION_BATCH_MAX_SIZE', '1000'))
+
+# Route / coordinate weather (weather/routing.py): great-circle waypoints snapped to weather cells
+ROUTE_WEATHER_SAMPLE_KM = float(os.getenv('ROUTE_WEATHER_SAMPLE_KM', '100'))
+ROUTE_DEFAULT_SPEED_KNOTS = float(os.getenv('ROUTE_DEFAULT_SPEED_KNOTS', '14'))
+ROUTE_WEATHER_ALERT_DEDUP_HOURS = int(os.getenv('ROUTE_WEATHER_ALERT_DEDUP_HOURS', '6'))
+# Weather cell cache shared by port, ship and route lookups (weather/cache.py),
+# keyed by lat/lon cell + observation time bucket. Stats: GET /api/weather/cache-stats/
+# Those lookups run in different processes (run_job_worker, run_scheduler, web), so cells and counters
+# live in the 'shared' cache alias below; 'local' keeps a per-process cache with per-process stats.
+WEATHER_CELL_CACHE = {
+    'CELL_DEG': float(os.getenv('WEATHER_CELL_DEG', '0.5')),  # larger cells = fewer provider calls, coarser weather
+    'BUCKET_MINUTES': int(os.getenv('WEATHER_CELL_BUCKET_MINUTES', '10')),
+    'BACKEND': os.getenv('WEATHER_CELL_CACHE_BACKEND', 'django'),  # 'django' (shared) or 'local'
+    'CACHE_ALIAS': 'shared',
+    'STATS_FLUSH_SECONDS': float(os.getenv('WEATHER_CELL_CACHE_STATS_FLUSH_SECONDS', '5')),  # counters batched per process
+    'TTL': int(os.getenv('WEATHER_CELL_CACHE_TTL', '600')),
+    'STALE_TTL': int(os.getenv('WEATHER_CELL_CACHE_STALE_TTL', '1200')),
+    'MAX_ENTRIES': int(os.getenv('WEATHER_CELL_CACHE_MAX_ENTRIES', '20000')),  # local backend only (see CACHES OPTIONS)
+}
+
+# ETA engine (ships/eta.py) - predicted_arrival recomputed after every position and weather refresh
+# (expected_arrival stays the planned arrival that delay detection compares against)
+ETA_SPEED_HISTORY_HOURS = int(os.getenv('ETA_SPEED_HISTORY_HOURS', '6'))  # window of ShipPosition speeds blended in
+ETA_SPEED_HISTORY_WEIGHT = float(os.getenv('ETA_SPEED_HISTORY_WEIGHT', '0.5'))  # 0 = current speed only
+ETA_MIN_SPEED_KNOTS = float(os.getenv('ETA_MIN_SPEED_KNOTS', '3'))  # slower ships keep their previous ETA
+ETA_WEATHER_MAX_SLOWDOWN = float(os.getenv('ETA_WEATHER_MAX_SLOWDOWN', '0.3'))
+ETA_WRITE_MIN_MINUTES = int(os.getenv('ETA_WRITE_MIN_MINUTES', '5'))
+ETA_CHANGE_NOTIFY_MINUTES = int(os.getenv('ETA_CHANGE_NOTIFY_MINUTES', '60'))
+
+# Periodic job scheduler (jobs/scheduler.py). Run `manage.py run_scheduler`, or set AUTOSTART to run it
+# inside every web process - a DB leader lock per job makes sure each run happens in one process only.
+SCHEDULER = {
+    'AUTOSTART': os.getenv('SCHEDULER_AUTOSTART', 'false').lower() == 'true',
+    'POLL_INTERVAL': float(os.getenv('SCHEDULER_POLL_INTERVAL', '5')),
+    'MAX_WORKERS': int(os.getenv('SCHEDULER_MAX_WORKERS', '4')),
+}
+# 'interval' (seconds) or 'cron' (5 fields, TIME_ZONE); 'jitter' seconds of random delay;
+# 'timeout' seconds a run holds the job lock if its process dies
+SCHEDULED_JOBS = {
+    'refresh_fleet_positions': {'task': 'jobs.tasks.refresh_fleet_positions', 'interval': 300, 'jitter': 30, 'timeout': 900},
+    'refresh_weather': {'task': 'jobs.tasks.refresh_weather', 'cron': '*/15 * * * *', 'jitter': 60, 'timeout': 900},
+    'check_ship_delays': {'task': 'jobs.tasks.check_ship_delays', 'interval': 60, 'jitter': 5, 'timeout': 300},
+    'check_weather_alerts': {'task': 'jobs.tasks.check_weather_alerts', 'interval': 300, 'jitter': 15, 'timeout': 300},
+    'check_route_weather': {'task': 'jobs.tasks.check_route_weather', 'interval': 1800, 'jitter': 60, 'timeout': 900},
+}
+
+# Background job queue (jobs/queue.py, `manage.py run_job_worker`) - long operations are enqueued by the
+# API and run by DB-backed workers; no external broker. Status: GET /api/jobs/<id>/
+JOB_QUEUE = {
+    'CONCURRENCY': int(os.getenv('JOB_QUEUE_CONCURRENCY', '4')),  # jobs run in parallel per worker process
+    'POLL_INTERVAL': float(os.getenv('JOB_QUEUE_POLL_INTERVAL', '1')),
+    'LEASE_SECONDS': int(os.getenv('JOB_QUEUE_LEASE_SECONDS', '120')),  # a job whose worker stops is retried after this
+    'BACKOFF_BASE': float(os.getenv('JOB_QUEUE_BACKOFF_BASE', '5')),
+    'BACKOFF_MAX': float(os.getenv('JOB_QUEUE_BACKOFF_MAX', '600')),
+    'PROGRESS_INTERVAL': float(os.getenv('JOB_QUEUE_PROGRESS_INTERVAL', '1')),  # min seconds between progress writes
+}
+# 'concurrency' = max running jobs of that type across all workers
+# 'params' whitelists the keyword arguments a job accepts: {name: {'type': 'int'|'float'|'bool', 'min', 'max'}}
+BACKGROUND_JOB_TYPES = {
+    'refresh_fleet_positions': {'task': 'jobs.tasks.refresh_fleet_positions', 'concurrency': 1, 'max_attempts': 3},
+    'refresh_weather': {'task': 'jobs.tasks.refresh_weather', 'concurrency': 1, 'max_attempts': 3},
+    'check_ship_delays': {
+        'task': 'jobs.tasks.check_ship_delays', 'concurrency': 1, 'max_attempts': 3,
+        'params': {'full': {'type': 'bool'}},
+    },
+    'generate_test_data': {
+        'task': 'jobs.tasks.generate_test_data', 'concurrency': 1, 'max_attempts': 1,
+        'params': {
+            'ports': {'type': 'int', 'min': 0, 'max': 100},
+            'ships': {'type': 'int', 'min': 0, 'max': 1000},
+            'users': {'type': 'int', 'min': 0, 'max': 200},
+            'messages': {'type': 'int', 'min': 0, 'max': 1000},
+        },
+    },
+}
+
+# Caches. 'default' is per process; 'shared' is seen by every process (web, run_job_worker, run_scheduler):
+# Redis when REDIS_URL is set, otherwise the database cache table (created by weather migration 0004).
+SHARED_CACHE_MAX_ENTRIES = int(os.getenv('SHARED_CACHE_MAX_ENTRIES', '50000'))
+CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'shared': (
+        {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': os.getenv('REDIS_URL')}
+        if os.getenv('REDIS_URL') else
+        {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'portflow_shared_cache',
+            'OPTIONS': {'MAX_ENTRIES': SHARED_CACHE_MAX_ENTRIES},
+        }
+    ),
+}
@@ -0,0 +1,100 @@
+import threading
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from .caching import ReadThroughCache
+
+
+class ReadThroughCacheTests(SimpleTestCase):
+    """Single-flight, stale-while-revalidate and LRU eviction of the local backend"""
+
+    def setUp(self):
+        self.calls = 0
+
+    def fetch(self, value='fresh'):
+        def fetch():
+            self.calls += 1
+            return value
+        return fetch
+
+    def at(self, now):
+        return mock.patch('portflow_ai.caching.time.time', return_value=now)
+
+    def test_concurrent_misses_share_one_fetch(self):
+        cache = ReadThroughCache('test', ttl=60)
+        release = threading.Event()
+
+        def slow_fetch():
+            release.wait(5)
+            return self.fetch()()
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get_or_fetch('k', slow_fetch))) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        while cache.stats()['coalesced'] < 7:
+            threading.Event().wait(0.01)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(results, ['fresh'] * 8)
+        self.assertEqual(cache.stats()['misses'], 8)
+
+    def test_fetch_error_reaches_every_waiter_and_is_not_cached(self):
+        cache = ReadThroughCache('test', ttl=60)
+
+        def failing():
+            raise RuntimeError("upstream down")
+
+        with self.assertRaises(RuntimeError):
+            cache.get_or_fetch('k', failing)
+        self.assertEqual(cache.get_or_fetch('k', self.fetch()), 'fresh')
+        self.assertEqual(cache.stats()['errors'], 1)
+
+    def test_stale_value_is_served_while_refreshing(self):
+        cache = ReadThroughCache('test', ttl=10, stale_ttl=20)
+        with self.at(1000.0):
+            cache.get_or_fetch('k', self.fetch('old'))
+
+        refreshed = threading.Event()
+
+        def refresh():
+            refreshed.set()
+            return self.fetch('new')()
+
+        with self.at(1015.0):
+            self.assertEqual(cache.get_or_fetch('k', refresh), 'old')
+            self.assertTrue(refreshed.wait(5))
+            while cache.backend.get('k')[0] != 'new':
+                threading.Event().wait(0.01)
+            self.assertEqual(cache.get_or_fetch('k', self.fetch('unused')), 'new')
+
+        stats = cache.stats()
+        self.assertEqual((stats['stale_hits'], stats['refreshes'], stats['hits']), (1, 1, 1))
+        self.assertEqual(self.calls, 2)
+
+    def test_value_older_than_stale_window_is_a_miss(self):
+        cache = ReadThroughCache('test', ttl=10, stale_ttl=20)
+        with self.at(1000.0):
+            cache.get_or_fetch('k', self.fetch('old'))
+        with self.at(1031.0):
+            self.assertEqual(cache.get_or_fetch('k', self.fetch('new')), 'new')
+        self.assertEqual(cache.stats()['misses'], 2)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = ReadThroughCache('test', ttl=60, max_entries=2)
+        for key in ('a', 'b', 'a', 'c'):
+            cache.get_or_fetch(key, self.fetch(key))
+
+        self.assertEqual(cache.stats()['size'], 2)
+        self.assertEqual(cache.stats()['evictions'], 1)
+        self.assertIsNone(cache.backend.get('b'))
+        self.assertIsNotNone(cache.backend.get('a'))
+
+    def test_django_backend_rejects_max_entries(self):
+        with self.assertRaisesMessage(ValueError, "OPTIONS['MAX_ENTRIES']"):
+            ReadThroughCache('test', ttl=60, max_entries=100, backend='django')
+        self.assertIsNone(ReadThroughCache('test', ttl=60, backend='django').stats()['size'])
@@ -57,6 +57,9 @@ urlpatterns = [
     # **Prediction endpoints maintenant sur blockchain**
     path('api/blockchain/', include('blockchain.urls')),
 
+    # Periodic jobs (scheduler status / run now)
+    path('api/jobs/', include('jobs.urls')),
+
     # MyApp pour les futurs travaux
     path('api/myapp/', include('myapp.urls')),
 ]
@@ -0,0 +1,161 @@
+import time
+from datetime import timedelta
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Avg
+from django.utils import timezone
+from .geo import EARTH_RADIUS_KM
+from .risk import PortContext, _float_array, haversine_km_array, unit_vectors
+
+KM_PER_NAUTICAL_MILE = 1.852
+
+
+class EtaEngine:
+    """محرك أوقات الوصول المتوقعة لكل الأسطول في تمرير NumPy واحد
+
+    التقدير يُكتب في predicted_arrival ولا يمس expected_arrival (الموعد المخطط)،
+    فيبقى كشف التأخير (notifications.delays) مقارنةً بالخطة وليس بتقدير يتحرك دائماً.
+
+    المسافة المتبقية = الدائرة العظمى من الموقع الحالي إلى ميناء الوجهة، والسرعة
+    مزيج من السرعة الحالية ومتوسط السرعة في سجل المواقع الحديث، ثم تُخفض حسب خطر
+    الطقس حول السفينة وعند ميناء الوجهة (PortContext).
+    """
+
+    def __init__(self, history_hours=None, history_weight=None, min_speed_knots=None,
+                 weather_max_slowdown=None, weather_radius_km=None, chunk_size=None):
+        self.history_hours = history_hours or getattr(settings, 'ETA_SPEED_HISTORY_HOURS', 6)
+        self.history_weight = history_weight if history_weight is not None else getattr(settings, 'ETA_SPEED_HISTORY_WEIGHT', 0.5)
+        self.min_speed_knots = min_speed_knots or getattr(settings, 'ETA_MIN_SPEED_KNOTS', 3)
+        self.weather_max_slowdown = weather_max_slowdown if weather_max_slowdown is not None else getattr(settings, 'ETA_WEATHER_MAX_SLOWDOWN', 0.3)
+        self.weather_radius_km = weather_radius_km or getattr(settings, 'RISK_WEATHER_RADIUS_KM', 300)
+        self.chunk_size = chunk_size or getattr(settings, 'RISK_CHUNK_SIZE', 4096)
+
+    def recent_speeds(self, ship_ids, now=None):
+        """{ship_id: متوسط السرعة} خلال آخر history_hours ساعة باستعلام تجميعي واحد"""
+        since = (now or timezone.now()) - timedelta(hours=self.history_hours)
+        from .models import ShipPosition
+        return dict(
+            ShipPosition.objects.filter(ship_id__in=ship_ids, timestamp__gte=since, speed__isnull=False)
+            .values('ship_id').annotate(average=Avg('speed')).values_list('ship_id', 'average')
+        )
+
+    def _local_weather(self, context, latitudes, longitudes):
+        """أسوأ خطر طقس حول كل سفينة مع تلاشٍ أُسّي بالمسافة (نفس نموذج RiskEngine)"""
+        local = np.zeros(len(latitudes))
+        risky = context.weather_risk > 0
+        if not risky.any():
+            return local
+        port_vectors = context.vectors[risky]
+        port_risk = context.weather_risk[risky].astype(np.float32)[None, :]
+        scale = np.float32(-EARTH_RADIUS_KM / self.weather_radius_km)
+        for start in range(0, len(latitudes), self.chunk_size):
+            stop = start + self.chunk_size
+            vectors = unit_vectors(latitudes[start:stop], longitudes[start:stop]).astype(np.float32)
+            dot = np.clip(vectors @ port_vectors.T, -1.0, 1.0)
+            local[start:stop] = (port_risk * np.exp(np.arccos(dot) * scale)).max(axis=1)
+        return local
+
+    def estimate_hours(self, context, latitudes, longitudes, speeds, history_speeds, destinations):
+        """الساعات المتبقية لكل سفينة (NaN إذا لم يمكن التقدير: بلا موقع أو وجهة أو سرعة كافية)
+
+        destinations مواقع الموانئ في context (-1 بلا وجهة).
+        """
+        latitudes = np.asarray(latitudes, dtype=np.float64)
+        longitudes = np.asarray(longitudes, dtype=np.float64)
+        speeds = np.asarray(speeds, dtype=np.float64)
+        history_speeds = np.asarray(history_speeds, dtype=np.float64)
+        destinations = np.asarray(destinations, dtype=np.int64)
+
+        hours = np.full(len(latitudes), np.nan)
+        valid = (destinations >= 0) & ~(np.isnan(latitudes) | np.isnan(longitudes))
+        if not valid.any():
+            return hours
+
+        rows = np.nonzero(valid)[0]
+        columns = destinations[rows]
+        lat, lon = latitudes[rows], longitudes[rows]
+        remaining_km = haversine_km_array(lat, lon, context.latitudes[columns], context.longitudes[columns])
+
+        # السرعة: مزيج الحالية والمتوسط الحديث، وأحدهما وحده إذا غاب الآخر
+        current, recent = speeds[rows], history_speeds[rows]
+        speed = np.where(
+            np.isnan(recent), current,
+            np.where(np.isnan(current), recent, (1 - self.history_weight) * current + self.history_weight * recent),
+        )
+
+        # الطقس: نصف المسار قرب السفينة ونصفه قرب الوجهة
+        weather = 0.5 * self._local_weather(context, lat, lon) + 0.5 * context.weather_risk[columns]
+        effective_kmh = np.nan_to_num(speed, nan=0.0) * KM_PER_NAUTICAL_MILE * (1 - self.weather_max_slowdown * weather)
+
+        moving = np.nan_to_num(speed, nan=0.0) >= self.min_speed_knots
+        hours[rows[moving]] = remaining_km[moving] / effective_kmh[moving]
+        return hours
+
+    def update_fleet(self, queryset=None, context=None, now=None):
+        """إعادة حساب predicted_arrival لكل السفن المتجهة لميناء وكتابة ما تغير فقط
+
+        التغييرات التي تتجاوز ETA_CHANGE_NOTIFY_MINUTES تُرسل لمتابعي السفن بدفعة إشعارات واحدة.
+        """
+        from .models import Ship
+        from notifications.services import NotificationService
+
+        started = time.perf_counter()
+        now = now or timezone.now()
+        context = context or PortContext.load()
+        ships = list(
+            (queryset if queryset is not None else Ship.objects.all())
+            .filter(destination_port__isnull=False).order_by()
+            .only('id', 'name', 'current_latitude', 'current_longitude', 'current_speed', 'destination_port_id', 'predicted_arrival')
+        )
+        history = self.recent_speeds([ship.id for ship in ships], now)
+        load_ms = (time.perf_counter() - started) * 1000
+
+        compute_started = time.perf_counter()
+        hours = self.estimate_hours(
+            context,
+            _float_array([ship.current_latitude for ship in ships]),
+            _float_array([ship.current_longitude for ship in ships]),
+            _float_array([ship.current_speed for ship in ships]),
+            _float_array([history.get(ship.id) for ship in ships]),
+            context.positions([ship.destination_port_id for ship in ships]),
+        )
+        compute_ms = (time.perf_counter() - compute_started) * 1000
+
+        write_started = time.perf_counter()
+        min_change = timedelta(minutes=getattr(settings, 'ETA_WRITE_MIN_MINUTES', 5))
+        notify_change = timedelta(minutes=getattr(settings, 'ETA_CHANGE_NOTIFY_MINUTES', 60))
+        changed = []
+        eta_changes = []
+        for ship, remaining in zip(ships, hours.tolist()):
+            if remaining != remaining:  # NaN: لا تقدير، تبقى القيمة السابقة
+                continue
+            eta = now + timedelta(hours=remaining)
+            old_eta = ship.predicted_arrival
+            if old_eta is not None and abs(eta - old_eta) < min_change:
+                continue
+            if old_eta is not None and abs(eta - old_eta) >= notify_change:
+                eta_changes.append((ship, old_eta, eta))
+            ship.predicted_arrival = eta
+            changed.append(ship)
+
+        notifications = 0
+        if changed:
+            with transaction.atomic():
+                Ship.objects.bulk_update(changed, ['predicted_arrival'], batch_size=getattr(settings, 'FLEET_REFRESH_CHUNK_SIZE', 500))
+                if eta_changes:
+                    notifications = len(NotificationService().send_eta_change_notifications(eta_changes))
+        write_ms = (time.perf_counter() - write_started) * 1000
+
+        return {
+            'ships': len(ships),
+            'estimated': int(np.count_nonzero(~np.isnan(hours))),
+            'changed': len(changed),
+            'eta_changes': len(eta_changes),
+            'notifications': notifications,
+            'timings': {
+                'load_ms': round(load_ms, 2),
+                'compute_ms': round(compute_ms, 2),
+                'write_ms': round(write_ms, 2),
+            },
+        }
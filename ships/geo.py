@@ -0,0 +1,125 @@
+import math
+from collections import defaultdict
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """مسافة الدائرة العظمى بالكيلومترات"""
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+class GridIndex:
+    """فهرس شبكي في الذاكرة (خلايا lat/lon) لمطابقة المواقع حسب نصف قطر"""
+
+    def __init__(self, cell_deg=1.0):
+        self.cell_deg = cell_deg
+        self.columns = int(math.ceil(360 / cell_deg))
+        self.rows = int(math.ceil(180 / cell_deg))
+        self.cells = defaultdict(list)
+
+    def _row(self, lat):
+        return min(self.rows - 1, max(0, int(math.floor((lat + 90) / self.cell_deg))))
+
+    def _column(self, lon):
+        return int(math.floor((lon + 180) / self.cell_deg)) % self.columns
+
+    def add(self, item, lat, lon):
+        self.cells[(self._row(lat), self._column(lon))].append((item, lat, lon))
+
+    def within(self, lat, lon, radius_km):
+        """كل العناصر ضمن radius_km من النقطة مع المسافة الفعلية"""
+        lat_span = radius_km / KM_PER_DEGREE
+        row_min = self._row(lat - lat_span)
+        row_max = self._row(lat + lat_span)
+
+        # عرض خط الطول يضيق نحو القطبين - نأخذ أسوأ حالة ضمن النطاق
+        max_abs_lat = min(90.0, abs(lat) + lat_span)
+        cos_lat = math.cos(math.radians(max_abs_lat))
+        if cos_lat <= 1e-6 or lat_span / cos_lat >= 180:
+            columns = range(self.columns)
+        else:
+            lon_span = lat_span / cos_lat
+            first = int(math.floor((lon - lon_span + 180) / self.cell_deg))
+            last = int(math.floor((lon + lon_span + 180) / self.cell_deg))
+            columns = {column % self.columns for column in range(first, last + 1)}
+
+        matches = []
+        for row in range(row_min, row_max + 1):
+            for column in columns:
+                for item, item_lat, item_lon in self.cells.get((row, column), ()):
+                    distance = haversine_km(lat, lon, item_lat, item_lon)
+                    if distance <= radius_km:
+                        matches.append((item, distance))
+        return matches
+
+
+# خلايا الشبكة المخزنة في Ship.grid_cell: row * GRID_COLUMNS + column
+GRID_CELL_DEG = 1.0
+GRID_COLUMNS = int(round(360 / GRID_CELL_DEG))
+GRID_ROWS = int(round(180 / GRID_CELL_DEG))
+
+
+def _grid_row(lat):
+    return min(GRID_ROWS - 1, max(0, int(math.floor((lat + 90) / GRID_CELL_DEG))))
+
+
+def _grid_column(lon):
+    # خط الطول 180 هو نفسه -180 فيقع في العمود 0
+    return int(math.floor((((lon + 180) % 360)) / GRID_CELL_DEG)) % GRID_COLUMNS
+
+
+def grid_cell(lat, lon):
+    """رقم خلية الشبكة لموقع، أو None إذا لم تكن الإحداثيات كاملة"""
+    if lat is None or lon is None:
+        return None
+    return _grid_row(lat) * GRID_COLUMNS + _grid_column(lon)
+
+
+def normalize_longitude(lon):
+    return ((lon + 180) % 360) - 180 if not -180 <= lon <= 180 else lon
+
+
+def grid_cell_ranges(south, west, north, east):
+    """نطاقات متصلة [من، إلى] من أرقام الخلايا تغطي المستطيل
+
+    إذا كان west > east فالمستطيل يعبر خط الطول 180 ويُقسم إلى جزأين.
+    east = 180 يشمل العمود 0 حيث تقع المواقع على خط الطول 180 نفسه.
+    الصفوف الكاملة العرض المتتالية تُدمج في نطاق واحد.
+    """
+    if west <= east:
+        column_spans = [(_grid_column(west), _grid_column(east) if east < 180 else GRID_COLUMNS - 1)]
+        if east >= 180 and column_spans[0][0] > 0:
+            column_spans.insert(0, (0, 0))
+    else:
+        column_spans = [(0, _grid_column(east)), (_grid_column(west), GRID_COLUMNS - 1)]
+
+    ranges = []
+    for row in range(_grid_row(south), _grid_row(north) + 1):
+        base = row * GRID_COLUMNS
+        for first, last in column_spans:
+            low, high = base + first, base + last
+            if ranges and ranges[-1][1] + 1 >= low:
+                ranges[-1][1] = max(ranges[-1][1], high)
+            else:
+                ranges.append([low, high])
+    return [tuple(span) for span in ranges]
+
+
+def radius_bbox(lat, lon, radius_km):
+    """أصغر مستطيل (south, west, north, east) يحتوي الدائرة - قد يعبر خط الطول 180"""
+    lat_span = radius_km / KM_PER_DEGREE
+    south = max(-90.0, lat - lat_span)
+    north = min(90.0, lat + lat_span)
+    max_abs_lat = max(abs(south), abs(north))
+    cos_lat = math.cos(math.radians(max_abs_lat))
+    if north >= 90 or south <= -90 or cos_lat <= 1e-6 or lat_span / cos_lat >= 180:
+        return south, -180.0, north, 180.0
+    lon_span = lat_span / cos_lat
+    return south, normalize_longitude(lon - lon_span), north, normalize_longitude(lon + lon_span)
@@ -0,0 +1,183 @@
+import math
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from .geo import haversine_km
+from .models import ShipPosition, ShipTrackDay
+
+
+def _utc_day(moment):
+    return moment.astimezone(dt_timezone.utc).date()
+
+
+def _optional_float(value):
+    """رقم من قيمة المزود (MarineTraffic يعيد SPEED كنص) أو None إذا كانت فارغة أو غير صالحة"""
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return number if math.isfinite(number) else None
+
+
+class PositionHistory:
+    """مخزن سجل المواقع: كتابة جماعية للمواقع الخام + ملخص يومي لكل سفينة
+
+    النوافذ القصيرة (حتى HISTORY_RAW_MAX_HOURS) تُقرأ من ShipPosition عبر فهرس
+    (ship, timestamp)، والنوافذ الأطول من ShipTrackDay (صف واحد لكل يوم) فلا تتأثر
+    سرعة الاستعلام بعدد المواقع المخزنة.
+    """
+
+    def __init__(self, bucket_minutes=None, raw_max_hours=None, max_points=None, chunk_size=None):
+        self.bucket_seconds = 60 * (bucket_minutes or getattr(settings, 'HISTORY_ROLLUP_BUCKET_MINUTES', 15))
+        self.raw_max_hours = raw_max_hours or getattr(settings, 'HISTORY_RAW_MAX_HOURS', 48)
+        self.max_points = max_points or getattr(settings, 'HISTORY_MAX_POINTS', 5000)
+        self.chunk_size = chunk_size or getattr(settings, 'HISTORY_BULK_CHUNK_SIZE', 1000)
+
+    @staticmethod
+    def fix_from_position(ship, position_data, timestamp=None):
+        """موقع غير محفوظ من بيانات المزود، أو None إذا لم تكن فيه إحداثيات"""
+        if not position_data or position_data.get('latitude') is None or position_data.get('longitude') is None:
+            return None
+        return ShipPosition(
+            ship_id=ship.id,
+            timestamp=timestamp or timezone.now(),
+            latitude=float(position_data['latitude']),
+            longitude=float(position_data['longitude']),
+            speed=_optional_float(position_data.get('speed')),
+            heading=_optional_float(position_data.get('heading')),
+            source=(position_data.get('source') or '')[:20],
+        )
+
+    def ingest(self, fixes):
+        """إضافة دفعة مواقع: bulk_create للخام ثم دمجها في الملخصات اليومية"""
+        fixes = [fix for fix in fixes if fix is not None]
+        if not fixes:
+            return 0
+        with transaction.atomic():
+            ShipPosition.objects.bulk_create(fixes, batch_size=self.chunk_size)
+            try:
+                with transaction.atomic():
+                    self._roll_up(fixes)
+            except IntegrityError:
+                # كتابة متزامنة أنشأت نفس اليوم - نعيد القراءة وندمج فوقها
+                self._roll_up(fixes)
+        return len(fixes)
+
+    def _roll_up(self, fixes):
+        groups = defaultdict(list)
+        for fix in fixes:
+            groups[(fix.ship_id, _utc_day(fix.timestamp))].append(fix)
+
+        existing = {
+            (day.ship_id, day.day): day
+            for day in ShipTrackDay.objects.select_for_update().filter(
+                ship_id__in={ship_id for ship_id, _ in groups},
+                day__in={day for _, day in groups},
+            )
+        }
+
+        to_create = []
+        to_update = []
+        for key, day_fixes in groups.items():
+            track_day = existing.get(key)
+            if track_day is None:
+                track_day = ShipTrackDay(ship_id=key[0], day=key[1], first_at=day_fixes[0].timestamp, last_at=day_fixes[0].timestamp,
+                                         min_latitude=90, max_latitude=-90, min_longitude=180, max_longitude=-180)
+                to_create.append(track_day)
+            else:
+                to_update.append(track_day)
+            self._merge(track_day, sorted(day_fixes, key=lambda fix: fix.timestamp))
+
+        if to_create:
+            ShipTrackDay.objects.bulk_create(to_create, batch_size=self.chunk_size)
+        if to_update:
+            ShipTrackDay.objects.bulk_update(to_update, [
+                'fix_count', 'first_at', 'last_at', 'min_latitude', 'max_latitude', 'min_longitude',
+                'max_longitude', 'distance_km', 'max_speed', 'points',
+            ], batch_size=self.chunk_size)
+
+    def _merge(self, track_day, fixes):
+        buckets = {int(point[0]) // self.bucket_seconds: point for point in track_day.points}
+        previous = track_day.points[-1] if track_day.fix_count and track_day.points else None
+        last_at = track_day.last_at if track_day.fix_count else None
+
+        for fix in fixes:
+            epoch = int(fix.timestamp.timestamp())
+            point = [epoch, fix.latitude, fix.longitude, fix.speed, fix.heading]
+
+            # المسافة تُحسب فقط للمواقع الأحدث (المتأخرة في الوصول لا تُعيد ترتيب المسار)
+            if last_at is None or fix.timestamp > last_at:
+                if previous is not None:
+                    track_day.distance_km += haversine_km(previous[1], previous[2], fix.latitude, fix.longitude)
+                previous = point
+                last_at = fix.timestamp
+
+            bucket = epoch // self.bucket_seconds
+            if bucket not in buckets or epoch >= buckets[bucket][0]:
+                buckets[bucket] = point
+
+            track_day.fix_count += 1
+            track_day.first_at = min(track_day.first_at, fix.timestamp)
+            track_day.min_latitude = min(track_day.min_latitude, fix.latitude)
+            track_day.max_latitude = max(track_day.max_latitude, fix.latitude)
+            track_day.min_longitude = min(track_day.min_longitude, fix.longitude)
+            track_day.max_longitude = max(track_day.max_longitude, fix.longitude)
+            if fix.speed is not None:
+                track_day.max_speed = fix.speed if track_day.max_speed is None else max(track_day.max_speed, fix.speed)
+
+        track_day.last_at = last_at
+        track_day.points = [buckets[bucket] for bucket in sorted(buckets)]
+
+    def trajectory(self, ship, start, end, resolution='auto'):
+        """مسار السفينة بين start و end
+
+        resolution: 'raw' (كل المواقع) أو 'daily' (من الملخص اليومي) أو 'auto'
+        حسب طول النافذة. النتيجة مرتبة زمنياً ومحدودة بـ HISTORY_MAX_POINTS.
+        """
+        if resolution == 'auto':
+            resolution = 'raw' if end - start <= timedelta(hours=self.raw_max_hours) else 'daily'
+
+        if resolution == 'raw':
+            rows = ShipPosition.objects.filter(
+                ship_id=ship.id, timestamp__gte=start, timestamp__lte=end,
+            ).order_by('timestamp').values_list('timestamp', 'latitude', 'longitude', 'speed', 'heading')[:self.max_points + 1]
+            points = [
+                {'timestamp': timestamp, 'latitude': lat, 'longitude': lon, 'speed': speed, 'heading': heading}
+                for timestamp, lat, lon, speed, heading in rows
+            ]
+            days = []
+        else:
+            start_epoch = start.timestamp()
+            end_epoch = end.timestamp()
+            days = list(ShipTrackDay.objects.filter(
+                ship_id=ship.id, day__gte=_utc_day(start), day__lte=_utc_day(end),
+            ).order_by('day'))
+            points = [
+                {'timestamp': datetime.fromtimestamp(epoch, dt_timezone.utc), 'latitude': lat, 'longitude': lon,
+                 'speed': speed, 'heading': heading}
+                for track_day in days
+                for epoch, lat, lon, speed, heading in track_day.points
+                if start_epoch <= epoch <= end_epoch
+            ][:self.max_points + 1]
+
+        truncated = len(points) > self.max_points
+        return {
+            'ship': {'id': ship.id, 'name': ship.name, 'imo_number': ship.imo_number},
+            'start': start,
+            'end': end,
+            'resolution': resolution,
+            'count': min(len(points), self.max_points),
+            'truncated': truncated,
+            'points': points[:self.max_points],
+            'days': [{
+                'day': track_day.day,
+                'fix_count': track_day.fix_count,
+                'first_at': track_day.first_at,
+                'last_at': track_day.last_at,
+                'distance_km': round(track_day.distance_km, 3),
+                'max_speed': track_day.max_speed,
+                'bounds': [track_day.min_latitude, track_day.min_longitude, track_day.max_latitude, track_day.max_longitude],
+            } for track_day in days],
+        }
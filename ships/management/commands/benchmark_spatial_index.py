@@ -0,0 +1,116 @@
+"""
+Benchmark the ship spatial index (Ship.grid_cell) against a plain float-range scan.
+Usage: python manage.py benchmark_spatial_index --ships 100000
+
+Ships are created inside a transaction that is rolled back at the end unless
+--keep is given.
+"""
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from ships.geo import grid_cell, haversine_km, radius_bbox
+from ships.models import Ship
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Measure bbox / radius query latency with and without the grid_cell spatial index'
+
+    QUERIES = [
+        ('bbox 2x2 deg (Dakar)', 'bbox', (13.7, -18.4, 15.7, -16.4)),
+        ('bbox 10x10 deg (Gulf of Guinea)', 'bbox', (0.0, -5.0, 10.0, 5.0)),
+        ('bbox 40x60 deg (Atlantic)', 'bbox', (-10.0, -50.0, 30.0, 10.0)),
+        ('bbox across antimeridian', 'bbox', (-20.0, 170.0, 0.0, -170.0)),
+        ('radius 50 km (Lagos)', 'radius', (6.4654, 3.4064, 50)),
+        ('radius 500 km (Cape Town)', 'radius', (-33.9061, 18.4265, 500)),
+        ('radius 300 km (Fiji, wraps)', 'radius', (-17.7, 179.5, 300)),
+    ]
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ships', type=int, default=100000, help='Number of ships to generate (default: 100000)')
+        parser.add_argument('--repeat', type=int, default=20, help='Runs per query (default: 20)')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--keep', action='store_true', help='Keep the generated ships')
+
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+        try:
+            with transaction.atomic():
+                self._generate(options['ships'])
+                self._run(options['repeat'])
+                if not options['keep']:
+                    raise Rollback()
+        except Rollback:
+            self.stdout.write('Generated ships rolled back')
+
+    def _generate(self, count):
+        hubs = [(14.69, -17.45), (5.26, -4.02), (6.47, 3.41), (-33.91, 18.43), (-29.87, 31.03), (1.26, 103.82), (51.95, 4.14)]
+        started = time.monotonic()
+        batch = []
+        for i in range(count):
+            if i % 3:
+                lat, lon = random.choice(hubs)
+                lat = max(-90.0, min(90.0, random.gauss(lat, 3)))
+                lon = ((random.gauss(lon, 3) + 180) % 360) - 180
+            else:
+                lat, lon = random.uniform(-80, 80), random.uniform(-180, 180)
+            batch.append(Ship(
+                name=f'bench-{i}', imo_number=f'B{i:08d}', current_latitude=lat, current_longitude=lon,
+                grid_cell=grid_cell(lat, lon),
+            ))
+            if len(batch) == 5000:
+                Ship.objects.bulk_create(batch)
+                batch = []
+        Ship.objects.bulk_create(batch)
+        self.stdout.write(f'Generated {count} ships in {time.monotonic() - started:.1f}s '
+                          f'(total ships: {Ship.objects.count()})')
+
+    def _scan(self, south, west, north, east):
+        if west <= east:
+            longitudes = Q(current_longitude__gte=west, current_longitude__lte=east)
+        else:
+            longitudes = Q(current_longitude__gte=west) | Q(current_longitude__lte=east)
+        if east >= 180:
+            longitudes |= Q(current_longitude__lte=-180)
+        if west <= -180:
+            longitudes |= Q(current_longitude__gte=180)
+        return Ship.objects.filter(longitudes, current_latitude__gte=south, current_latitude__lte=north).order_by()
+
+    def _timed(self, repeat, fn):
+        samples = []
+        result = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = fn()
+            samples.append((time.perf_counter() - started) * 1000)
+        samples.sort()
+        return result, statistics.median(samples), samples[int(0.95 * (len(samples) - 1))]
+
+    def _run(self, repeat):
+        self.stdout.write(f"{'query':34} {'hits':>7} {'index p50/p95 ms':>18} {'scan p50/p95 ms':>18}")
+        for label, kind, args in self.QUERIES:
+            if kind == 'bbox':
+                indexed = lambda: set(Ship.objects.in_bbox(*args).order_by().values_list('id', flat=True))
+                scan = lambda: set(self._scan(*args).values_list('id', flat=True))
+            else:
+                lat, lon, radius_km = args
+                indexed = lambda: {ship.id for ship, _ in Ship.objects.only(
+                    'id', 'current_latitude', 'current_longitude').near(lat, lon, radius_km)}
+                scan = lambda: {
+                    ship.id for ship in self._scan(*radius_bbox(lat, lon, radius_km))
+                    .only('id', 'current_latitude', 'current_longitude')
+                    if haversine_km(lat, lon, ship.current_latitude, ship.current_longitude) <= radius_km
+                }
+            indexed_ids, indexed_p50, indexed_p95 = self._timed(repeat, indexed)
+            scan_ids, scan_p50, scan_p95 = self._timed(repeat, scan)
+            status = '' if indexed_ids == scan_ids else '  MISMATCH'
+            self.stdout.write(f'{label:34} {len(indexed_ids):>7} {indexed_p50:>8.2f}/{indexed_p95:<9.2f} '
+                              f'{scan_p50:>8.2f}/{scan_p95:<9.2f}{status}')
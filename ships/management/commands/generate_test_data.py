@@ -12,6 +12,7 @@ from ships.models import Port, Ship
 from weather.models import WeatherData, WeatherAlert
 from notifications.models import Notification, Message
 from blockchain.models import Prediction, PointActivity, UserScore
+from blockchain.scoring import level_for
 
 User = get_user_model()
 
@@ -46,48 +47,51 @@ class Command(BaseCommand):
         )
 
     def handle(self, *args, **options):
+        self.generate(options)
+
+    def generate(self, options, progress=None):
+        """Run every generation step; progress(fraction, message, partial=...) is reported after each one"""
         self.stdout.write(self.style.SUCCESS('🚀 Starting data generation...'))
-        
+        counts = {}
+
+        def step(index, key, label, created):
+            counts[key] = created
+            self.stdout.write(self.style.SUCCESS(f'✅ Created {created} {label}'))
+            if progress:
+                progress(index / 9, f'Created {created} {label}', partial={key: created}, force=True)
+
         # 1. Create Ports
-        ports_created = self.create_ports(options['ports'])
-        self.stdout.write(self.style.SUCCESS(f'✅ Created {ports_created} ports'))
+        step(1, 'ports', 'ports', self.create_ports(options['ports']))
         
         # 2. Create Ships
         ports = Port.objects.all()
-        ships_created = self.create_ships(options['ships'], ports)
-        self.stdout.write(self.style.SUCCESS(f'✅ Created {ships_created} ships'))
+        step(2, 'ships', 'ships', self.create_ships(options['ships'], ports))
         
         # 3. Create Users
-        users_created = self.create_users(options['users'])
-        self.stdout.write(self.style.SUCCESS(f'✅ Created {users_created} users'))
+        step(3, 'users', 'users', self.create_users(options['users']))
         
         # 4. Create Weather Data
-        weather_created = self.create_weather_data(ports)
-        self.stdout.write(self.style.SUCCESS(f'✅ Created {weather_created} weather records'))
+        step(4, 'weather', 'weather records', self.create_weather_data(ports))
         
         # 5. Create Weather Alerts
-        alerts_created = self.create_weather_alerts(ports)
-        self.stdout.write(self.style.SUCCESS(f'✅ Created {alerts_created} weather alerts'))
+        step(5, 'alerts', 'weather alerts', self.create_weather_alerts(ports))
         
         # 6. Create Notifications
         users = User.objects.all()
         ships = Ship.objects.all()
-        notifs_created = self.create_notifications(users, ships)
-        self.stdout.write(self.style.SUCCESS(f'✅ Created {notifs_created} notifications'))
+        step(6, 'notifications', 'notifications', self.create_notifications(users, ships))
         
         # 7. Create Messages
-        messages_created = self.create_messages(users, ships, options['messages'])
-        self.stdout.write(self.style.SUCCESS(f'✅ Created {messages_created} messages'))
+        step(7, 'messages', 'messages', self.create_messages(users, ships, options['messages']))
         
         # 8. Create Blockchain Predictions
-        preds_created = self.create_predictions(ships)
-        self.stdout.write(self.style.SUCCESS(f'✅ Created {preds_created} blockchain predictions'))
+        step(8, 'predictions', 'blockchain predictions', self.create_predictions(ships))
         
         # 9. Create Point Activities
-        activities_created = self.create_point_activities(users)
-        self.stdout.write(self.style.SUCCESS(f'✅ Created {activities_created} point activities'))
+        step(9, 'point_activities', 'point activities', self.create_point_activities(users))
         
         self.stdout.write(self.style.SUCCESS('✨ Data generation completed!'))
+        return counts
 
     def create_ports(self, count):
         """Create test ports"""
@@ -210,21 +214,12 @@ class Command(BaseCommand):
                     user=user,
                     defaults={
                         'total_points': user.points,
-                        'level': self._get_level(user.points)
+                        'level': level_for(user.points)
                     }
                 )
                 created += 1
         return created
 
-    def _get_level(self, points):
-        if points >= 1000:
-            return 'Expert'
-        elif points >= 500:
-            return 'Avancé'
-        elif points >= 100:
-            return 'Intermédiaire'
-        return 'Débutant'
-
     def create_weather_data(self, ports):
         """Create weather data for ports"""
         created = 0
@@ -15,6 +15,7 @@ from ships.models import Port, Ship
 from weather.models import WeatherData, WeatherAlert
 from notifications.models import Notification, Message
 from blockchain.models import Prediction, PointActivity, UserScore
+from blockchain.scoring import level_for
 
 User = get_user_model()
 
@@ -127,21 +128,12 @@ class Command(BaseCommand):
                 user=user,
                 defaults={
                     'total_points': user.points,
-                    'level': self._get_level(user.points)
+                    'level': level_for(user.points)
                 }
             )
             created_users.append(user)
         return created_users
 
-    def _get_level(self, points):
-        if points >= 1000:
-            return 'Expert'
-        elif points >= 500:
-            return 'Avancé'
-        elif points >= 100:
-            return 'Intermédiaire'
-        return 'Débutant'
-
     def create_ships(self, count, ports):
         """Create exactly N ships"""
         ship_names = [
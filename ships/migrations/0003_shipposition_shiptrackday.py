@@ -0,0 +1,55 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ships', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShipPosition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('timestamp', models.DateTimeField()),
+                ('latitude', models.FloatField()),
+                ('longitude', models.FloatField()),
+                ('speed', models.FloatField(blank=True, null=True)),
+                ('heading', models.FloatField(blank=True, null=True)),
+                ('source', models.CharField(blank=True, max_length=20)),
+                ('ship', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='positions', to='ships.ship')),
+            ],
+            options={
+                'verbose_name': 'موقع سفينة',
+                'verbose_name_plural': 'مواقع السفن',
+                'indexes': [models.Index(fields=['ship', 'timestamp'], name='ships_shipp_ship_id_09beef_idx'), models.Index(fields=['timestamp'], name='ships_shipp_timesta_0fc934_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ShipTrackDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('fix_count', models.PositiveIntegerField(default=0)),
+                ('first_at', models.DateTimeField()),
+                ('last_at', models.DateTimeField()),
+                ('min_latitude', models.FloatField()),
+                ('max_latitude', models.FloatField()),
+                ('min_longitude', models.FloatField()),
+                ('max_longitude', models.FloatField()),
+                ('distance_km', models.FloatField(default=0)),
+                ('max_speed', models.FloatField(blank=True, null=True)),
+                ('points', models.JSONField(default=list)),
+                ('ship', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='track_days', to='ships.ship')),
+            ],
+            options={
+                'verbose_name': 'مسار يومي',
+                'verbose_name_plural': 'مسارات يومية',
+                'constraints': [models.UniqueConstraint(fields=('ship', 'day'), name='unique_ship_track_day')],
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:18
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_grid_cell(apps, schema_editor):
+    from ships.geo import grid_cell
+    Ship = apps.get_model('ships', 'Ship')
+    ships = list(Ship.objects.filter(current_latitude__isnull=False, current_longitude__isnull=False)
+                 .only('id', 'current_latitude', 'current_longitude'))
+    for ship in ships:
+        ship.grid_cell = grid_cell(ship.current_latitude, ship.current_longitude)
+    Ship.objects.bulk_update(ships, ['grid_cell'], batch_size=500)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ships', '0003_shipposition_shiptrackday'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ship',
+            name='grid_cell',
+            field=models.IntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='ship',
+            index=models.Index(fields=['grid_cell', 'current_latitude', 'current_longitude'], name='ship_grid_cell_idx'),
+        ),
+        migrations.RunPython(backfill_grid_cell, migrations.RunPython.noop),
+    ]
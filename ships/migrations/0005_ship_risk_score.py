@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ships', '0004_ship_grid_cell'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ship',
+            name='risk_score',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='ship',
+            name='risk_updated_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
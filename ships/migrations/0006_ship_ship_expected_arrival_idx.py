@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:41
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ships', '0005_ship_risk_score'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ship',
+            index=models.Index(fields=['expected_arrival'], name='ship_expected_arrival_idx'),
+        ),
+    ]
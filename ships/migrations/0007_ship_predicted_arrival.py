@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ships', '0006_ship_ship_expected_arrival_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ship',
+            name='predicted_arrival',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -1,5 +1,8 @@
 from django.db import models
+from django.db.models import Count, Exists, OuterRef, Prefetch, Subquery, Value
+from django.db.models.functions import Coalesce
 from django.contrib.auth import get_user_model
+from .geo import grid_cell, grid_cell_ranges, haversine_km, radius_bbox
 
 User = get_user_model()
 
@@ -14,6 +17,64 @@ class Port(models.Model):
     def __str__(self):
         return f"{self.name}, {self.country}"
 
+class ShipQuerySet(models.QuerySet):
+    MAX_CELL_RANGES = 16
+    
+    def with_tracking(self, user=None):
+        """قائمة أسطول جاهزة للتسلسل باستعلامين ثابتين مهما كان عدد السفن
+        
+        الميناء بـ JOIN، وعدد المتابعين ومتابعة المستخدم الحالي كحقول محسوبة
+        (tracked_by_count / is_tracked)، ومعرفات المتابعين بـ prefetch واحد.
+        """
+        through = Ship.tracked_by.through
+        user_column = Ship.tracked_by.field.m2m_reverse_field_name()
+        followers = through.objects.filter(ship_id=OuterRef('pk'))
+        
+        queryset = self.select_related('destination_port').annotate(
+            tracked_by_count=Coalesce(Subquery(
+                followers.order_by().values('ship_id').annotate(total=Count('*')).values('total')
+            ), Value(0)),
+        ).prefetch_related(Prefetch('tracked_by', queryset=User.objects.only('id')))
+        
+        if user is not None and user.is_authenticated:
+            queryset = queryset.annotate(is_tracked=Exists(followers.filter(**{user_column: user.id})))
+        else:
+            queryset = queryset.annotate(is_tracked=Value(False))
+        return queryset
+    
+    def in_bbox(self, south, west, north, east):
+        """السفن داخل مستطيل عبر فهرس grid_cell ثم تصفية دقيقة على الإحداثيات
+        
+        west > east يعني أن المستطيل يعبر خط الطول 180، والحدان 180 و -180 يشملان
+        المواقع المخزنة على نفس خط الطول بالقيمة الأخرى.
+        """
+        ranges = grid_cell_ranges(south, west, north, east)
+        if len(ranges) > self.MAX_CELL_RANGES:
+            # منطقة واسعة: مسح متصل واحد للفهرس أسرع من عشرات النطاقات المنفصلة
+            ranges = [(ranges[0][0], ranges[-1][1])]
+        cells = models.Q()
+        for low, high in ranges:
+            cells |= models.Q(grid_cell__gte=low, grid_cell__lte=high) if low != high else models.Q(grid_cell=low)
+        if west <= east:
+            longitudes = models.Q(current_longitude__gte=west, current_longitude__lte=east)
+        else:
+            longitudes = models.Q(current_longitude__gte=west) | models.Q(current_longitude__lte=east)
+        if east >= 180:
+            longitudes |= models.Q(current_longitude__lte=-180)
+        if west <= -180:
+            longitudes |= models.Q(current_longitude__gte=180)
+        return self.filter(cells).filter(longitudes, current_latitude__gte=south, current_latitude__lte=north)
+    
+    def near(self, lat, lon, radius_km):
+        """[(ship, distance_km)] ضمن نصف القطر مرتبة من الأقرب"""
+        matches = []
+        for ship in self.in_bbox(*radius_bbox(lat, lon, radius_km)).order_by():
+            distance = haversine_km(lat, lon, ship.current_latitude, ship.current_longitude)
+            if distance <= radius_km:
+                matches.append((ship, distance))
+        matches.sort(key=lambda match: match[1])
+        return matches
+
 class Ship(models.Model):
     SHIP_TYPES = (
         ('container', 'حاوية'),
@@ -39,7 +100,9 @@ class Ship(models.Model):
     # الوجهة والتوقعات
     destination_port = models.ForeignKey(Port, on_delete=models.SET_NULL, null=True, blank=True, related_name='incoming_ships')
     destination_name = models.CharField(max_length=100, blank=True)  # اسم الوجهة من MarineTraffic
-    expected_arrival = models.DateTimeField(null=True, blank=True)
+    expected_arrival = models.DateTimeField(null=True, blank=True)  # الموعد المخطط - مرجع كشف التأخير
+    # التقدير الحالي من ships.eta.EtaEngine (يُعاد حسابه بعد كل تحديث للمواقع والطقس)
+    predicted_arrival = models.DateTimeField(null=True, blank=True, editable=False)
     
     # التتبع والإدارة
     tracked_by = models.ManyToManyField(User, related_name='tracked_ships', blank=True)
@@ -51,14 +114,41 @@ class Ship(models.Model):
     width = models.FloatField(null=True, blank=True)   # عرض السفينة
     draft = models.FloatField(null=True, blank=True)   # غاطس السفينة
     
+    # خلية الشبكة للموقع الحالي (ships.geo.grid_cell) - فهرس مكاني للبحث حسب المنطقة
+    grid_cell = models.IntegerField(null=True, blank=True, editable=False)
+    
+    # درجة المخاطر (0-1) من ships.risk.RiskEngine - يعاد حسابها بعد كل تحديث للطقس،
+    # و risk_updated_at وقت آخر تقييم (حتى لو لم تتغير الدرجة)
+    risk_score = models.FloatField(null=True, blank=True, editable=False)
+    risk_updated_at = models.DateTimeField(null=True, blank=True, editable=False)
+    
+    objects = ShipQuerySet.as_manager()
+    
     class Meta:
         ordering = ['-last_updated']
+        indexes = [
+            # الإحداثيات داخل الفهرس تسمح بالتصفية الدقيقة دون قراءة الصفوف خارج المنطقة
+            models.Index(fields=['grid_cell', 'current_latitude', 'current_longitude'], name='ship_grid_cell_idx'),
+            # مسح التأخيرات التدريجي يقرأ نطاق expected_arrival الجديد فقط (notifications.delays)
+            models.Index(fields=['expected_arrival'], name='ship_expected_arrival_idx'),
+        ]
         verbose_name = 'سفينة'
         verbose_name_plural = 'سفن'
     
     def __str__(self):
         return f"{self.name} (IMO: {self.imo_number})"
     
+    def save(self, *args, **kwargs):
+        self.refresh_grid_cell()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'current_latitude', 'current_longitude'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'grid_cell'}
+        super().save(*args, **kwargs)
+    
+    def refresh_grid_cell(self):
+        """مزامنة grid_cell مع الموقع الحالي - يجب استدعاؤها قبل bulk_update للمواقع"""
+        self.grid_cell = grid_cell(self.current_latitude, self.current_longitude)
+    
     def get_current_position(self):
         """الحصول على الموقع الحالي كـ tuple"""
         if self.current_latitude and self.current_longitude:
@@ -69,4 +159,51 @@ class Ship(models.Model):
         """التحقق إذا كان المستخدم يتابع هذه السفينة"""
         return self.tracked_by.filter(id=user.id).exists()
 
+class ShipPosition(models.Model):
+    """سجل مواقع السفينة - إضافة فقط، مفهرس على (السفينة، الوقت)"""
+    ship = models.ForeignKey(Ship, on_delete=models.CASCADE, related_name='positions', db_index=False)
+    timestamp = models.DateTimeField()
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+    speed = models.FloatField(null=True, blank=True)
+    heading = models.FloatField(null=True, blank=True)
+    source = models.CharField(max_length=20, blank=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['ship', 'timestamp']),
+            models.Index(fields=['timestamp']),  # حذف البيانات القديمة حسب اليوم
+        ]
+        verbose_name = 'موقع سفينة'
+        verbose_name_plural = 'مواقع السفن'
+    
+    def __str__(self):
+        return f"{self.ship_id} @ {self.timestamp:%Y-%m-%d %H:%M} ({self.latitude}, {self.longitude})"
+
+class ShipTrackDay(models.Model):
+    """ملخص يومي لمسار السفينة: نقاط مخففة + إحصائيات لخدمة النوافذ الطويلة"""
+    ship = models.ForeignKey(Ship, on_delete=models.CASCADE, related_name='track_days')
+    day = models.DateField()
+    fix_count = models.PositiveIntegerField(default=0)
+    first_at = models.DateTimeField()
+    last_at = models.DateTimeField()
+    min_latitude = models.FloatField()
+    max_latitude = models.FloatField()
+    min_longitude = models.FloatField()
+    max_longitude = models.FloatField()
+    distance_km = models.FloatField(default=0)
+    max_speed = models.FloatField(null=True, blank=True)
+    # [[epoch, lat, lon, speed, heading], ...] - آخر موقع في كل فترة HISTORY_ROLLUP_BUCKET_MINUTES
+    points = models.JSONField(default=list)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['ship', 'day'], name='unique_ship_track_day'),
+        ]
+        verbose_name = 'مسار يومي'
+        verbose_name_plural = 'مسارات يومية'
+    
+    def __str__(self):
+        return f"{self.ship_id} {self.day} ({self.fix_count} fixes)"
+
 # تم إزالة نموذج Shipment نهائياً
\ No newline at end of file
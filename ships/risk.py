@@ -0,0 +1,284 @@
+import time
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .geo import EARTH_RADIUS_KM
+
+# وزن كل عامل في الدرجة النهائية (يُجمع بـ noisy-or فتبقى الدرجة بين 0 و 1)
+DEFAULT_WEIGHTS = {
+    'speed': 0.35,
+    'weather': 0.6,
+    'alert': 0.8,
+    'destination': 0.5,
+    'voyage': 0.15,
+}
+
+SEVERITY_WEIGHTS = {'low': 0.35, 'medium': 0.65, 'high': 1.0}
+
+CONDITION_RISK = {
+    'Thunderstorm': 1.0,
+    'Squall': 1.0,
+    'Tornado': 1.0,
+    'Snow': 0.6,
+    'Fog': 0.6,
+    'Mist': 0.4,
+    'Haze': 0.3,
+    'Rain': 0.4,
+    'Drizzle': 0.2,
+}
+
+
+def unit_vectors(latitudes, longitudes):
+    """متجهات الوحدة (x, y, z) للمواقع - حاصل ضربها النقطي هو جيب تمام الزاوية المركزية"""
+    phi = np.radians(latitudes)
+    lmb = np.radians(longitudes)
+    return np.stack([np.cos(phi) * np.cos(lmb), np.cos(phi) * np.sin(lmb), np.sin(phi)], axis=1)
+
+
+def heading_vectors(latitudes, longitudes, headings):
+    """متجه الاتجاه في المستوى المماس عند كل سفينة (شمال = 0°، شرق = 90°)"""
+    phi = np.radians(latitudes)
+    lmb = np.radians(longitudes)
+    theta = np.radians(headings)
+    north = np.stack([-np.sin(phi) * np.cos(lmb), -np.sin(phi) * np.sin(lmb), np.cos(phi)], axis=1)
+    east = np.stack([-np.sin(lmb), np.cos(lmb), np.zeros_like(lmb)], axis=1)
+    return np.cos(theta)[:, None] * north + np.sin(theta)[:, None] * east
+
+
+def haversine_km_array(lat1, lon1, lat2, lon2):
+    """مسافة الدائرة العظمى (كم) بين أزواج النقاط عنصراً بعنصر"""
+    phi1, phi2 = np.radians(lat1), np.radians(lat2)
+    a = np.sin((phi2 - phi1) / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(np.radians(lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def _float_array(values):
+    return np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+
+
+class PortContext:
+    """حالة الموانئ كمصفوفات: الموقع، خطر الطقس الحالي، وأشد إنذار نشط"""
+
+    def __init__(self, port_ids, latitudes, longitudes, weather_risk, alert_risk):
+        self.port_ids = np.asarray(port_ids, dtype=np.int64)
+        self.latitudes = np.asarray(latitudes, dtype=np.float64)
+        self.longitudes = np.asarray(longitudes, dtype=np.float64)
+        self.weather_risk = np.asarray(weather_risk, dtype=np.float64)
+        self.alert_risk = np.asarray(alert_risk, dtype=np.float64)
+        # float32 للمصفوفات ships × ports: خطأ المسافة أقل من 2 كم وهو مهمل أمام أنصاف أقطار بمئات الكيلومترات
+        self.vectors = unit_vectors(self.latitudes, self.longitudes).astype(np.float32)
+        self._index = {port_id: position for position, port_id in enumerate(self.port_ids.tolist())}
+
+    def __len__(self):
+        return len(self.port_ids)
+
+    def positions(self, port_ids):
+        """موقع كل ميناء في المصفوفات (-1 إذا لم يوجد)"""
+        return np.array([self._index.get(port_id, -1) if port_id is not None else -1 for port_id in port_ids], dtype=np.int64)
+
+    @staticmethod
+    def weather_risk_from(wind_speed, visibility, condition):
+        wind = np.clip((wind_speed - 8.0) / 12.0, 0.0, 1.0)  # m/s: خطر من 8 ويبلغ أقصاه عند 20
+        fog = np.clip((5000.0 - visibility) / 4000.0, 0.0, 1.0)  # الرؤية أقل من 5 كم
+        return np.maximum(np.maximum(wind, fog), condition)
+
+    @classmethod
+    def load(cls, now=None):
+        """تحميل الحالة من CurrentWeather والإنذارات النشطة بثلاثة استعلامات"""
+        from weather.models import CurrentWeather, WeatherAlert
+        from .models import Port
+
+        ports = list(Port.objects.values_list('id', 'latitude', 'longitude'))
+        port_ids = [port_id for port_id, _, _ in ports]
+        index = {port_id: position for position, port_id in enumerate(port_ids)}
+
+        wind = np.zeros(len(ports))
+        visibility = np.full(len(ports), 10000.0)
+        condition = np.zeros(len(ports))
+        for port_id, wind_speed, vis, weather_condition in CurrentWeather.objects.values_list(
+            'port_id', 'weather__wind_speed', 'weather__visibility', 'weather__weather_condition'
+        ):
+            position = index.get(port_id)
+            if position is not None:
+                wind[position] = wind_speed or 0.0
+                visibility[position] = vis if vis is not None else 10000.0
+                condition[position] = CONDITION_RISK.get(weather_condition, 0.0)
+
+        alert = np.zeros(len(ports))
+        for port_id, severity in WeatherAlert.objects.active(now).values_list('port_id', 'severity'):
+            position = index.get(port_id)
+            if position is not None:
+                alert[position] = max(alert[position], SEVERITY_WEIGHTS.get(severity, 0.5))
+
+        return cls(
+            port_ids,
+            [lat for _, lat, _ in ports],
+            [lon for _, _, lon in ports],
+            cls.weather_risk_from(wind, visibility, condition),
+            alert,
+        )
+
+
+class RiskEngine:
+    """محرك درجات المخاطر: يحسب درجة كل السفن دفعة واحدة بعمليات NumPy على المصفوفات
+
+    العوامل: السرعة، طقس الموانئ القريبة، الإنذارات النشطة القريبة (أعلى إذا كان
+    الاتجاه نحوها)، طقس ميناء الوجهة عند الاقتراب منه، والمسافة المتبقية للوجهة.
+    """
+
+    def __init__(self, weights=None, weather_radius_km=None, alert_radius_km=None, chunk_size=None):
+        self.weights = {**DEFAULT_WEIGHTS, **getattr(settings, 'RISK_WEIGHTS', {}), **(weights or {})}
+        self.weather_radius_km = weather_radius_km or getattr(settings, 'RISK_WEATHER_RADIUS_KM', 300)
+        self.alert_radius_km = alert_radius_km or getattr(settings, 'RISK_ALERT_RADIUS_KM', 500)
+        self.chunk_size = chunk_size or getattr(settings, 'RISK_CHUNK_SIZE', 4096)
+
+    def score(self, context, latitudes, longitudes, speeds, headings, destinations):
+        """درجات المخاطر لمصفوفات السفن - destinations مواقع الموانئ في context (-1 بلا وجهة)"""
+        latitudes = np.asarray(latitudes, dtype=np.float64)
+        scores = np.empty(len(latitudes))
+        # المصفوفات ships × ports تُحسب على أجزاء حتى لا تكبر الذاكرة مع حجم الأسطول
+        for start in range(0, len(latitudes), self.chunk_size):
+            stop = start + self.chunk_size
+            scores[start:stop] = self._score_chunk(
+                context, latitudes[start:stop], np.asarray(longitudes[start:stop], dtype=np.float64),
+                np.asarray(speeds[start:stop], dtype=np.float64), np.asarray(headings[start:stop], dtype=np.float64),
+                np.asarray(destinations[start:stop], dtype=np.int64),
+            )
+        return scores
+
+    @staticmethod
+    def _proximity(dot, radius_km):
+        """exp(-d/radius) حيث d مسافة الدائرة العظمى المحسوبة من جيب تمام الزاوية"""
+        return np.exp(np.arccos(dot) * np.float32(-EARTH_RADIUS_KM / radius_km))
+
+    def _score_chunk(self, context, latitudes, longitudes, speeds, headings, destinations):
+        count = len(latitudes)
+        located = ~(np.isnan(latitudes) | np.isnan(longitudes))
+        lat = np.where(located, latitudes, 0.0)
+        lon = np.where(located, longitudes, 0.0)
+
+        # 1. السرعة (عقدة): خطر من 18 ويبلغ أقصاه عند 30
+        speed_risk = np.clip((np.nan_to_num(speeds, nan=0.0) - 18.0) / 12.0, 0.0, 1.0)
+
+        weather_risk = np.zeros(count)
+        alert_risk = np.zeros(count)
+        destination_risk = np.zeros(count)
+        voyage_risk = np.zeros(count)
+
+        if len(context):
+            # المسافات ships × ports بضرب مصفوفات (BLAS) بدل دوال مثلثية لكل زوج،
+            # وتدخل فقط الموانئ التي لها خطر فعلي
+            vectors = unit_vectors(lat, lon).astype(np.float32)
+
+            # 2. طقس الموانئ القريبة: أسوأ قيمة مضروبة في تلاشٍ أُسّي مع المسافة
+            risky = context.weather_risk > 0
+            if risky.any():
+                decay = self._proximity(np.clip(vectors @ context.vectors[risky].T, -1.0, 1.0), self.weather_radius_km)
+                weather_risk = (context.weather_risk[risky].astype(np.float32)[None, :] * decay).max(axis=1)
+
+            # 3. الإنذارات النشطة: نصف الوزن دائماً والنصف الآخر حسب التوجه نحو الميناء
+            alerted = context.alert_risk > 0
+            if alerted.any():
+                port_vectors = context.vectors[alerted]
+                dot = np.clip(vectors @ port_vectors.T, -1.0, 1.0)
+                proximity = self._proximity(dot, self.alert_radius_km)
+                # جيب تمام الفرق بين الاتجاه واتجاه الميناء = مسقط متجه الميناء على متجه الاتجاه / جيب الزاوية
+                along = heading_vectors(lat, lon, np.nan_to_num(headings, nan=0.0)).astype(np.float32) @ port_vectors.T
+                toward = np.clip(along / np.maximum(np.sqrt(1.0 - dot * dot), np.float32(1e-6)), 0.0, 1.0)
+                toward = np.where(np.isnan(headings)[:, None], 0.5, toward)
+                alert_risk = (context.alert_risk[alerted].astype(np.float32)[None, :] * proximity * (0.5 + 0.5 * toward)).max(axis=1)
+
+            # 4. ميناء الوجهة: طقسه وإنذاره يزيدان كلما اقتربت السفينة منه
+            has_destination = destinations >= 0
+            if has_destination.any():
+                rows = np.nonzero(has_destination)[0]
+                columns = destinations[has_destination]
+                remaining = haversine_km_array(
+                    lat[rows], lon[rows], context.latitudes[columns], context.longitudes[columns]
+                )
+                port_risk = np.maximum(context.weather_risk[columns], context.alert_risk[columns])
+                destination_risk[rows] = port_risk * np.exp(-remaining / self.weather_radius_km)
+                # 5. الرحلة الطويلة المتبقية تزيد الخطر قليلاً
+                voyage_risk[rows] = np.clip(remaining / 5000.0, 0.0, 1.0)
+
+        factors = (
+            self.weights['speed'] * speed_risk,
+            self.weights['weather'] * np.where(located, weather_risk, 0.0),
+            self.weights['alert'] * np.where(located, alert_risk, 0.0),
+            self.weights['destination'] * np.where(located, destination_risk, 0.0),
+            self.weights['voyage'] * np.where(located, voyage_risk, 0.0),
+        )
+        safe = np.ones(count)
+        for factor in factors:
+            safe *= 1.0 - np.clip(factor, 0.0, 1.0)
+        return np.round(1.0 - safe, 4)
+
+    def score_vessels(self, vessels, context=None):
+        """درجات مخاطر لقائمة سفن (قواميس lat/lon/speed/heading/destination_port_id) بتمرير واحد"""
+        context = context or PortContext.load()
+        scores = self.score(
+            context,
+            _float_array([vessel.get('lat') for vessel in vessels]),
+            _float_array([vessel.get('lon') for vessel in vessels]),
+            _float_array([vessel.get('speed') for vessel in vessels]),
+            _float_array([vessel.get('heading') for vessel in vessels]),
+            context.positions([vessel.get('destination_port_id') for vessel in vessels]),
+        )
+        return scores.tolist()
+
+    def score_point(self, latitude, longitude, speed=None, heading=None, destination_port_id=None, context=None):
+        """درجة مخاطر لموقع واحد"""
+        return self.score_vessels([{
+            'lat': latitude, 'lon': longitude, 'speed': speed, 'heading': heading,
+            'destination_port_id': destination_port_id,
+        }], context)[0]
+
+    def rescore_fleet(self, queryset=None, context=None):
+        """إعادة حساب risk_score لكل الأسطول في تمرير واحد ثم كتابتها دفعة واحدة"""
+        from .models import Ship
+
+        started = time.perf_counter()
+        context = context or PortContext.load()
+        rows = list((queryset if queryset is not None else Ship.objects.all()).order_by().values_list(
+            'id', 'current_latitude', 'current_longitude', 'current_speed', 'current_heading', 'destination_port_id',
+            'risk_score',
+        ))
+        load_ms = (time.perf_counter() - started) * 1000
+
+        compute_started = time.perf_counter()
+        ids, latitudes, longitudes, speeds, headings, destinations, previous = zip(*rows) if rows else ((),) * 7
+        scores = self.score(
+            context, _float_array(latitudes), _float_array(longitudes), _float_array(speeds),
+            _float_array(headings), context.positions(destinations),
+        )
+        compute_ms = (time.perf_counter() - compute_started) * 1000
+
+        write_started = time.perf_counter()
+        now = timezone.now()
+        chunk_size = getattr(settings, 'FLEET_REFRESH_CHUNK_SIZE', 500)
+        # الدرجات المتغيرة فقط تمر بـ bulk_update، والباقي يأخذ وقت التقييم بتحديث واحد لكل دفعة
+        changed = []
+        unchanged = []
+        for ship_id, score, old in zip(ids, scores.tolist(), previous):
+            if old != score:
+                changed.append(Ship(id=ship_id, risk_score=score, risk_updated_at=now))
+            else:
+                unchanged.append(ship_id)
+        with transaction.atomic():
+            Ship.objects.bulk_update(changed, ['risk_score', 'risk_updated_at'], batch_size=chunk_size)
+            for start in range(0, len(unchanged), chunk_size):
+                Ship.objects.filter(id__in=unchanged[start:start + chunk_size]).update(risk_updated_at=now)
+        write_ms = (time.perf_counter() - write_started) * 1000
+
+        return {
+            'ships': len(ids),
+            'changed': len(changed),
+            'ports': len(context),
+            'max_risk': float(scores.max()) if len(scores) else 0.0,
+            'timings': {
+                'load_ms': round(load_ms, 2),
+                'compute_ms': round(compute_ms, 2),
+                'write_ms': round(write_ms, 2),
+            },
+        }
@@ -18,18 +18,24 @@ class ShipSerializer(serializers.ModelSerializer):
             'current_latitude', 'current_longitude', 
             'current_speed', 'current_heading', 'status',
             'destination_port', 'destination_port_name', 'destination_name',
-            'expected_arrival', 'tracked_by', 'tracked_by_count',
+            'expected_arrival', 'predicted_arrival', 'tracked_by', 'tracked_by_count',
             'is_tracked_by_current_user', 'last_updated', 'created_at',
-            'length', 'width', 'draft'
+            'length', 'width', 'draft', 'risk_score', 'risk_updated_at'
         ]
-        read_only_fields = ('last_updated', 'created_at')
+        read_only_fields = ('last_updated', 'created_at', 'predicted_arrival', 'risk_score', 'risk_updated_at')
+    
+    # القيم المحسوبة من Ship.objects.with_tracking() تُستخدم إن وُجدت بدلاً من استعلام لكل سفينة
     
     def get_tracked_by_count(self, obj):
+        if hasattr(obj, 'tracked_by_count'):
+            return obj.tracked_by_count
         return obj.tracked_by.count()
     
     def get_is_tracked_by_current_user(self, obj):
         request = self.context.get('request')
         if request and request.user.is_authenticated:
+            if hasattr(obj, 'is_tracked'):
+                return obj.is_tracked
             return obj.tracked_by.filter(id=request.user.id).exists()
         return False
 
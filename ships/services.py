@@ -1,11 +1,83 @@
-import requests
 import time
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from django.conf import settings
 from django.utils import timezone
 import random
 import hashlib
+from portflow_ai.caching import ReadThroughCache
+from portflow_ai.http_client import get_transport
 
 
+class RateLimiter:
+    """محدد معدل مشترك (token bucket) لطلبات المزوّد من جميع الخيوط"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate or 0)
+        self.capacity = float(burst or max(1.0, self.rate))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """انتظار حتى يتوفر رمز واحد - بدون حد إذا كان المعدل صفراً"""
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+_provider_limiter = None
+_provider_limiter_lock = threading.Lock()
+
+
+def get_provider_rate_limiter():
+    """محدد المعدل المشترك لـ MarineTraffic (يُنشأ مرة واحدة لكل عملية)"""
+    global _provider_limiter
+    with _provider_limiter_lock:
+        if _provider_limiter is None:
+            _provider_limiter = RateLimiter(
+                getattr(settings, 'MARINETRAFFIC_RATE_LIMIT', 10),
+                getattr(settings, 'MARINETRAFFIC_RATE_BURST', None),
+            )
+        return _provider_limiter
+
+
+_position_cache = None
+_position_cache_lock = threading.Lock()
+
+
+def get_position_cache():
+    """ذاكرة مواقع السفن المؤقتة حسب IMO (تُنشأ مرة واحدة لكل عملية)"""
+    global _position_cache
+    with _position_cache_lock:
+        if _position_cache is None:
+            config = getattr(settings, 'SHIP_POSITION_CACHE', {})
+            backend = config.get('BACKEND', 'local')
+            _position_cache = ReadThroughCache(
+                'ship_position',
+                ttl=config.get('TTL', 60),
+                stale_ttl=config.get('STALE_TTL', 240),
+                max_entries=config.get('MAX_ENTRIES', 10000) if backend == 'local' else None,
+                backend=backend,
+                cache_alias=config.get('CACHE_ALIAS', 'default'),
+            )
+        return _position_cache
+
+
+def _chunked(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
 
 class MarineTrafficService:
     def __init__(self):
@@ -19,7 +91,8 @@ class MarineTrafficService:
             if self._is_valid_api_key():
                 # فقط مع API حقيقي نذهب لـ MarineTraffic
                 url = f"{self.base_url}/exportvessel/v:5/{self.api_key}/imo:{imo_number}/protocol:json"
-                response = requests.get(url, timeout=10)
+                get_provider_rate_limiter().acquire()
+                response = get_transport().get(url, timeout=10)
 
                 if response.status_code == 200:
                     data = response.json()
@@ -56,6 +129,13 @@ class MarineTrafficService:
             demo_data['source'] = 'demo_error'
             return demo_data
 
+    def get_cached_position(self, imo_number):
+        """موقع السفينة عبر الذاكرة المؤقتة - الطلبات المتزامنة لنفس IMO تشترك في جلب واحد"""
+        position_data = get_position_cache().get_or_fetch(
+            str(imo_number), lambda: self.get_ship_position(imo_number)
+        )
+        return dict(position_data) if position_data else position_data
+
     def _is_valid_api_key(self):
         return (
             self.api_key
@@ -122,47 +202,203 @@ class MarineTrafficService:
             'source': 'demo_mode'
         }
     
-    def update_ship_positions(self):
-        """تحديث مواقع جميع السفن في قاعدة البيانات"""
+    POSITION_FIELDS = [
+        'current_latitude', 'current_longitude', 'current_speed',
+        'current_heading', 'status', 'destination_name', 'last_updated',
+        'grid_cell',
+    ]
+
+    def _fetch_position_timed(self, imo_number):
+        """جلب موقع سفينة واحدة مع قياس الزمن - يُنفَّذ داخل خيوط المجمّع"""
+        started = time.monotonic()
+        try:
+            position_data = self.get_ship_position(imo_number)
+            error = None
+        except Exception as e:
+            position_data = None
+            error = str(e)
+        elapsed_ms = (time.monotonic() - started) * 1000
+        return position_data, elapsed_ms, error
+
+    def update_ship_positions(self, chunk_size=None, max_workers=None, progress=None):
+        """تحديث مواقع جميع السفن في قاعدة البيانات
+
+        الجلب يتم بالتوازي عبر مجمّع خيوط محدود، ومعدل الطلبات يضبطه
+        محدد المعدل المشترك بدلاً من الانتظار الثابت، والكتابة تتم
+        بعملية bulk_update واحدة لكل دفعة.
+        progress (من طابور المهام jobs.queue) يُستدعى بعد كل دفعة.
+        """
         from .models import Ship
-        
-        ships = Ship.objects.all()
+        from .history import PositionHistory
+
+        history = PositionHistory()
+        chunk_size = chunk_size or getattr(settings, 'FLEET_REFRESH_CHUNK_SIZE', 500)
+        max_workers = max_workers or getattr(settings, 'FLEET_REFRESH_WORKERS', 8)
+
+        started = time.monotonic()
+        total_ships = Ship.objects.count()
+        ship_ids = list(
+            Ship.objects.exclude(imo_number='').order_by('id').values_list('id', flat=True)
+        )
+
         updated_count = 0
+        processed = 0
         results = []
-        
-        for ship in ships:
-            if not ship.imo_number:
-                continue
-                
-            position_data = self.get_ship_position(ship.imo_number)
-            if position_data and position_data.get('latitude'):
-                # تحديث بيانات السفينة
-                ship.current_latitude = position_data['latitude']
-                ship.current_longitude = position_data['longitude']
-                ship.current_speed = position_data['speed']
-                ship.current_heading = position_data['heading']
-                ship.status = position_data.get('status', 'Underway')
-                ship.destination_name = position_data.get('destination_name', '')
-                ship.last_updated = timezone.now()
-                ship.save()
-                
-                updated_count += 1
-                results.append({
-                    'ship': ship.name,
-                    'imo': ship.imo_number,
-                    'position': f"{position_data['latitude']}, {position_data['longitude']}",
-                    'destination': position_data.get('destination_name', 'Unknown'),
-                    'source': position_data.get('source', 'unknown')
-                })
-                
-            # تجنب حظر API - انتظر قليلاً بين الطلبات
-            time.sleep(0.1)
-        
+        errors = []
+        timings = defaultdict(lambda: {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+        db_write_ms = 0.0
+
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            for id_chunk in _chunked(ship_ids, chunk_size):
+                ships = list(Ship.objects.filter(id__in=id_chunk))
+                fetched = pool.map(
+                    self._fetch_position_timed, [ship.imo_number for ship in ships]
+                )
+
+                to_update = []
+                fixes = []
+                now = timezone.now()
+                for ship, (position_data, elapsed_ms, error) in zip(ships, fetched):
+                    source = (position_data or {}).get('source', 'error' if error else 'unknown')
+                    timing = timings[source]
+                    timing['count'] += 1
+                    timing['total_ms'] += elapsed_ms
+                    timing['max_ms'] = max(timing['max_ms'], elapsed_ms)
+
+                    if error:
+                        errors.append({'ship': ship.name, 'imo': ship.imo_number, 'error': error})
+                        continue
+
+                    if position_data and position_data.get('latitude'):
+                        get_position_cache().set(str(ship.imo_number), position_data)
+                        # تحديث بيانات السفينة
+                        ship.current_latitude = position_data['latitude']
+                        ship.current_longitude = position_data['longitude']
+                        ship.current_speed = position_data['speed']
+                        ship.current_heading = position_data['heading']
+                        ship.status = position_data.get('status', 'Underway')
+                        ship.destination_name = position_data.get('destination_name', '')
+                        ship.last_updated = now
+                        ship.refresh_grid_cell()
+                        to_update.append(ship)
+                        fixes.append(history.fix_from_position(ship, position_data, now))
+
+                        results.append({
+                            'ship': ship.name,
+                            'imo': ship.imo_number,
+                            'position': f"{position_data['latitude']}, {position_data['longitude']}",
+                            'destination': position_data.get('destination_name', 'Unknown'),
+                            'source': source
+                        })
+
+                if to_update:
+                    write_started = time.monotonic()
+                    Ship.objects.bulk_update(to_update, self.POSITION_FIELDS)
+                    history.ingest(fixes)
+                    db_write_ms += (time.monotonic() - write_started) * 1000
+                    updated_count += len(to_update)
+
+                processed += len(id_chunk)
+                if progress:
+                    progress(
+                        0.95 * processed / len(ship_ids), f"{processed}/{len(ship_ids)} ships",
+                        partial={'processed': processed, 'updated_count': updated_count, 'errors': len(errors)},
+                        timings={'db_write_ms': round(db_write_ms, 2)},
+                    )
+
+        # أوقات الوصول المتوقعة من المواقع الجديدة
+        from .eta import EtaEngine
+        eta = EtaEngine().update_fleet()
+        if progress:
+            progress(1.0, "ETA updated", timings={'eta_ms': round(sum(eta['timings'].values()), 2)})
+
+        elapsed_s = time.monotonic() - started
+        for timing in timings.values():
+            timing['avg_ms'] = round(timing['total_ms'] / timing['count'], 2)
+            timing['total_ms'] = round(timing['total_ms'], 2)
+            timing['max_ms'] = round(timing['max_ms'], 2)
+
         return {
             'updated_count': updated_count,
-            'total_ships': ships.count(),
-            'results': results
+            'total_ships': total_ships,
+            'results': results,
+            'errors': errors,
+            'eta_changed': eta['changed'],
+            'timings': {
+                'sources': dict(timings),
+                'db_write_ms': round(db_write_ms, 2),
+                'eta': eta['timings'],
+                'elapsed_ms': round(elapsed_s * 1000, 2),
+                'ships_per_second': round(len(ship_ids) / elapsed_s, 2) if elapsed_s else None,
+                'http': get_transport().stats(),
+                'position_cache': get_position_cache().stats(),
+            },
+        }
+    
+    ZONE_FIELDS = [
+        'id', 'name', 'imo_number', 'type', 'current_latitude', 'current_longitude',
+        'current_speed', 'current_heading', 'status', 'destination_name', 'last_updated',
+    ]
+
+    def _zone_vessel(self, ship, distance_km=None):
+        vessel = {
+            'id': ship.id,
+            'name': ship.name,
+            'imo': ship.imo_number,
+            'type': ship.type,
+            'latitude': ship.current_latitude,
+            'longitude': ship.current_longitude,
+            'speed': ship.current_speed,
+            'heading': ship.current_heading,
+            'status': ship.status,
+            'destination_name': ship.destination_name,
+            'last_updated': ship.last_updated,
+        }
+        if distance_km is not None:
+            vessel['distance_km'] = round(distance_km, 3)
+        return vessel
+
+    def get_vessels_in_zone(self, north, south, east, west, limit=None):
+        """السفن داخل منطقة من المواقع المخزنة عبر الفهرس المكاني (grid_cell)
+
+        west > east يعني منطقة تعبر خط الطول 180.
+        """
+        from .models import Ship
+
+        limit = limit or getattr(settings, 'ZONE_QUERY_MAX_RESULTS', 1000)
+        ships = Ship.objects.only(*self.ZONE_FIELDS).in_bbox(
+            float(south), float(west), float(north), float(east)
+        ).order_by('id')[:limit + 1]
+        vessels = [self._zone_vessel(ship) for ship in ships]
+        return {
+            'count': min(len(vessels), limit),
+            'truncated': len(vessels) > limit,
+            'vessels': vessels[:limit],
+        }
+
+    def get_vessels_near(self, latitude, longitude, radius_km, limit=None):
+        """السفن ضمن نصف قطر (كم) من نقطة، الأقرب أولاً"""
+        from .models import Ship
+
+        limit = limit or getattr(settings, 'ZONE_QUERY_MAX_RESULTS', 1000)
+        matches = Ship.objects.only(*self.ZONE_FIELDS).near(float(latitude), float(longitude), float(radius_km))
+        return {
+            'count': min(len(matches), limit),
+            'truncated': len(matches) > limit,
+            'vessels': [self._zone_vessel(ship, distance) for ship, distance in matches[:limit]],
         }
+
+    def get_vessel_history(self, imo_number, days=7, start=None, end=None, resolution='auto'):
+        """مسار السفينة من سجل المواقع المخزن (آخر `days` يوم أو بين start و end)"""
+        from .models import Ship
+        from .history import PositionHistory
+
+        ship = Ship.objects.filter(imo_number=imo_number).first()
+        if ship is None:
+            return None
+        end = end or timezone.now()
+        start = start or end - timezone.timedelta(days=float(days))
+        return PositionHistory().trajectory(ship, start, end, resolution)
     
     def get_ship_details(self, imo_number):
         """جلب تفاصيل شاملة عن السفينة"""
@@ -194,7 +430,8 @@ class ShipSearchService:
             
             # البحث الحقيقي في MarineTraffic
             url = f"{self.base_url}/exportvessel/v:5/{self.api_key}/imo:{imo_number}/protocol:json"
-            response = requests.get(url, timeout=10)
+            get_provider_rate_limiter().acquire()
+            response = get_transport().get(url, timeout=10)
             
             if response.status_code == 200:
                 data = response.json()
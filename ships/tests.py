@@ -1,3 +1,197 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+from unittest import mock
+
+from django.contrib.auth import get_user_model
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .eta import EtaEngine
+from .geo import GRID_COLUMNS, grid_cell, grid_cell_ranges, radius_bbox
+from .history import PositionHistory
+from .models import Port, Ship, ShipTrackDay
+from .risk import RiskEngine
+from .services import RateLimiter
+
+
+class PositionHistoryTests(TestCase):
+    """سجل المواقع يقبل قيم المزود كنصوص ويدمجها في ملخص اليوم كأرقام"""
+
+    def setUp(self):
+        self.ship = Ship.objects.create(name="Atlas", imo_number="9000001")
+        self.history = PositionHistory(bucket_minutes=15)
+        self.day = datetime(2026, 3, 1, 6, tzinfo=dt_timezone.utc)
+
+    def fix(self, minutes, speed, heading='90'):
+        return PositionHistory.fix_from_position(
+            self.ship, {'latitude': '10.0', 'longitude': str(minutes / 100), 'speed': speed, 'heading': heading},
+            timestamp=self.day + timedelta(minutes=minutes),
+        )
+
+    def test_provider_strings_are_coerced(self):
+        fix = self.fix(0, '12.3')
+        self.assertEqual((fix.speed, fix.heading), (12.3, 90.0))
+        self.assertIsNone(self.fix(0, 'n/a').speed)
+        self.assertIsNone(self.fix(0, None).speed)
+
+    def test_max_speed_is_numeric_across_batches(self):
+        # "9.1" > "12.3" كنصوص - الدفعة الثانية تقرأ اليوم من قاعدة البيانات
+        self.history.ingest([self.fix(0, '12.3')])
+        self.history.ingest([self.fix(30, '9.1'), self.fix(60, 'bad')])
+
+        track_day = ShipTrackDay.objects.get(ship=self.ship)
+        self.assertEqual(track_day.fix_count, 3)
+        self.assertEqual(track_day.max_speed, 12.3)
+
+
+class EtaEngineTests(TestCase):
+    """التقدير يُكتب في predicted_arrival ويبقى expected_arrival هو الموعد المخطط"""
+
+    def test_prediction_does_not_move_the_planned_arrival(self):
+        port = Port.objects.create(name="Nouadhibou", country="MR", city="Nouadhibou", latitude=20.9, longitude=-17.0, code="MRNDB")
+        planned = timezone.now() - timedelta(hours=2)
+        ship = Ship.objects.create(
+            name="Atlas", imo_number="9000001", destination_port=port, expected_arrival=planned,
+            current_latitude=20.0, current_longitude=-17.0, current_speed=12,
+        )
+
+        result = EtaEngine().update_fleet()
+
+        ship.refresh_from_db()
+        self.assertEqual(result['changed'], 1)
+        self.assertEqual(ship.expected_arrival, planned)
+        # ~100 كم بسرعة 12 عقدة
+        self.assertAlmostEqual((ship.predicted_arrival - timezone.now()).total_seconds() / 3600, 4.5, delta=0.2)
+
+
+class RiskRescoreTests(TestCase):
+
+    def test_every_rescored_ship_records_evaluation_time(self):
+        Ship.objects.create(name="Atlas", imo_number="9000001", current_latitude=20.0, current_longitude=-17.0, current_speed=12)
+        Ship.objects.create(name="Boreas", imo_number="9000002")
+
+        self.assertEqual(RiskEngine().rescore_fleet()['changed'], 2)
+        first = dict(Ship.objects.values_list('imo_number', 'risk_updated_at'))
+        self.assertTrue(all(first.values()))
+
+        result = RiskEngine().rescore_fleet()
+        self.assertEqual((result['ships'], result['changed']), (2, 0))
+        for imo, evaluated_at in Ship.objects.values_list('imo_number', 'risk_updated_at'):
+            self.assertGreater(evaluated_at, first[imo])
+
+
+class VesselHistoryViewTests(TestCase):
+
+    def setUp(self):
+        Ship.objects.create(name="Atlas", imo_number="9000001")
+        self.client = APIClient()
+        self.client.force_authenticate(get_user_model().objects.create_user(username="viewer", password="x"))
+
+    def get(self, **params):
+        return self.client.get('/api/ships/mst/vessel-history/', {'imo': '9000001', **params})
+
+    def test_rejects_unbounded_days(self):
+        for days in ('inf', 'nan', '1e12', '0', '-3'):
+            self.assertEqual(self.get(days=days).status_code, 400, days)
+        self.assertEqual(self.get(days='30').status_code, 200)
+
+    def test_rejects_reversed_window(self):
+        response = self.get(start='2026-03-02T00:00:00Z', end='2026-03-01T00:00:00Z')
+        self.assertEqual(response.status_code, 400)
+
+    def test_rejects_impossible_dates(self):
+        for params in ({'start': '2026-13-01T00:00:00'}, {'end': '2026-02-30T00:00:00Z'}, {'start': 'yesterday'}):
+            response = self.get(**params)
+            self.assertEqual(response.status_code, 400, params)
+            self.assertEqual(response.data, {"error": "start/end must be ISO 8601 datetimes"})
+
+
+class AntimeridianTests(TestCase):
+    """خط الطول 180 و -180 نقطة واحدة في العمود 0 من الشبكة"""
+
+    def setUp(self):
+        self.east, self.west = (
+            Ship.objects.create(name=name, imo_number=imo, current_latitude=-17.0, current_longitude=lon)
+            for name, imo, lon in (("East", "9000001", 180.0), ("West", "9000002", -180.0))
+        )
+
+    def test_grid_ranges_include_column_zero_for_east_edge(self):
+        self.assertEqual(grid_cell(-17.0, 180.0), grid_cell(-17.0, -180.0))
+        row = grid_cell(-17.0, 0.0) - GRID_COLUMNS // 2
+        self.assertEqual(grid_cell_ranges(-16.9, 179.5, -16.1, 180.0), [(row, row), (row + 359, row + 359)])
+
+    def test_bbox_and_radius_at_the_antimeridian(self):
+        ids = {self.east.id, self.west.id}
+        self.assertEqual(set(Ship.objects.in_bbox(-18.0, 179.0, -16.0, 180.0).values_list('id', flat=True)), ids)
+        self.assertEqual(set(Ship.objects.in_bbox(-18.0, -180.0, -16.0, -179.0).values_list('id', flat=True)), ids)
+
+        # radius_bbox لا يلتف إذا انتهت الدائرة عند 180 تماماً
+        lon = 180.0 - radius_bbox(-17.0, 0.0, 50)[3]
+        bbox = radius_bbox(-17.0, lon, 50)
+        self.assertEqual(bbox[3], 180.0)
+        self.assertEqual(set(Ship.objects.in_bbox(*bbox).values_list('id', flat=True)), ids)
+
+
+class RateLimiterTests(TestCase):
+    """الحد يسمح بدفعة burst فوراً ثم رمز كل 1/rate ثانية"""
+
+    def setUp(self):
+        self.clock = [100.0]
+        self.slept = []
+
+        def sleep(seconds):
+            self.slept.append(seconds)
+            self.clock[0] += seconds
+
+        for name, fake in (('monotonic', lambda: self.clock[0]), ('sleep', sleep)):
+            patcher = mock.patch(f'ships.services.time.{name}', side_effect=fake)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_burst_then_steady_rate(self):
+        limiter = RateLimiter(rate=2, burst=3)
+        for _ in range(3):
+            limiter.acquire()
+        self.assertEqual(self.slept, [])
+
+        limiter.acquire()
+        limiter.acquire()
+        self.assertAlmostEqual(sum(self.slept), 1.0)
+
+        # التوقف يعيد ملء الرموز حتى السعة فقط
+        self.clock[0] += 60
+        self.slept.clear()
+        for _ in range(3):
+            limiter.acquire()
+        self.assertEqual(self.slept, [])
+        limiter.acquire()
+        self.assertAlmostEqual(sum(self.slept), 0.5)
+
+    def test_zero_rate_is_unlimited(self):
+        limiter = RateLimiter(rate=0)
+        for _ in range(100):
+            limiter.acquire()
+        self.assertEqual(self.slept, [])
+
+
+class WithTrackingTests(TestCase):
+    """قائمة الأسطول باستعلامين مهما كان عدد السفن والمتابعين"""
+
+    def test_query_count_does_not_grow_with_the_fleet(self):
+        port = Port.objects.create(name="Nouadhibou", country="MR", city="Nouadhibou", latitude=20.9, longitude=-17.0, code="MRNDB")
+        users = [get_user_model().objects.create_user(username=f"u{i}", password="x") for i in range(3)]
+        for i in range(6):
+            ship = Ship.objects.create(name=f"Ship {i}", imo_number=f"900000{i}", destination_port=port)
+            ship.tracked_by.add(*users[:i % 4])
+
+        with self.assertNumQueries(2):
+            rows = [
+                (ship.name, ship.destination_port.code, ship.tracked_by_count, ship.is_tracked,
+                 sorted(user.id for user in ship.tracked_by.all()))
+                for ship in Ship.objects.with_tracking(users[0]).order_by('name')
+            ]
 
-# Create your tests here.
+        self.assertEqual([row[2] for row in rows], [0, 1, 2, 3, 0, 1])
+        self.assertEqual([row[3] for row in rows], [False, True, True, True, False, True])
+        self.assertEqual(rows[3][4], sorted(user.id for user in users))
+        self.assertTrue(all(row[1] == "MRNDB" for row in rows))
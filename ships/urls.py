@@ -18,6 +18,7 @@ urlpatterns = [
     
     # MarineTraffic
     path('positions/update/', views.UpdateShipPositionsView.as_view(), name='update-positions'),
+    path('positions/cache-stats/', views.PositionCacheStatsView.as_view(), name='position-cache-stats'),
     path('positions/<str:imo_number>/', views.ShipPositionView.as_view(), name='ship-position'),
     path('tracking/<int:ship_id>/', views.ShipTrackingView.as_view(), name='ship-tracking'),
     
@@ -28,6 +29,7 @@ urlpatterns = [
     # MyShipTracking proxy
     path('mst/vessel-status/', views.MSTVesselStatusView.as_view(), name='mst-vessel-status'),
     path('mst/vessels-in-zone/', views.MSTVesselsInZoneView.as_view(), name='mst-vessels-in-zone'),
+    path('mst/vessels-near/', views.MSTVesselsNearView.as_view(), name='mst-vessels-near'),
     path('mst/vessel-history/', views.MSTVesselHistoryView.as_view(), name='mst-vessel-history'),
     path('mst/port-search/', views.MSTPortSearchView.as_view(), name='mst-port-search'),
     path('mst/port-details/', views.MSTPortDetailsView.as_view(), name='mst-port-details'),
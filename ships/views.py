@@ -2,11 +2,14 @@ from rest_framework import generics
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.views import APIView
 from rest_framework.response import Response
+from django.conf import settings
 from django.db.models import Q
 from .models import Port, Ship
 from .serializers import PortSerializer, ShipSerializer
 from .services import MarineTrafficService
+from .history import PositionHistory
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 
 class PortListCreateView(generics.ListCreateAPIView):
     permission_classes = [IsAuthenticated]
@@ -42,7 +45,7 @@ class ShipListCreateView(generics.ListCreateAPIView):
     serializer_class = ShipSerializer
     
     def get_queryset(self):
-        queryset = Ship.objects.all()
+        queryset = Ship.objects.with_tracking(self.request.user)
         
         search = self.request.query_params.get('search', None)
         ship_type = self.request.query_params.get('type', None)
@@ -79,10 +82,10 @@ class SearchShipView(APIView):
         search_service = MarineTrafficService()
         
         if search_type == 'imo':
-            ship_data = search_service.get_ship_position(query)
+            ship_data = search_service.get_cached_position(query)
         else:
             # بحث بالاسم - نستخدم IMO مؤقتاً
-            ship_data = search_service.get_ship_position(query)
+            ship_data = search_service.get_cached_position(query)
         
         if ship_data:
             # حفظ السفينة في قاعدة البيانات للمستخدم
@@ -152,8 +155,8 @@ class UserTrackedShipsView(APIView):
     
     def get(self, request):
         user = request.user
-        tracked_ships = user.tracked_ships.all()
-        serializer = ShipSerializer(tracked_ships, many=True)
+        tracked_ships = Ship.objects.filter(tracked_by=user).with_tracking(user)
+        serializer = ShipSerializer(tracked_ships, many=True, context={'request': request})
         return Response(serializer.data)
 
 class ShippingStatsView(APIView):
@@ -186,17 +189,27 @@ class UpdateShipPositionsView(APIView):
         if not request.user.is_staff:
             return Response({"error": "Permission denied"}, status=403)
         
-        service = MarineTrafficService()
-        result = service.update_ship_positions()
+        # التحديث يعمل في عامل طابور المهام - الحالة والتقدم عبر status_url
+        from jobs.views import enqueued_response
+        return enqueued_response('refresh_fleet_positions', request)
+
+class PositionCacheStatsView(APIView):
+    """إحصائيات ذاكرة المواقع المؤقتة (hits/misses)"""
+    permission_classes = [IsAuthenticated]
+    
+    def get(self, request):
+        if not request.user.is_staff:
+            return Response({"error": "Permission denied"}, status=403)
         
-        return Response({"message": result})
+        from .services import get_position_cache
+        return Response(get_position_cache().stats())
 
 class ShipPositionView(APIView):
     permission_classes = [IsAuthenticated]
     
     def get(self, request, imo_number):
         service = MarineTrafficService()
-        position_data = service.get_ship_position(imo_number)
+        position_data = service.get_cached_position(imo_number)
         
         if position_data:
             return Response(position_data)
@@ -213,7 +226,7 @@ class ShipTrackingView(APIView):
         try:
             ship = Ship.objects.get(id=ship_id)
             service = MarineTrafficService()
-            position_data = service.get_ship_position(ship.imo_number)
+            position_data = service.get_cached_position(ship.imo_number)
             
             response_data = {
                 'ship': {
@@ -242,6 +255,7 @@ class ShipTrackingView(APIView):
                     ship.current_heading = position_data['heading']
                     ship.last_updated = timezone.now()
                     ship.save()
+                    PositionHistory().ingest([PositionHistory.fix_from_position(ship, position_data, ship.last_updated)])
             
             return Response(response_data)
             
@@ -325,7 +339,7 @@ class MSTVesselStatusView(APIView):
         if not imo:
             return Response({"error": "IMO number is required"}, status=400)
             
-        status = service.get_ship_position(imo)
+        status = service.get_cached_position(imo)
         return Response(status)
 
 class MSTVesselsInZoneView(APIView):
@@ -343,10 +357,36 @@ class MSTVesselsInZoneView(APIView):
         
         if not all([north, south, east, west]):
             return Response({"error": "All zone boundaries (north, south, east, west) are required"}, status=400)
+        
+        try:
+            north, south, east, west = float(north), float(south), float(east), float(west)
+        except ValueError:
+            return Response({"error": "Zone boundaries must be numbers"}, status=400)
+        if not (-90 <= south <= north <= 90 and -180 <= west <= 180 and -180 <= east <= 180):
+            return Response({"error": "Invalid zone: need -90 <= south <= north <= 90 and longitudes in [-180, 180] (west > east crosses the antimeridian)"}, status=400)
             
         vessels = service.get_vessels_in_zone(north, south, east, west)
         return Response(vessels)
 
+class MSTVesselsNearView(APIView):
+    """Get stored vessels within a radius (km) of a point"""
+    permission_classes = [IsAuthenticated]
+    
+    def get(self, request):
+        service = MarineTrafficService()
+        
+        try:
+            lat = float(request.GET['lat'])
+            lon = float(request.GET['lon'])
+            radius_km = float(request.GET.get('radius_km', 50))
+        except (KeyError, ValueError):
+            return Response({"error": "lat and lon are required numbers (radius_km optional)"}, status=400)
+        if not (-90 <= lat <= 90 and -180 <= lon <= 180 and 0 < radius_km <= 20000):
+            return Response({"error": "Invalid point or radius"}, status=400)
+        
+        vessels = service.get_vessels_near(lat, lon, radius_km)
+        return Response(vessels)
+
 class MSTVesselHistoryView(APIView):
     """Get vessel position history from MyShipTracking"""
     permission_classes = [IsAuthenticated]
@@ -355,11 +395,38 @@ class MSTVesselHistoryView(APIView):
         service = MarineTrafficService()
         imo = request.GET.get('imo')
         days = request.GET.get('days', 7)  # default to 7 days
+        resolution = request.GET.get('resolution', 'auto')  # auto, raw or daily
         
         if not imo:
             return Response({"error": "IMO number is required"}, status=400)
+        if resolution not in ('auto', 'raw', 'daily'):
+            return Response({"error": "resolution must be auto, raw or daily"}, status=400)
+        
+        max_days = getattr(settings, 'HISTORY_MAX_DAYS', 366)
+        try:
+            days = float(days)
+        except (TypeError, ValueError):
+            return Response({"error": "days must be a number"}, status=400)
+        if not 0 < days <= max_days:  # يرفض أيضاً nan و inf
+            return Response({"error": f"days must be between 0 and {max_days}"}, status=400)
+        try:
+            # parse_datetime يعيد None لصيغة غير صحيحة ويرمي ValueError لتاريخ مستحيل (الشهر 13)
+            start = parse_datetime(request.GET['start']) if request.GET.get('start') else None
+            end = parse_datetime(request.GET['end']) if request.GET.get('end') else None
+        except ValueError:
+            start = end = None
+        if (request.GET.get('start') and start is None) or (request.GET.get('end') and end is None):
+            return Response({"error": "start/end must be ISO 8601 datetimes"}, status=400)
+        if start is not None and timezone.is_naive(start):
+            start = timezone.make_aware(start)
+        if end is not None and timezone.is_naive(end):
+            end = timezone.make_aware(end)
+        if start is not None and start > (end or timezone.now()):
+            return Response({"error": "start must be before end"}, status=400)
             
-        history = service.get_vessel_history(imo, days)
+        history = service.get_vessel_history(imo, days, start=start, end=end, resolution=resolution)
+        if history is None:
+            return Response({"error": "Ship not found"}, status=404)
         return Response(history)
 
 class MSTPortSearchView(APIView):
@@ -32,5 +32,10 @@ class CustomUser(AbstractUser):
         related_query_name='user',
     )
     
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            models.Index(fields=['-date_joined', '-id']),  # Pagination par curseur
+        ]
+    
     def __str__(self):
         return f"{self.username} ({self.get_user_type_display()})"
\ No newline at end of file
@@ -3,6 +3,7 @@ from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework_simplejwt.views import TokenObtainPairView
 from django.contrib.auth import get_user_model
+from portflow_ai.pagination import DateJoinedKeysetPagination
 from .serializers import UserRegistrationSerializer, UserProfileSerializer, CustomTokenObtainPairSerializer
 
 class EmptySerializer(serializers.Serializer):
@@ -61,9 +62,10 @@ class AdminUserListView(generics.ListAPIView):
     """List all users (admin only)"""
     permission_classes = [IsAuthenticated]
     serializer_class = UserProfileSerializer
+    pagination_class = DateJoinedKeysetPagination
     
     def get_queryset(self):
         # Only allow admin users
         if self.request.user.user_type != 'admin':
             return User.objects.none()
-        return User.objects.all().order_by('-date_joined')
\ No newline at end of file
+        return User.objects.all().order_by('-date_joined', '-id')
\ No newline at end of file
@@ -0,0 +1,104 @@
+import math
+import threading
+import time
+from django.conf import settings
+from portflow_ai.caching import ReadThroughCache
+
+SOURCES = ('port', 'ship', 'route')
+
+
+def weather_cell(lat, lon, cell_deg):
+    """خلية الطقس (صف، عمود) التي تقع فيها النقطة"""
+    rows = int(round(180 / cell_deg))
+    columns = int(round(360 / cell_deg))
+    row = min(rows - 1, max(0, int(math.floor((lat + 90) / cell_deg))))
+    column = int(math.floor(((lon + 180) % 360) / cell_deg)) % columns
+    return row, column
+
+
+def cell_center(cell, cell_deg):
+    row, column = cell
+    return -90 + (row + 0.5) * cell_deg, -180 + (column + 0.5) * cell_deg
+
+
+class WeatherCellCache:
+    """ذاكرة الطقس المشتركة بين الموانئ والسفن والمسارات
+
+    المفتاح = خلية الإحداثيات المكممة + فترة الرصد (bucket)، فكل الطلبات داخل
+    نفس الخلية ونفس الفترة تشترك في طلب واحد لمزود الطقس عند مركز الخلية.
+    انتهاء الصلاحية والـ LRU وجلب واحد للطلبات المتزامنة من ReadThroughCache.
+
+    الموانئ تُحدَّث في run_job_worker والمسارات في run_scheduler والسفن في عملية الويب،
+    لذلك الخلايا والعدادات في ذاكرة Django مشتركة (BACKEND = 'django') فترى كل العمليات
+    نفس البيانات وتعكس الإحصائيات كل العمليات. فشل المزود (None) لا يُخزَّن.
+    """
+
+    def __init__(self, cell_deg=None, bucket_minutes=None, cache=None):
+        config = getattr(settings, 'WEATHER_CELL_CACHE', {})
+        self.cell_deg = cell_deg or config.get('CELL_DEG', 0.5)
+        self.bucket_seconds = int((bucket_minutes or config.get('BUCKET_MINUTES', 10)) * 60)
+        backend = config.get('BACKEND', 'django')
+        self.cache = cache or ReadThroughCache(
+            'weather_cell',
+            ttl=config.get('TTL', 600),
+            stale_ttl=config.get('STALE_TTL', 1200),
+            max_entries=config.get('MAX_ENTRIES', 20000) if backend == 'local' else None,
+            backend=backend,
+            cache_alias=config.get('CACHE_ALIAS', 'shared'),
+            stats_flush_seconds=config.get('STATS_FLUSH_SECONDS', 5),
+        )
+        self.counters = self.cache.counters
+
+    def cell(self, lat, lon):
+        return weather_cell(lat, lon, self.cell_deg)
+
+    def bucket(self, at=None):
+        """فترة الرصد - الوقت الحالي إذا لم يُحدد at"""
+        timestamp = at.timestamp() if at is not None else time.time()
+        return int(timestamp // self.bucket_seconds)
+
+    def key(self, cell, at=None):
+        return f"{self.cell_deg}:{cell[0]}:{cell[1]}:{self.bucket(at)}"
+
+    def get_cell(self, cell, fetch, source='route', at=None):
+        """طقس الخلية عبر الذاكرة - fetch(lat, lon) تُستدعى عند مركز الخلية عند عدم وجوده فقط"""
+        lat, lon = cell_center(cell, self.cell_deg)
+
+        def load():
+            self.counters.incr('provider_calls')
+            return fetch(lat, lon)
+
+        self.counters.incr(f'lookups:{source}')
+        return self.cache.get_or_fetch(self.key(cell, at), load)
+
+    def get(self, lat, lon, fetch, source='ship', at=None):
+        return self.get_cell(self.cell(lat, lon), fetch, source, at)
+
+    def stats(self):
+        stats = self.cache.stats()
+        counters = self.counters.values([f'lookups:{source}' for source in SOURCES] + ['provider_calls'])
+        lookups = {source: counters[f'lookups:{source}'] for source in SOURCES}
+        provider_calls = counters['provider_calls']
+        total = sum(lookups.values())
+        stats.update({
+            'cell_deg': self.cell_deg,
+            'bucket_minutes': self.bucket_seconds / 60,
+            'lookups': lookups,
+            'provider_calls': provider_calls,
+            # عدد الطلبات لكل استدعاء لمزود الطقس - المؤشر لضبط حجم الخلية مقابل حصة المزود
+            'lookups_per_provider_call': round(total / provider_calls, 2) if provider_calls else None,
+        })
+        return stats
+
+
+_cell_cache = None
+_cell_cache_lock = threading.Lock()
+
+
+def get_weather_cell_cache():
+    """ذاكرة الطقس حسب الخلية (كائن واحد لكل عملية، والبيانات في الذاكرة المشتركة)"""
+    global _cell_cache
+    with _cell_cache_lock:
+        if _cell_cache is None:
+            _cell_cache = WeatherCellCache()
+        return _cell_cache
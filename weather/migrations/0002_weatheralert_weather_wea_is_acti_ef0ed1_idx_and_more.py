@@ -0,0 +1,22 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ships', '0002_initial'),
+        ('weather', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='weatheralert',
+            index=models.Index(fields=['is_active', 'port', 'alert_type', 'end_time'], name='weather_wea_is_acti_ef0ed1_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='weatheralert',
+            index=models.Index(fields=['is_active', 'end_time'], name='weather_wea_is_acti_6bbc83_idx'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_current_weather(apps, schema_editor):
+    WeatherData = apps.get_model('weather', 'WeatherData')
+    CurrentWeather = apps.get_model('weather', 'CurrentWeather')
+    seen = set()
+    snapshots = []
+    for reading in WeatherData.objects.order_by('port_id', '-recorded_at', '-id').only('id', 'port_id', 'recorded_at'):
+        if reading.port_id in seen:
+            continue
+        seen.add(reading.port_id)
+        snapshots.append(CurrentWeather(port_id=reading.port_id, weather_id=reading.id, recorded_at=reading.recorded_at))
+    CurrentWeather.objects.bulk_create(snapshots, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ships', '0002_initial'),
+        ('weather', '0002_weatheralert_weather_wea_is_acti_ef0ed1_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CurrentWeather',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recorded_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='weatherdata',
+            index=models.Index(fields=['port', '-recorded_at'], name='weather_wea_port_id_9ae16f_idx'),
+        ),
+        migrations.AddField(
+            model_name='currentweather',
+            name='port',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='current_weather', to='ships.port'),
+        ),
+        migrations.AddField(
+            model_name='currentweather',
+            name='weather',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='weather.weatherdata'),
+        ),
+        migrations.RunPython(backfill_current_weather, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,6 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 
 User = get_user_model()
 
@@ -14,9 +15,58 @@ class WeatherData(models.Model):
     visibility = models.IntegerField()  # الرؤية (meters)
     recorded_at = models.DateTimeField(auto_now_add=True)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['port', '-recorded_at']),
+        ]
+    
     def __str__(self):
         return f"{self.port.name} - {self.temperature}°C - {self.weather_condition}"
 
+class CurrentWeather(models.Model):
+    """آخر قراءة طقس لكل ميناء - جدول لقطة يُحدَّث مع كل قراءة جديدة"""
+    port = models.OneToOneField('ships.Port', on_delete=models.CASCADE, related_name='current_weather')
+    weather = models.ForeignKey(WeatherData, on_delete=models.CASCADE, related_name='+')
+    recorded_at = models.DateTimeField()
+    
+    def __str__(self):
+        return f"{self.port_id} @ {self.recorded_at}"
+    
+    @classmethod
+    def record(cls, readings):
+        """تحديث اللقطة من قراءات محفوظة باستعلام upsert واحد
+        
+        القراءة الأقدم من اللقطة المخزنة (متأخرة الوصول) لا تستبدلها.
+        """
+        latest = {}
+        for reading in readings:
+            current = latest.get(reading.port_id)
+            if current is None or reading.recorded_at >= current.recorded_at:
+                latest[reading.port_id] = reading
+        if not latest:
+            return 0
+        with transaction.atomic():
+            stored = dict(
+                cls.objects.select_for_update().filter(port_id__in=list(latest)).values_list('port_id', 'recorded_at')
+            )
+            newer = [
+                cls(port_id=port_id, weather_id=reading.id, recorded_at=reading.recorded_at)
+                for port_id, reading in latest.items()
+                if port_id not in stored or reading.recorded_at >= stored[port_id]
+            ]
+            cls.objects.bulk_create(
+                newer,
+                update_conflicts=True,
+                unique_fields=['port'],
+                update_fields=['weather', 'recorded_at'],
+            )
+        return len(newer)
+
+class WeatherAlertQuerySet(models.QuerySet):
+    def active(self, now=None):
+        """الإنذارات المفتوحة فعلياً (نشطة ولم ينتهِ وقتها)"""
+        return self.filter(is_active=True, end_time__gt=now or timezone.now())
+
 class WeatherAlert(models.Model):
     ALERT_TYPES = (
         ('storm', 'عاصفة'),
@@ -35,5 +85,13 @@ class WeatherAlert(models.Model):
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     
+    objects = WeatherAlertQuerySet.as_manager()
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['is_active', 'port', 'alert_type', 'end_time']),
+            models.Index(fields=['is_active', 'end_time']),
+        ]
+    
     def __str__(self):
         return f"{self.port.name} - {self.get_alert_type_display()} - {self.severity}"
\ No newline at end of file
@@ -0,0 +1,179 @@
+import math
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import connection
+from ships.geo import EARTH_RADIUS_KM, haversine_km
+from .cache import get_weather_cell_cache, weather_cell
+
+KM_PER_NAUTICAL_MILE = 1.852
+
+
+def great_circle_points(start_lat, start_lon, end_lat, end_lon, step_km):
+    """نقاط على مسار الدائرة العظمى كل step_km تقريباً (تشمل البداية والنهاية)
+
+    يعيد قائمة (lat, lon, المسافة من البداية بالكم).
+    """
+    total_km = haversine_km(start_lat, start_lon, end_lat, end_lon)
+    steps = max(1, int(math.ceil(total_km / step_km)))
+    phi1, lmb1 = math.radians(start_lat), math.radians(start_lon)
+    phi2, lmb2 = math.radians(end_lat), math.radians(end_lon)
+    delta = total_km / EARTH_RADIUS_KM
+    points = []
+    for i in range(steps + 1):
+        fraction = i / steps
+        if delta < 1e-9:
+            lat, lon = start_lat, start_lon
+        else:
+            # استيفاء كروي (slerp) بين متجهي الوحدة
+            a = math.sin((1 - fraction) * delta) / math.sin(delta)
+            b = math.sin(fraction * delta) / math.sin(delta)
+            x = a * math.cos(phi1) * math.cos(lmb1) + b * math.cos(phi2) * math.cos(lmb2)
+            y = a * math.cos(phi1) * math.sin(lmb1) + b * math.cos(phi2) * math.sin(lmb2)
+            z = a * math.sin(phi1) + b * math.sin(phi2)
+            lat = math.degrees(math.atan2(z, math.hypot(x, y)))
+            lon = math.degrees(math.atan2(y, x))
+        points.append((lat, lon, total_km * fraction))
+    return points
+
+
+# قواعد المخاطر لكل مقطع: (النوع، الشدة، نسبة خفض السرعة)
+def segment_hazards(weather):
+    hazards = []
+    wind = weather.get('wind_speed') or 0
+    visibility = weather.get('visibility', 10000)
+    condition = (weather.get('weather_condition') or '').lower()
+
+    if wind > 15:
+        hazards.append(('high_wind', 'high', min(0.4, 0.15 + (wind - 15) * 0.03), f"Vents forts: {wind} m/s"))
+    elif wind > 10:
+        hazards.append(('high_wind', 'medium', (wind - 10) * 0.02, f"Vents soutenus: {wind} m/s"))
+    if visibility < 1000:
+        hazards.append(('fog', 'high', 0.25, f"Brouillard: visibilité {visibility}m"))
+    elif visibility < 2000:
+        hazards.append(('fog', 'medium', 0.1, f"Visibilité réduite: {visibility}m"))
+    if condition in ('thunderstorm', 'squall', 'tornado'):
+        hazards.append(('storm', 'high', 0.35, f"Orage: {weather.get('description') or condition}"))
+    elif 'rain' in condition:
+        hazards.append(('heavy_rain', 'medium', 0.05, f"Pluie: {weather.get('description') or condition}"))
+    return hazards
+
+
+class RouteWeatherAnalyzer:
+    """تحليل الطقس على مسار سفينة
+
+    المسار يُقسَّم إلى نقاط على الدائرة العظمى، وكل نقطة تُربط بخلية طقس؛
+    تُجلب الخلايا الفريدة فقط وبالتوازي عبر ذاكرة الخلايا المشتركة (weather.cache)،
+    فالسفن والموانئ في نفس المنطقة تتشارك نفس الطلبات.
+    الخلية التي فشل جلبها (None) طقسها "unknown": لا مخاطر منها ولا أثر على زمن الرحلة.
+    """
+
+    SEVERITY_RANK = {'low': 0, 'medium': 1, 'high': 2}
+
+    def __init__(self, service=None, sample_km=None, max_workers=None, cells=None):
+        from .services import OpenWeatherService
+        self.service = service or OpenWeatherService()
+        self.sample_km = sample_km or getattr(settings, 'ROUTE_WEATHER_SAMPLE_KM', 100)
+        self.max_workers = max_workers or getattr(settings, 'WEATHER_REFRESH_WORKERS', 8)
+        self.cells = cells or get_weather_cell_cache()
+        self.cell_deg = self.cells.cell_deg
+
+    def weather_for_cell(self, cell, source='route'):
+        return self.cells.get_cell(cell, self.service.fetch_coordinates_weather, source)
+
+    def _weather_for_cell_in_pool(self, cell):
+        try:
+            return self.weather_for_cell(cell)
+        finally:
+            connection.close()  # اتصال الخيط بذاكرة قاعدة البيانات المشتركة
+
+    def weather_for_cells(self, cells):
+        """طقس كل خلية فريدة - الجلب متوازٍ والمخزن مؤقتاً لا يُطلب مجدداً"""
+        unique = list(dict.fromkeys(cells))
+        if len(unique) == 1:
+            return {unique[0]: self.weather_for_cell(unique[0])}
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(unique))) as pool:
+            return dict(zip(unique, pool.map(self._weather_for_cell_in_pool, unique)))
+
+    def analyze(self, start_lat, start_lon, end_lat, end_lon, speed_knots=None):
+        speed_knots = speed_knots or getattr(settings, 'ROUTE_DEFAULT_SPEED_KNOTS', 14)
+        points = great_circle_points(start_lat, start_lon, end_lat, end_lon, self.sample_km)
+        cells = [weather_cell(lat, lon, self.cell_deg) for lat, lon, _ in points]
+        weather = self.weather_for_cells(cells)
+
+        speed_kmh = speed_knots * KM_PER_NAUTICAL_MILE
+        segments = []
+        base_hours = 0.0
+        estimated_hours = 0.0
+        for index in range(len(points) - 1):
+            (lat1, lon1, at1), (lat2, lon2, at2) = points[index], points[index + 1]
+            # المقطع يأخذ الأسوأ بين خليتي طرفيه
+            segment_cells = list(dict.fromkeys([cells[index], cells[index + 1]]))
+            hazards = {}
+            for cell in segment_cells:
+                if weather[cell] is None:
+                    continue
+                for hazard_type, severity, slowdown, message in segment_hazards(weather[cell]):
+                    current = hazards.get(hazard_type)
+                    if current is None or slowdown > current['slowdown']:
+                        hazards[hazard_type] = {
+                            'type': hazard_type, 'severity': severity, 'slowdown': round(slowdown, 3), 'message': message,
+                        }
+            slowdown = min(0.6, sum(hazard['slowdown'] for hazard in hazards.values()))
+            distance_km = at2 - at1
+            hours = distance_km / speed_kmh
+            base_hours += hours
+            estimated_hours += hours / (1 - slowdown)
+            conditions = weather[cells[index + 1]] or weather[cells[index]]
+            segments.append({
+                'index': index,
+                'start': {'latitude': round(lat1, 4), 'longitude': round(lon1, 4)},
+                'end': {'latitude': round(lat2, 4), 'longitude': round(lon2, 4)},
+                'from_km': round(at1, 1),
+                'distance_km': round(distance_km, 1),
+                'cells': [list(cell) for cell in segment_cells],
+                'unknown_cells': [list(cell) for cell in segment_cells if weather[cell] is None],
+                'weather': {
+                    'temperature': conditions.get('temperature'),
+                    'wind_speed': conditions.get('wind_speed'),
+                    'visibility': conditions.get('visibility'),
+                    'weather_condition': conditions.get('weather_condition'),
+                } if conditions is not None else None,
+                'hazards': list(hazards.values()),
+                'speed_factor': round(1 - slowdown, 3),
+            })
+
+        hazardous = [segment for segment in segments if segment['hazards']]
+        worst = max(
+            (self.SEVERITY_RANK[hazard['severity']] for segment in hazardous for hazard in segment['hazards']),
+            default=-1,
+        )
+        issues = list(dict.fromkeys(hazard['message'] for segment in hazardous for hazard in segment['hazards']))
+        delay_hours = estimated_hours - base_hours
+        unknown = sum(1 for conditions in weather.values() if conditions is None)
+        if unknown == len(weather):
+            risk_level = 'unknown'
+        else:
+            risk_level = {-1: 'low', 0: 'low', 1: 'medium', 2: 'high'}[worst]
+        return {
+            'route': {
+                'start': {'latitude': start_lat, 'longitude': start_lon},
+                'end': {'latitude': end_lat, 'longitude': end_lon},
+                'distance_km': round(points[-1][2], 1),
+                'sample_km': self.sample_km,
+                'cell_deg': self.cell_deg,
+                'waypoints': len(points),
+                'unique_cells': len(weather),
+                'unknown_cells': unknown,
+            },
+            'segments': segments,
+            'hazardous_segments': len(hazardous),
+            'issues': issues,
+            'risk_level': risk_level,
+            'travel_time': {
+                'speed_knots': speed_knots,
+                'base_hours': round(base_hours, 2),
+                'estimated_hours': round(estimated_hours, 2),
+                'delay_hours': round(delay_hours, 2),
+                'delay_percent': round(100 * delay_hours / base_hours, 1) if base_hours else 0.0,
+            },
+        }
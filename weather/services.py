@@ -1,8 +1,10 @@
-import requests
+import time
+from concurrent.futures import ThreadPoolExecutor
 from django.conf import settings
+from django.db import connection
 from django.utils import timezone
-from .models import WeatherData, WeatherAlert
-import random
+from portflow_ai.http_client import get_transport
+from .models import WeatherData, WeatherAlert, CurrentWeather
 
 class OpenWeatherService:
     def __init__(self):
@@ -10,40 +12,103 @@ class OpenWeatherService:
         self.base_url = "https://api.openweathermap.org/data/2.5"
     
     def get_port_weather(self, port):
-        """جلب بيانات الطقس لميناء معين من OpenWeatherMap الحقيقي"""
+        """جلب بيانات الطقس لميناء معين من OpenWeatherMap الحقيقي - None إذا فشل المزود"""
+        weather_info = self._fetch_port_weather(port)
+        if weather_info is None:
+            return None
+        
+        # حفظ في قاعدة البيانات
+        weather_data = self._build_weather_record(weather_info, port)
+        weather_data.save()
+        print(f"💾 تم حفظ بيانات الطقس في قاعدة البيانات: {port.name}")
+        
+        # التحقق من إنذارات الطقس
+        self._check_weather_alerts(weather_data, port)
+        
+        return weather_info
+    
+    def _fetch_port_weather(self, port):
+        """طقس الميناء من ذاكرة الخلايا المشتركة بدون أي كتابة في قاعدة البيانات - آمن للتشغيل المتوازي
+        
+        الموانئ في نفس الخلية ونفس فترة الرصد تشترك في طلب واحد لمزود الطقس.
+        """
+        from .cache import get_weather_cell_cache
+        
+        weather = get_weather_cell_cache().get(
+            port.latitude, port.longitude, self.fetch_coordinates_weather, source='port'
+        )
+        if weather is None:
+            return None
+        weather = dict(weather)
+        weather['port_id'] = port.id
+        weather['city_name'] = port.name
+        return weather
+    
+    def _fetch_port_weather_in_pool(self, port):
+        try:
+            return self._fetch_port_weather(port)
+        finally:
+            connection.close()  # اتصال الخيط بذاكرة قاعدة البيانات المشتركة
+    
+    def fetch_coordinates_weather(self, lat, lon):
+        """جلب الطقس لإحداثيات بدون أي كتابة في قاعدة البيانات - يُستدعى عبر ذاكرة الخلايا (weather.cache)
+        
+        None إذا فشل المزود (بما فيه مفتاح demo_key): لا بيانات مختلقة تنتج مخاطر أو إشعارات
+        أو مدخلات للمخاطر وأوقات الوصول.
+        """
         try:
-            # استخدام API الحقيقي مع المفتاح الجديد
-            url = f"{self.base_url}/weather"
             params = {
-                'lat': port.latitude,
-                'lon': port.longitude,
+                'lat': lat,
+                'lon': lon,
                 'appid': self.api_key,
-                'units': 'metric',  # درجة مئوية
-                'lang': 'ar'  # اللغة العربية
+                'units': 'metric',
+                'lang': 'ar'
             }
-            
-            print(f"🌤️ جلب بيانات الطقس للميناء: {port.name}")
-            print(f"🔗 الرابط: {url}")
-            print(f"📍 الإحداثيات: {port.latitude}, {port.longitude}")
-            
-            response = requests.get(url, params=params, timeout=10)
-            
+            response = get_transport().get(f"{self.base_url}/weather", params=params, timeout=10)
             if response.status_code == 200:
-                data = response.json()
-                print(f"✅ تم جلب بيانات الطقس بنجاح لـ {port.name}")
-                return self._parse_weather_data(data, port)
-            else:
-                print(f"❌ خطأ في API: {response.status_code} - {response.text}")
-                return self._get_demo_weather(port)  # استخدام البيانات الوهمية عند الخطأ
-                
+                return self._parse_weather_data(response.json())
+            print(f"❌ خطأ في API: {response.status_code} - ({lat:.2f}, {lon:.2f})")
         except Exception as e:
             print(f"❌ خطأ في خدمة الطقس: {e}")
-            return self._get_demo_weather(port)
+        return None
+    
+    def get_weather_by_coordinates(self, lat, lon, ship=None):
+        """الطقس الحالي عند إحداثيات (موقع سفينة) من خلية الطقس المخزنة مؤقتاً - None إذا تعذر الجلب"""
+        from .cache import get_weather_cell_cache
+        from .routing import segment_hazards
+        
+        cells = get_weather_cell_cache()
+        cell = cells.cell(lat, lon)
+        weather = cells.get_cell(cell, self.fetch_coordinates_weather, source='ship')
+        if weather is None:
+            return None
+        weather = dict(weather)
+        weather.update({
+            'latitude': lat,
+            'longitude': lon,
+            'cell': list(cell),
+            'hazards': [
+                {'type': hazard_type, 'severity': severity, 'message': message}
+                for hazard_type, severity, _, message in segment_hazards(weather)
+            ],
+        })
+        if ship is not None:
+            weather['ship'] = {'id': ship.id, 'name': ship.name, 'imo_number': ship.imo_number}
+        return weather
     
-    def _parse_weather_data(self, data, port):
+    def get_route_weather_analysis(self, start_lat, start_lon, end_lat, end_lon, speed_knots=None):
+        """تحليل الطقس على مسار الدائرة العظمى: مخاطر كل مقطع وأثرها على زمن الرحلة
+        
+        قراءة فقط - إشعارات مخاطر المسار تُرسل من المهمة الدورية check_route_weather.
+        """
+        from .routing import RouteWeatherAnalyzer
+        
+        return RouteWeatherAnalyzer(service=self).analyze(start_lat, start_lon, end_lat, end_lon, speed_knots)
+    
+    def _parse_weather_data(self, data, port=None):
         """تحويل بيانات API الحقيقية إلى تنسيقنا"""
         try:
-            weather_info = {
+            return {
                 'temperature': data['main']['temp'],
                 'humidity': data['main']['humidity'],
                 'wind_speed': data['wind']['speed'],
@@ -53,66 +118,18 @@ class OpenWeatherService:
                 'visibility': data.get('visibility', 10000),
                 'pressure': data['main']['pressure'],
                 'feels_like': data['main']['feels_like'],
-                'port_id': port.id,
+                'port_id': port.id if port else None,
                 'source': 'openweathermap',
-                'city_name': data.get('name', port.name)
+                'city_name': data.get('name', port.name if port else '')
             }
-            
-            # حفظ في قاعدة البيانات
-            weather_data = WeatherData.objects.create(
-                port=port,
-                temperature=weather_info['temperature'],
-                humidity=weather_info['humidity'],
-                wind_speed=weather_info['wind_speed'],
-                wind_direction=weather_info['wind_direction'],
-                weather_condition=weather_info['weather_condition'],
-                description=weather_info['description'],
-                visibility=weather_info['visibility']
-            )
-            
-            print(f"💾 تم حفظ بيانات الطقس في قاعدة البيانات: {port.name}")
-            
-            # التحقق من إنذارات الطقس
-            self._check_weather_alerts(weather_data, port)
-            
-            return weather_info
-            
+        
         except KeyError as e:
             print(f"❌ خطأ في تحليل بيانات API: {e}")
-            return self._get_demo_weather(port)
+            return None
     
-    def _get_demo_weather(self, port):
-        """بيانات طقس وهمية للطوارئ فقط"""
-        print(f"🔄 استخدام البيانات الوهمية لـ {port.name}")
-        
-        weather_patterns = [
-            {'condition': 'Clear', 'desc': 'صافي', 'temp_range': (25, 35), 'humidity_range': (40, 70)},
-            {'condition': 'Clouds', 'desc': 'غائم جزئياً', 'temp_range': (22, 30), 'humidity_range': (50, 80)},
-            {'condition': 'Rain', 'desc': 'أمطار خفيفة', 'temp_range': (20, 28), 'humidity_range': (70, 90)},
-        ]
-        
-        pattern = random.choice(weather_patterns)
-        temp = random.randint(pattern['temp_range'][0], pattern['temp_range'][1])
-        humidity = random.randint(pattern['humidity_range'][0], pattern['humidity_range'][1])
-        wind_speed = round(random.uniform(2.0, 12.0), 1)
-        
-        weather_info = {
-            'temperature': temp,
-            'humidity': humidity,
-            'wind_speed': wind_speed,
-            'wind_direction': random.randint(0, 360),
-            'weather_condition': pattern['condition'],
-            'description': pattern['desc'],
-            'visibility': random.randint(5000, 15000),
-            'pressure': 1013,
-            'feels_like': temp + random.randint(-2, 2),
-            'port_id': port.id,
-            'source': 'demo_mode',
-            'city_name': port.name
-        }
-        
-        # حفظ في قاعدة البيانات
-        weather_data = WeatherData.objects.create(
+    def _build_weather_record(self, weather_info, port):
+        """إنشاء سجل WeatherData غير محفوظ من بيانات الطقس"""
+        return WeatherData(
             port=port,
             temperature=weather_info['temperature'],
             humidity=weather_info['humidity'],
@@ -122,13 +139,9 @@ class OpenWeatherService:
             description=weather_info['description'],
             visibility=weather_info['visibility']
         )
-        
-        self._check_weather_alerts(weather_data, port)
-        
-        return weather_info
     
-    def _check_weather_alerts(self, weather_data, port):
-        """التحقق من وجود حالات طقس خطيرة"""
+    def _evaluate_alert_rules(self, weather_data):
+        """قواعد الإنذار لقراءة واحدة - بدون استعلامات"""
         alerts = []
         
         # رياح عالية
@@ -143,45 +156,166 @@ class OpenWeatherService:
         if 'rain' in weather_data.weather_condition.lower():
             alerts.append(('heavy_rain', 'medium', "أمطار غزيرة"))
         
-        # حفظ الإنذارات
-        for alert_type, severity, message in alerts:
-            WeatherAlert.objects.create(
-                port=port,
-                alert_type=alert_type,
-                severity=severity,
-                message=message,
-                start_time=timezone.now(),
-                end_time=timezone.now() + timezone.timedelta(hours=6),
-                is_active=True
-            )
-            
-            print(f"🚨 إنذار طقس: {message} في {port.name}")
+        return alerts
     
-    def update_all_ports_weather(self):
-        """تحديث طقس جميع الموانئ"""
+    def _build_alerts(self, weather_records):
+        """تقييم القواعد على دفعة كاملة من القراءات في الذاكرة"""
+        now = timezone.now()
+        alerts = []
+        for weather_data in weather_records:
+            for alert_type, severity, message in self._evaluate_alert_rules(weather_data):
+                alerts.append(WeatherAlert(
+                    port=weather_data.port,
+                    alert_type=alert_type,
+                    severity=severity,
+                    message=message,
+                    start_time=now,
+                    end_time=now + timezone.timedelta(hours=6),
+                    is_active=True
+                ))
+                print(f"🚨 إنذار طقس: {message} في {weather_data.port.name}")
+        return alerts
+    
+    def _check_weather_alerts(self, weather_data, port):
+        """التحقق من وجود حالات طقس خطيرة"""
+        return WeatherAlertLifecycle().apply(self._build_alerts([weather_data]))
+    
+    def update_all_ports_weather(self, max_workers=None, progress=None):
+        """تحديث طقس جميع الموانئ
+        
+        الجلب متوازٍ لكل الموانئ، ثم تُكتب جميع القراءات بعملية bulk_create
+        واحدة وتُقيَّم قواعد الإنذار على الدفعة كاملة وتُكتب الإنذارات دفعة واحدة.
+        progress (من طابور المهام jobs.queue) يُستدعى أثناء الجلب وبعد كل مرحلة.
+        """
         from ships.models import Port
+        from .cache import get_weather_cell_cache
+        
+        started = time.monotonic()
+        max_workers = max_workers or getattr(settings, 'WEATHER_REFRESH_WORKERS', 8)
+        ports = list(Port.objects.all())
+        total_ports = len(ports)
+        
+        print(f"🌍 بدء تحديث الطقس لـ {total_ports} موانئ...")
+        
+        fetched = []
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            for weather_info in pool.map(self._fetch_port_weather_in_pool, ports):
+                fetched.append(weather_info)
+                if progress:
+                    progress(0.7 * len(fetched) / total_ports, f"{len(fetched)}/{total_ports} ports fetched")
+        fetch_ms = (time.monotonic() - started) * 1000
+        if progress:
+            progress(0.7, "weather fetched", timings={'fetch_ms': round(fetch_ms, 2)}, force=True)
         
-        ports = Port.objects.all()
-        updated_count = 0
         results = []
+        weather_records = []
+        for port, weather_info in zip(ports, fetched):
+            if not weather_info:
+                continue
+            weather_records.append(self._build_weather_record(weather_info, port))
+            results.append({
+                'port': port.name,
+                'temperature': weather_info['temperature'],
+                'condition': weather_info['weather_condition'],
+                'source': weather_info.get('source', 'unknown')
+            })
         
-        print(f"🌍 بدء تحديث الطقس لـ {ports.count()} موانئ...")
+        write_started = time.monotonic()
+        WeatherData.objects.bulk_create(weather_records)
+        CurrentWeather.record(weather_records)
+        alerts = WeatherAlertLifecycle().apply(self._build_alerts(weather_records))
+        db_write_ms = (time.monotonic() - write_started) * 1000
+        if progress:
+            progress(0.8, "weather saved", partial={'updated_count': len(weather_records), 'alerts_created': alerts['created']},
+                     timings={'db_write_ms': round(db_write_ms, 2)}, force=True)
         
-        for port in ports:
-            weather_data = self.get_port_weather(port)
-            if weather_data:
-                updated_count += 1
-                results.append({
-                    'port': port.name,
-                    'temperature': weather_data['temperature'],
-                    'condition': weather_data['weather_condition'],
-                    'source': weather_data.get('source', 'unknown')
-                })
+        # إعادة حساب مخاطر الأسطول وأوقات الوصول بالطقس والإنذارات الجديدة (حالة الموانئ تُحمّل مرة واحدة)
+        from ships.eta import EtaEngine
+        from ships.risk import PortContext, RiskEngine
+        context = PortContext.load()
+        risk = RiskEngine().rescore_fleet(context=context)
+        eta = EtaEngine().update_fleet(context=context)
         
-        print(f"✅ تم تحديث طقس {updated_count} من أصل {ports.count()} ميناء")
+        updated_count = len(weather_records)
+        print(f"✅ تم تحديث طقس {updated_count} من أصل {total_ports} ميناء")
         
         return {
             'updated_count': updated_count,
-            'total_ports': ports.count(),
-            'results': results
-        }
\ No newline at end of file
+            'total_ports': total_ports,
+            'unavailable_count': total_ports - updated_count,  # فشل المزود - لا قراءة ولا إنذار
+            'alerts_created': alerts['created'],
+            'alerts_extended': alerts['extended'],
+            'alerts_expired': alerts['expired'],
+            'eta_changed': eta['changed'],
+            'results': results,
+            'timings': {
+                'fetch_ms': round(fetch_ms, 2),
+                'db_write_ms': round(db_write_ms, 2),
+                'risk': risk['timings'],
+                'eta': eta['timings'],
+                'elapsed_ms': round((time.monotonic() - started) * 1000, 2),
+                'http': get_transport().stats(),
+                'weather_cache': get_weather_cell_cache().stats(),
+            },
+        }
+
+    
+
+class WeatherAlertLifecycle:
+    """دورة حياة الإنذارات: دمج الحالة المستمرة في إنذار مفتوح واحد وإغلاق المنتهي دفعة واحدة"""
+    
+    def expire(self, now=None):
+        """إغلاق كل الإنذارات التي تجاوزت end_time باستعلام UPDATE واحد"""
+        now = now or timezone.now()
+        return WeatherAlert.objects.filter(is_active=True, end_time__lte=now).update(is_active=False)
+    
+    def apply(self, candidates, now=None):
+        """تطبيق إنذارات مرشحة (غير محفوظة) على الإنذارات المفتوحة
+        
+        لكل (ميناء، نوع إنذار) يبقى إنذار مفتوح واحد: إن وُجد يُمدَّد وقته
+        ويُحدَّث نصه، وإلا يُنشأ إنذار جديد.
+        """
+        now = now or timezone.now()
+        expired = self.expire(now)
+        
+        # آخر مرشح لكل مفتاح هو الحالة الحالية
+        latest = {}
+        for alert in candidates:
+            latest[(alert.port_id, alert.alert_type)] = alert
+        
+        if not latest:
+            return {'created': 0, 'extended': 0, 'expired': expired}
+        
+        open_alerts = {}
+        duplicates = []
+        for alert in WeatherAlert.objects.filter(
+            is_active=True,
+            port_id__in={port_id for port_id, _ in latest},
+            alert_type__in={alert_type for _, alert_type in latest},
+        ).order_by('-end_time', '-id'):
+            key = (alert.port_id, alert.alert_type)
+            if key in open_alerts:
+                duplicates.append(alert.id)
+            else:
+                open_alerts[key] = alert
+        
+        to_create = []
+        to_extend = []
+        for key, candidate in latest.items():
+            current = open_alerts.get(key)
+            if current is None:
+                to_create.append(candidate)
+                continue
+            current.severity = candidate.severity
+            current.message = candidate.message
+            current.end_time = max(current.end_time, candidate.end_time)
+            to_extend.append(current)
+        
+        if duplicates:
+            WeatherAlert.objects.filter(id__in=duplicates).update(is_active=False)
+        if to_extend:
+            WeatherAlert.objects.bulk_update(to_extend, ['severity', 'message', 'end_time'])
+        if to_create:
+            WeatherAlert.objects.bulk_create(to_create)
+        
+        return {'created': len(to_create), 'extended': len(to_extend), 'expired': expired}
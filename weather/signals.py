@@ -0,0 +1,10 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from .models import WeatherData, CurrentWeather
+
+
+@receiver(post_save, sender=WeatherData)
+def update_current_weather(sender, instance, created, **kwargs):
+    """كل قراءة جديدة تُحدّث لقطة الطقس الحالي لمينائها"""
+    if created:
+        CurrentWeather.record([instance])
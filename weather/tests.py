@@ -1,3 +1,217 @@
+import threading
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
 from django.test import TestCase
+from rest_framework.test import APIClient
+
+from portflow_ai.caching import ReadThroughCache
+from notifications.models import Notification
+from notifications.services import NotificationService
+from ships.models import Port, Ship
+from .cache import WeatherCellCache
+from .models import CurrentWeather, WeatherAlert, WeatherData
+from .services import OpenWeatherService
+
+def local_cells(**kwargs):
+    """ذاكرة خلايا داخل العملية - الاختبارات التي تجلب بخيوط لا تكتب في جدول الذاكرة المشتركة"""
+    return WeatherCellCache(cache=ReadThroughCache('weather_cell', ttl=600, stale_ttl=1200, **kwargs))
+
+
+STORM = {
+    'temperature': 18, 'humidity': 90, 'wind_speed': 22, 'wind_direction': 200, 'weather_condition': 'Thunderstorm',
+    'description': 'orage', 'visibility': 800, 'pressure': 990, 'feels_like': 16, 'port_id': None,
+    'source': 'test', 'city_name': '',
+}
+
+
+@mock.patch('weather.services.OpenWeatherService.fetch_coordinates_weather', lambda self, lat, lon: dict(STORM))
+class RouteWeatherAlertTests(TestCase):
+    """صفحة تحليل المسار قراءة فقط - الإشعارات من المهمة الدورية مع منع التكرار"""
+
+    def setUp(self):
+        cells = mock.patch('weather.routing.get_weather_cell_cache', local_cells)
+        cells.start()
+        self.addCleanup(cells.stop)
+
+        port = Port.objects.create(name="Nouadhibou", country="MR", city="Nouadhibou", latitude=20.9, longitude=-17.0, code="MRNDB")
+        self.ship = Ship.objects.create(
+            name="Atlas", imo_number="9000001", destination_port=port,
+            current_latitude=18.0, current_longitude=-17.5, current_speed=12,
+        )
+        self.user = get_user_model().objects.create_user(username="follower", password="x")
+        self.ship.tracked_by.add(self.user)
+
+    def test_route_page_does_not_notify(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        for _ in range(3):
+            response = client.get(f'/api/weather/ship/{self.ship.id}/route/')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data['risk_level'], 'high')
+        self.assertFalse(Notification.objects.exists())
+
+    def test_scheduled_check_notifies_followers_once(self):
+        service = NotificationService()
+        service.check_route_weather_for_ships()
+        service.check_route_weather_for_ships()
+
+        notification = Notification.objects.get()
+        self.assertEqual((notification.user, notification.related_ship), (self.user, self.ship))
+        self.assertEqual((notification.notification_type, notification.severity), ('weather', 'high'))
+
+
+class CurrentWeatherTests(TestCase):
+    """قراءة متأخرة الوصول لا تستبدل لقطة أحدث منها"""
+
+    def setUp(self):
+        self.port = Port.objects.create(name="Nouakchott", country="MR", city="Nouakchott", latitude=18.1, longitude=-16.0, code="MRNKC")
+
+    def reading(self, age_minutes):
+        reading = WeatherData.objects.create(
+            port=self.port, temperature=25, humidity=60, wind_speed=5, wind_direction=0,
+            weather_condition='Clear', description='clear', visibility=10000,
+        )
+        reading.recorded_at -= timedelta(minutes=age_minutes)
+        WeatherData.objects.filter(pk=reading.pk).update(recorded_at=reading.recorded_at)
+        return reading
+
+    def test_older_reading_does_not_replace_snapshot(self):
+        older = self.reading(30)
+        newer = self.reading(0)
+        self.assertEqual(CurrentWeather.objects.get(port=self.port).weather_id, newer.id)
+
+        self.assertEqual(CurrentWeather.record([older]), 0)
+        self.assertEqual(CurrentWeather.objects.get(port=self.port).weather_id, newer.id)
+
+        latest = self.reading(-5)
+        self.assertEqual(CurrentWeather.record([older, latest]), 1)
+        self.assertEqual(CurrentWeather.objects.get(port=self.port).weather_id, latest.id)
+
+
+class ProviderFailureTests(TestCase):
+    """فشل المزود (ومنه demo_key) لا يُنتج طقساً مختلقاً: الخلايا unknown ولا مخاطر ولا إشعارات"""
+
+    def setUp(self):
+        cells = mock.patch('weather.routing.get_weather_cell_cache', local_cells)
+        cells.start()
+        self.addCleanup(cells.stop)
+        port_cells = mock.patch('weather.cache.get_weather_cell_cache', local_cells)
+        port_cells.start()
+        self.addCleanup(port_cells.stop)
+
+        transport = mock.patch('weather.services.get_transport')
+        self.transport = transport.start()
+        self.addCleanup(transport.stop)
+        self.transport.return_value.get.return_value = mock.Mock(status_code=401)
+
+        self.port = Port.objects.create(name="Nouadhibou", country="MR", city="Nouadhibou", latitude=20.9, longitude=-17.0, code="MRNDB")
+        self.ship = Ship.objects.create(
+            name="Atlas", imo_number="9000001", destination_port=self.port,
+            current_latitude=18.0, current_longitude=-17.5, current_speed=12,
+        )
+        self.ship.tracked_by.add(get_user_model().objects.create_user(username="follower", password="x"))
+
+    def test_failed_fetch_returns_none(self):
+        self.assertIsNone(OpenWeatherService().fetch_coordinates_weather(18.0, -17.5))
+        self.transport.return_value.get.side_effect = OSError("network down")
+        self.assertIsNone(OpenWeatherService().fetch_coordinates_weather(18.0, -17.5))
+
+    def test_route_cells_are_unknown_and_not_alerted(self):
+        analysis = OpenWeatherService().get_route_weather_analysis(18.0, -17.5, 20.9, -17.0)
+        self.assertEqual(analysis['risk_level'], 'unknown')
+        self.assertEqual((analysis['issues'], analysis['hazardous_segments']), ([], 0))
+        self.assertEqual(analysis['route']['unknown_cells'], analysis['route']['unique_cells'])
+        self.assertEqual(analysis['travel_time']['delay_hours'], 0)
+        self.assertIsNone(analysis['segments'][0]['weather'])
+
+        NotificationService().check_route_weather_for_ships()
+        self.assertFalse(Notification.objects.exists())
+
+    def test_port_refresh_skips_failed_ports(self):
+        result = OpenWeatherService().update_all_ports_weather(max_workers=1)
+        self.assertEqual((result['updated_count'], result['unavailable_count']), (0, 1))
+        self.assertFalse(WeatherData.objects.exists())
+        self.assertFalse(WeatherAlert.objects.exists())
+        self.assertIsNone(OpenWeatherService().get_port_weather(self.port))
+
+
+class WeatherCellCacheTests(TestCase):
+    """الخلايا والعدادات مشتركة بين العمليات، مع انتهاء الصلاحية والـ LRU والجلب الواحد"""
+
+    def setUp(self):
+        self.calls = []
+
+    def fetch(self, lat, lon):
+        self.calls.append((lat, lon))
+        return {'temperature': 20, 'source': 'test'}
+
+    def test_cells_and_counters_are_shared_between_processes(self):
+        # كائنان على نفس الذاكرة المشتركة = عمليتان (العامل والويب)
+        worker, web = (WeatherCellCache(cache=ReadThroughCache(
+            'weather_cell', ttl=600, stale_ttl=0, backend='django', cache_alias='shared', stats_flush_seconds=0,
+        )) for _ in range(2))
+        worker.get(20.9, -17.0, self.fetch, source='port')
+        web.get(20.95, -17.0, self.fetch, source='ship')
+
+        self.assertEqual(len(self.calls), 1)
+        for cells in (worker, web):
+            stats = cells.stats()
+            self.assertEqual(stats['lookups'], {'port': 1, 'ship': 1, 'route': 0})
+            self.assertEqual((stats['provider_calls'], stats['hits'], stats['misses']), (1, 1, 1))
+
+    def test_provider_failure_is_not_cached(self):
+        cells = local_cells()
+        self.assertIsNone(cells.get(20.9, -17.0, lambda lat, lon: self.calls.append(lat)))
+        self.assertEqual(cells.get(20.9, -17.0, self.fetch)['source'], 'test')
+        self.assertEqual(cells.get(20.9, -17.0, self.fetch)['source'], 'test')
+        self.assertEqual(len(self.calls), 2)
+        self.assertEqual(cells.stats()['uncached'], 1)
+
+    def test_entry_expires_after_ttl(self):
+        cells = WeatherCellCache(bucket_minutes=60, cache=ReadThroughCache('weather_cell', ttl=10, stale_ttl=0))
+        with mock.patch('portflow_ai.caching.time.time', return_value=1000.0):
+            cells.get(20.9, -17.0, self.fetch)
+        with mock.patch('portflow_ai.caching.time.time', return_value=1009.0):
+            cells.get(20.9, -17.0, self.fetch)
+        self.assertEqual(len(self.calls), 1)
+        with mock.patch('portflow_ai.caching.time.time', return_value=1011.0):
+            cells.get(20.9, -17.0, self.fetch)
+        self.assertEqual(len(self.calls), 2)
+
+    def test_least_recently_used_cell_is_evicted(self):
+        cells = local_cells(max_entries=2)
+        first, second, third = (20.25, -17.25), (21.25, -17.25), (22.25, -17.25)
+        for lat, lon in (first, second, first, third):
+            cells.get(lat, lon, self.fetch)
+        self.assertEqual(cells.stats()['evictions'], 1)
+
+        cells.get(*first, self.fetch)
+        self.assertEqual(len(self.calls), 3)
+        cells.get(*second, self.fetch)
+        self.assertEqual(self.calls[-1], second)
+        self.assertEqual(len(self.calls), 4)
+
+    def test_concurrent_lookups_share_one_provider_call(self):
+        cells = local_cells()
+        release = threading.Event()
+
+        def slow_fetch(lat, lon):
+            release.wait(5)
+            return self.fetch(lat, lon)
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cells.get(20.9, -17.0, slow_fetch))) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        # الخيوط الأخرى تنتظر جلب الأول
+        while cells.stats()['coalesced'] < 5:
+            threading.Event().wait(0.01)
+        release.set()
+        for thread in threads:
+            thread.join()
 
-# Create your tests here.
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(len(results), 6)
+        self.assertEqual(cells.stats()['provider_calls'], 1)
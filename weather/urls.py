@@ -25,5 +25,6 @@ urlpatterns = [
     # Stats and current weather
     path('current/', views.AllCurrentWeatherView.as_view(), name='weather-current-all'),
     path('stats/', views.WeatherStatsView.as_view(), name='weather-stats'),
+    path('cache-stats/', views.WeatherCellCacheStatsView.as_view(), name='weather-cache-stats'),
 
 ]
\ No newline at end of file
@@ -2,7 +2,7 @@ from rest_framework import generics
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from .models import WeatherData, WeatherAlert
+from .models import WeatherData, WeatherAlert, CurrentWeather
 from .serializers import WeatherDataSerializer, WeatherAlertSerializer
 from .services import OpenWeatherService
 
@@ -44,7 +44,6 @@ class ShipWeatherView(APIView):
     
     def get(self, request, ship_id):
         from ships.models import Ship
-        from notifications.services import NotificationService  # 🆕 IMPORT
         
         try:
             ship = Ship.objects.get(id=ship_id)
@@ -66,19 +65,7 @@ class ShipWeatherView(APIView):
                 )
                 
                 if weather_data:
-                    # 🆕 INTÉGRATION NOTIFICATIONS - Alertes automatiques
-                    notification_service = NotificationService()
-                    weather_issues = []
-                    
-                    if weather_data.get('wind_speed', 0) > 15:
-                        weather_issues.append(f"Vents forts: {weather_data['wind_speed']} m/s")
-                    
-                    if weather_data.get('visibility', 10000) < 2000:
-                        weather_issues.append(f"Brouillard: visibilité {weather_data['visibility']}m")
-                    
-                    if weather_issues:
-                        notification_service.send_route_weather_alert(ship, weather_issues)
-                    
+                    # Lecture seule - les alertes viennent de la tâche planifiée check_route_weather
                     return Response(weather_data)
                 else:
                     return Response(
@@ -131,11 +118,12 @@ class ShipRouteWeatherView(APIView):
                 start_lat=ship.current_latitude,
                 start_lon=ship.current_longitude,
                 end_lat=ship.destination_port.latitude,
-                end_lon=ship.destination_port.longitude
+                end_lon=ship.destination_port.longitude,
+                speed_knots=ship.current_speed or None
             )
             
             if route_analysis:
-                # 🆕 Les notifications sont déjà gérées dans get_route_weather_analysis
+                # Les alertes de parcours sont envoyées par la tâche planifiée check_route_weather
                 return Response(route_analysis)
             else:
                 return Response(
@@ -214,17 +202,27 @@ class UpdateAllWeatherView(APIView):
         if not request.user.is_staff:
             return Response({"error": "Permission denied"}, status=403)
         
-        service = OpenWeatherService()
-        result = service.update_all_ports_weather()
+        # التحديث يعمل في عامل طابور المهام - الحالة والتقدم عبر status_url
+        from jobs.views import enqueued_response
+        return enqueued_response('refresh_weather', request)
+
+class WeatherCellCacheStatsView(APIView):
+    """إحصائيات ذاكرة خلايا الطقس (نسبة الإصابة واستدعاءات المزود لكل مصدر)"""
+    permission_classes = [IsAuthenticated]
+    
+    def get(self, request):
+        if not request.user.is_staff:
+            return Response({"error": "Permission denied"}, status=403)
         
-        return Response({"message": result})
+        from .cache import get_weather_cell_cache
+        return Response(get_weather_cell_cache().stats())
 
 class WeatherAlertsView(APIView):
     """جلب إنذارات الطقس النشطة"""
     permission_classes = [IsAuthenticated]
     
     def get(self, request):
-        alerts = WeatherAlert.objects.filter(is_active=True)
+        alerts = WeatherAlert.objects.active().select_related('port')
         serializer = WeatherAlertSerializer(alerts, many=True)
         return Response(serializer.data)
 
@@ -233,7 +231,7 @@ class ActiveWeatherAlertsView(APIView):
     permission_classes = [IsAuthenticated]
     
     def get(self, request):
-        alerts = WeatherAlert.objects.filter(is_active=True)
+        alerts = WeatherAlert.objects.active().select_related('port')
         serializer = WeatherAlertSerializer(alerts, many=True)
         return Response(serializer.data)
 
@@ -242,20 +240,10 @@ class AllCurrentWeatherView(APIView):
     permission_classes = [IsAuthenticated]
     
     def get(self, request):
-        # Get the latest weather data for each port
-        from ships.models import Port
-        from django.db.models import Max
-        
-        ports = Port.objects.all()
-        weather_list = []
-        
-        for port in ports:
-            latest_weather = WeatherData.objects.filter(port=port).order_by('-recorded_at').first()
-            if latest_weather:
-                serializer = WeatherDataSerializer(latest_weather)
-                weather_list.append(serializer.data)
-        
-        return Response(weather_list)
+        # Get the latest weather data for each port from the snapshot table
+        snapshots = CurrentWeather.objects.select_related('weather__port').order_by('port_id')
+        serializer = WeatherDataSerializer([snapshot.weather for snapshot in snapshots], many=True)
+        return Response(serializer.data)
 
 class WeatherStatsView(APIView):
     """Get weather statistics"""
@@ -267,7 +255,7 @@ class WeatherStatsView(APIView):
         
         # Compteurs de ports
         total_ports = Port.objects.count()
-        ports_with_alerts = WeatherAlert.objects.filter(is_active=True).values('port').distinct().count()
+        ports_with_alerts = WeatherAlert.objects.active().values('port').distinct().count()
         
         # Moyennes simples (compatibles SQLite) sur toutes les mesures disponibles
         agg = WeatherData.objects.aggregate(
@@ -293,6 +281,6 @@ class PortWeatherHistoryView(APIView):
     permission_classes = [IsAuthenticated]
     
     def get(self, request, port_id):
-        weather_history = WeatherData.objects.filter(port_id=port_id).order_by('-recorded_at')[:10]
+        weather_history = WeatherData.objects.filter(port_id=port_id).select_related('port').order_by('-recorded_at')[:10]
         serializer = WeatherDataSerializer(weather_history, many=True)
         return Response(serializer.data)
\ No newline at end of file